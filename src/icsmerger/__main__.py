@@ -1,4 +1,10 @@
-from icsmerger.app import main
+import sys
 
 if __name__ == "__main__":
+    if len(sys.argv) > 1 and sys.argv[1] in ("merge", "analyze", "-h", "--help", "--version"):
+        # Headless: don't import toga
+        from icsmerger.cli import main
+        sys.exit(main())
+
+    from icsmerger.app import main
     main().main_loop()
@@ -1,14 +1,21 @@
-import os
 import logging
 import toga
 from toga.style import Pack
 from toga.style.pack import COLUMN, ROW, BOLD
-from icalendar import Calendar
-from .ical import load_ics, get_event_set
-from .exclusions import load_exclusions
+from .ical import Cancelled
+from .engine import analyze_files, calendars_report, exclusion_list_report
+from .progress import ProgressPanel, TimingsPanel
+from .timing import profile_call
+from .report import ReportWriter
+
+async def analyze(self, ics1_path, ics2_path, exclusions_path, window=None):
+    async def show_all(widget):
+        show_all_button.enabled = False
+        for report in (ics_report, excl_report):
+            await report.flush(show_all=True)
 
-async def analyze(self, ics1_path, ics2_path, exclusions_path):
     def close_handler(widget):
+        progress_panel.cancel()
         analysis_window.close()
         # self.analyze_button.enabled = True
         # self.analyze_open = False
@@ -16,7 +23,12 @@ async def analyze(self, ics1_path, ics2_path, exclusions_path):
     
     ics_text = toga.MultilineTextInput(readonly=True, style=Pack(flex=1))
     excl_text = toga.MultilineTextInput(readonly=True, style=Pack(flex=1))
-    
+    ics_report = ReportWriter(ics_text)
+    excl_report = ReportWriter(excl_text)
+    progress_panel = ProgressPanel()
+    timings_panel = TimingsPanel()
+    show_all_button = toga.Button('Show All', on_press=show_all, enabled=False, style=Pack(padding=(0, 5)))
+
     window_width, window_height = 800, 600
     position_x, position_y = self.window_position(window_width, window_height)
     analysis_window = toga.Window(title="ICS Analysis", size=(window_width, window_height), position=(position_x, position_y))
@@ -34,11 +46,18 @@ async def analyze(self, ics1_path, ics2_path, exclusions_path):
             ics_text,
             excl_text
         ]), 
+        # Row3
+            # Analysis progress
+        progress_panel.box,
+        # Row3b
+            # Stage timings (collapsed until the analysis has finished and it is expanded)
+        timings_panel.box,
         toga.Box(style=Pack(direction=ROW, padding=10), children=[
-        # Row2 
-            # Close button
+        # Row4
+            # Show All and Close buttons
             toga.Label("", style=Pack(flex=1)),
-            toga.Button('Close', on_press=close_handler),
+            show_all_button,
+            toga.Button('Close', on_press=close_handler, style=Pack(padding=(0, 5))),
             toga.Label("", style=Pack(flex=1))
         ]),
     ])
@@ -50,66 +69,35 @@ async def analyze(self, ics1_path, ics2_path, exclusions_path):
     # self.analyze_open = True
     self.main_window.hide()
 
-    load_files(self.main_window, ics1_path, ics2_path, exclusions_path, ics_text, excl_text)
-
-# Load files and display information
-def load_files(main_window, ics1_path, ics2_path, exclusions_path, ics_text, excl_text):
-    if ics1_path and not os.path.exists(ics1_path):
-        ics_text.value += f"File not found (ICS1): {ics1_path}\n"
+    # Run the analysis in a worker thread, so the window stays responsive (profiling it if enabled)
+    try:
+        result = await progress_panel.run(profile_call, self.profile_path("analyze"), analyze_files, ics1_path, ics2_path, exclusions_path, self.parser, self.event_cache, expander=self.get_expander(), window=window)
+    except Cancelled:
+        logging.debug("Analysis cancelled.")
+        progress_panel.finish("Analysis cancelled.")
         return
-    
-    if not ics2_path:
-        ics_text.value += "ICS2 file must be provided\n"
+    except Exception as e:
+        progress_panel.finish("Analysis failed.")
+        ics_text.value += f"An unknown error occurred during the analysis: {e}\n"
         return
+    progress_panel.finish("Analysis complete.")
+    timings_panel.show(result.timer)
 
-    if not os.path.exists(ics2_path):
-        ics_text.value += f"File not found (ICS2): {ics2_path}\n"
-        return
+    await show_analysis(self.main_window, result, ics_report, excl_report)
+    show_all_button.enabled = ics_report.truncated or excl_report.truncated
 
-    if exclusions_path and not os.path.exists(exclusions_path):
-        ics_text.value += f"File not found (exclusion): {exclusions_path}\n"
+# Display the results of an analysis
+async def show_analysis(main_window, result, ics_report, excl_report):
+    for error in result.errors:
+        main_window.info_dialog("Error", error)
+    if result.missing:
+        ics_report.write(f"{missing}\n" for missing in result.missing)
+        await ics_report.flush()
         return
-
-    cal1 = load_ics(main_window, ics1_path) if ics1_path else Calendar()
-    cal2 = load_ics(main_window, ics2_path)
-
-    if cal2 is None:
+    if not result.loaded:
         return
 
-    events1 = get_event_set(cal1) if cal1 else set()
-    events2 = get_event_set(cal2)
-
-    earliest_event_ics1 = (min(events1, key=lambda x: x[1])[1]).date() if events1 else None
-    latest_event_ics1 = (max(events1, key=lambda x: x[1])[1]).date() if events1 else None
-    earliest_event_ics2 = (min(events2, key=lambda x: x[1])[1]).date() if events2 else None
-    latest_event_ics2 = (max(events2, key=lambda x: x[1])[1]).date() if events2 else None
-
-    if ics1_path:
-        ics_text.value += f"ICS1 contains {len(events1)} events:\n\n"
-        if earliest_event_ics1 and latest_event_ics1:
-            ics_text.value += f"  - Earliest event in ICS1: {earliest_event_ics1}\n"
-            ics_text.value += f"  - Latest event in ICS1: {latest_event_ics1}\n"
-
-    if cal2:
-        ics_text.value += f"\nICS2 contains {len(events2)} events:\n\n"
-        if earliest_event_ics2 and latest_event_ics2:
-            ics_text.value += f"  - Earliest event in ICS2: {earliest_event_ics2}\n"
-            ics_text.value += f"  - Latest event in ICS2: {latest_event_ics2}\n"
-
-        if earliest_event_ics2 and earliest_event_ics1 and earliest_event_ics2 < earliest_event_ics1:
-            ics_text.value += "\nWarning: ICS2 has events before the earliest event in ICS1\n"
-        if latest_event_ics2 and latest_event_ics1 and latest_event_ics1 > latest_event_ics2:
-            ics_text.value += "\nWarning: ICS1 has events after the latest event in ICS2\n"
-
-    # Load the exclusions
-    exclusions = load_exclusions(main_window, exclusions_path) if exclusions_path else []
-    if not exclusions_path:
-        excl_text.value += "No EXCL file provided.\n\n"
-    else:
-        exclusions = load_exclusions(main_window, exclusions_path)
-        if exclusions:
-            excl_text.value += f"EXCL contains {len(exclusions)} exclusions:\n\n"
-            for excl in exclusions:
-                excl_text.value += f"  - '{excl}'\n"
-        else:
-            excl_text.value += "EXCL file was provided, but it was empty.\n\n"
+    ics_report.write(calendars_report(result))
+    excl_report.write(exclusion_list_report(result))
+    for report in (ics_report, excl_report):
+        await report.flush()
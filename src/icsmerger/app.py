@@ -1,3 +1,6 @@
+import time
+IMPORT_STARTED = time.perf_counter()    # For the startup timing report
+
 import os
 import asyncio
 import platform
@@ -5,21 +8,24 @@ import logging
 import toga
 import toga.paths
 import toga.platform
-from threading import Thread
 from toga.style import Pack
 from toga.style.pack import COLUMN, ROW, CENTER, TOP
 from toga.command import Group
 from pathlib import Path
 from .__init__ import __version__
 from .descriptions import gui_descriptions
-from .merge import run_merge
-from .analyze import analyze
-from .fileio import save_config, load_config, get_appdir, create_file
-from .content import show_content_in_window, edit_exclusions_window
-from .update import update_checker
+from .fileio import save_config, load_config, get_appdir, get_event_cachedir, get_profiledir, create_file
+from .options import PARSERS, DEFAULT_PARSER, DIFF_MODES, DEFAULT_DIFF_MODE, DEFAULT_DAYS_BEFORE, DEFAULT_DAYS_AFTER, DEFAULT_MAX_BYTES, DEFAULT_CHECK_INTERVAL_HOURS, DEFAULT_WATCH_DEBOUNCE_SECONDS
+from .timing import StageTimer, profile_path
+
+# The modules behind Analyze, Merge, View and the update check pull in icalendar and
+# requests, so they are imported when first used rather than before the window is shown.
+IMPORTED = time.perf_counter()
 
 class ICSMerger(toga.App):
     def startup(self):
+        startup_timer = StageTimer("Startup")
+        startup_timer.add("imports", IMPORTED - IMPORT_STARTED)
 
         self.platform = platform.system()
         self.analyze_open = False
@@ -33,6 +39,7 @@ class ICSMerger(toga.App):
         # Load configuration
         self.config_path = get_appdir(self)
         self.config = load_config(self)
+        startup_timer.mark("config")
 
         # Dictionary to store full file paths
         self.file_paths = {}
@@ -45,7 +52,7 @@ class ICSMerger(toga.App):
         main_box.add(ics1_box)
 
         # ICS2 file selection
-        ics2_box, self.ics2_entry, self.ics2_clear_button, self.ics2_browse_button, self.ics2_view_button = self.create_file_selection_row("ics2_description", "Required: New iCal (.ics) file", "ics2", "ICS2", ["ICS"])
+        ics2_box, self.ics2_entry, self.ics2_clear_button, self.ics2_browse_button, self.ics2_view_button = self.create_file_selection_row("ics2_description", "Required: New iCal (.ics) file(s)", "ics2", "ICS2", ["ICS"])
         main_box.add(ics2_box)
 
         # Exclusions file selection
@@ -56,13 +63,23 @@ class ICSMerger(toga.App):
         checkmark_box = toga.Box(style=Pack(direction=ROW, padding=10))
         self.checkmark = toga.Switch("Convert events to all-day events", value=False)
         checkmark_box.add(self.checkmark)
+
+        # Date window option (ISO dates, "today", or offsets such as "+6m")
+        self.date_from_entry = toga.TextInput(placeholder="From: YYYY-MM-DD or -30d", style=Pack(padding_left=40, width=180))
+        self.date_to_entry = toga.TextInput(placeholder="To: YYYY-MM-DD or +6m", style=Pack(padding_left=10, width=180))
+        checkmark_box.add(self.date_from_entry)
+        checkmark_box.add(self.date_to_entry)
         main_box.add(checkmark_box)
 
         # Pre-populate entries based on configuration
         if 'ics1_path' in self.config:
             self.ics1_entry.value = os.path.basename(self.config['ics1_path'])
             self.file_paths['ics1'] = Path(self.config['ics1_path'])
-        if 'ics2_path' in self.config:
+        if len(self.config.get('ics2_paths', [])) > 1:
+            # Several ICS2 feeds, merged as one new calendar
+            self.file_paths['ics2'] = [Path(path) for path in self.config['ics2_paths']]
+            self.ics2_entry.value = self.entry_text(self.file_paths['ics2'])
+        elif 'ics2_path' in self.config:
             self.ics2_entry.value = os.path.basename(self.config['ics2_path'])
             self.file_paths['ics2'] = Path(self.config['ics2_path'])
         if 'exclusions_path' in self.config:
@@ -70,6 +87,38 @@ class ICSMerger(toga.App):
             self.file_paths['exclusions'] = Path(self.config['exclusions_path'])
         if 'all_day' in self.config:
             self.checkmark.value = self.config['all_day']
+        self.date_from_entry.value = self.config.get('date_from', '')
+        self.date_to_entry.value = self.config.get('date_to', '')
+
+        # Event extraction parser ("stream", "parallel" or "calendar")
+        self.parser = self.config.get('parser', DEFAULT_PARSER)
+        if self.parser not in PARSERS:
+            logging.error(f"Unknown parser in configuration: {self.parser}. Using {DEFAULT_PARSER}.")
+            self.parser = DEFAULT_PARSER
+
+        # How Merge compares calendars ("event" or "uid")
+        self.diff_mode = self.config.get('diff_mode', DEFAULT_DIFF_MODE)
+        if self.diff_mode not in DIFF_MODES:
+            logging.error(f"Unknown diff mode in configuration: {self.diff_mode}. Using {DEFAULT_DIFF_MODE}.")
+            self.diff_mode = DEFAULT_DIFF_MODE
+
+        # Expansion of recurring events into occurrences, within a window of days around today
+        self.expand_recurrences = self.config.get('expand_recurrences', False)
+        self.recurrence_days_before = self.config.get('recurrence_days_before', DEFAULT_DAYS_BEFORE)
+        self.recurrence_days_after = self.config.get('recurrence_days_after', DEFAULT_DAYS_AFTER)
+
+        # Automatic update checks within this many hours of the last one use its result
+        self.update_check_hours = self.config.get('update_check_hours', DEFAULT_CHECK_INTERVAL_HOURS)
+
+        # Parsed-calendar cache, so unchanged files are not re-parsed on every Analyze, Merge and View
+        self.cache_max_bytes = self.config.get('cache_max_bytes', DEFAULT_MAX_BYTES)
+        self._event_cache = None
+
+        # Watch mode (in the merge window) reruns a merge once ICS2 and EXCL have been quiet this long
+        self.watch_debounce = self.config.get('watch_debounce_seconds', DEFAULT_WATCH_DEBOUNCE_SECONDS)
+
+        # Opt-in: write a cProfile of each Analyze and Merge run to the cache directory
+        self.profile = self.config.get('profile', False)
 
         # Bottom button box
         save_button = toga.Button('Save Configuration', on_press=self.save_configuration, style=Pack(padding=10))
@@ -92,21 +141,48 @@ class ICSMerger(toga.App):
             check_for_updates_command = toga.Command(lambda w: self.update_helper(False), 'Check for updates...', group=Group.APP)
         self.commands.add(check_for_updates_command)
 
+        startup_timer.mark("widgets")
+
         # Activate the main window
         self.main_window.content = main_box
         self.main_window.show()
+        startup_timer.mark("window")
 
-        # Check for updates
+        # Check for updates (in the background, once the window is up)
         self.update_helper(True)
 
         # Initial validation of file entries
         self.validate_files()
+        startup_timer.mark("validation")
+        startup_timer.log()
+
+    @property
+    def event_cache(self):
+        """The cache.EventCache, created when Analyze, Merge or View first needs it."""
+        if self._event_cache is None:
+            from .cache import EventCache
+            self._event_cache = EventCache(get_event_cachedir(self), self.cache_max_bytes)
+        return self._event_cache
+
+    def profile_path(self, name):
+        """
+        Get the path to write the profile of an Analyze or Merge run to, if profiling is enabled.
+
+        Args:
+            name: The name of the run, e.g. "merge".
+
+        Returns:
+            str: A new path in the profile directory, or None.
+        """
+        if not self.profile:
+            return None
+        return profile_path(get_profiledir(self), name)
 
     def update_helper(self, type):
         async def task(widget):
+            from .update import update_checker
             await update_checker(self, type)
-        update_thread = Thread(target=toga.App.app.add_background_task(task))
-        update_thread.start()
+        toga.App.app.add_background_task(task)
 
     def create_file_selection_row(self, description_key, placeholder_text, entry_key, entry_name, file_types):
         button_width = 60
@@ -147,8 +223,31 @@ class ICSMerger(toga.App):
     def show_description(self, file, key):
         self.main_window.info_dialog(file, gui_descriptions[key])
 
+    def entry_text(self, paths):
+        """
+        Describe several selected files in a file entry.
+
+        Args:
+            paths: The file paths.
+
+        Returns:
+            str: e.g. "3 files: team-a.ics, team-b.ics, team-c.ics".
+        """
+        return f"{len(paths)} files: " + ", ".join(os.path.basename(path) for path in paths)
+
     async def select_file(self, key, file_types):
-        file_path = await self.main_window.open_file_dialog('Select File', file_types=file_types)
+        if key == 'ics2':
+            # ICS2 may be several feeds, merged as one new calendar
+            file_paths = await self.main_window.open_file_dialog('Select File(s)', file_types=file_types, multiple_select=True)
+            logging.debug(f"Selected files: {file_paths}")
+            if file_paths and len(file_paths) > 1:
+                self.file_paths[key] = [Path(path) for path in file_paths]
+                self.ics2_entry.value = self.entry_text(file_paths)
+                self.validate_files()
+                return
+            file_path = file_paths[0] if file_paths else None
+        else:
+            file_path = await self.main_window.open_file_dialog('Select File', file_types=file_types)
         logging.debug(f"Selected file: {file_path}")
         if file_path:
             file_name = os.path.basename(file_path)
@@ -173,7 +272,9 @@ class ICSMerger(toga.App):
 
     def validate_files(self):
         ics1_valid = 'ics1' in self.file_paths and self.file_paths['ics1'].is_file()
-        ics2_valid = 'ics2' in self.file_paths and self.file_paths['ics2'].is_file()
+        ics2_paths = self.file_paths.get('ics2')
+        ics2_multiple = isinstance(ics2_paths, list)
+        ics2_valid = ics2_paths is not None and all(path.is_file() for path in (ics2_paths if ics2_multiple else [ics2_paths]))
         exclusions_valid = 'exclusions' in self.file_paths and self.file_paths['exclusions'].is_file()
         logging.debug(f"ICS1 Valid: {ics1_valid}")
         logging.debug(f"ICS2 Valid: {ics2_valid}")
@@ -183,7 +284,7 @@ class ICSMerger(toga.App):
         if not self.merge_open:
             self.merge_button.enabled = ics2_valid
         self.ics1_view_button.enabled = ics1_valid
-        self.ics2_view_button.enabled = ics2_valid
+        self.ics2_view_button.enabled = ics2_valid and not ics2_multiple    # View shows one file
         if exclusions_valid:
             self.exclusions_edit_button.text = "Edit"
             self.exclusions_edit_button.on_press=lambda widget: asyncio.create_task(self.view_edit_exclusions_file("exclusions"))
@@ -214,16 +315,46 @@ class ICSMerger(toga.App):
         logging.debug(f"ics1_path: {ics1_path}")
         if ics1_path == ".":
             ics1_path = ""
-        ics2_path = str(self.file_paths.get('ics2', ''))
+        ics2_path = self.file_paths.get('ics2', '')
+        if isinstance(ics2_path, list):
+            ics2_path = [str(path) for path in ics2_path]
+        else:
+            ics2_path = str(ics2_path)
+            if ics2_path == ".":
+                ics2_path = ""
         logging.debug(f"ics2_path: {ics2_path}")
-        if ics2_path == ".":
-            ics2_path = ""
         exclusions_path = str(self.file_paths.get('exclusions', ''))
         logging.debug(f"exclusions_path: {exclusions_path}")
         if exclusions_path == ".":
             exclusions_path = ""
         return ics1_path, ics2_path, exclusions_path
 
+    def get_expander(self):
+        """
+        Get a recurrence expander for an Analyze or Merge run, if expansion is enabled.
+
+        Returns:
+            RecurrenceExpander: A new expander, or None.
+        """
+        if not self.expand_recurrences:
+            return None
+        from .recurrence import RecurrenceExpander, default_window
+        return RecurrenceExpander(*default_window(self.recurrence_days_before, self.recurrence_days_after))
+
+    def get_window(self):
+        """
+        Get the date window entered in the main window, reporting invalid dates in a dialog.
+
+        Returns:
+            A tuple of (True, DateWindow or None) if valid, (False, None) otherwise.
+        """
+        from .window import DateWindow
+        try:
+            return True, DateWindow.from_strings(self.date_from_entry.value, self.date_to_entry.value)
+        except ValueError as e:
+            self.main_window.error_dialog('Warning', f"Invalid date window: {e}")
+            return False, None
+
     def check_paths(self, ics1_path, ics2_path, exclusions_path):
         # Sanity checks, though they should not really be necessary.
         if not ics2_path:
@@ -232,9 +363,10 @@ class ICSMerger(toga.App):
         if ics1_path and not os.path.exists(ics1_path):
             self.main_window.error_dialog("Error", f"File not found: {ics1_path}")
             return False
-        if not os.path.exists(ics2_path):
-            self.main_window.error_dialog("Error", f"File not found: {ics2_path}")
-            return False
+        for path in (ics2_path if isinstance(ics2_path, list) else [ics2_path]):
+            if not os.path.exists(path):
+                self.main_window.error_dialog("Error", f"File not found: {path}")
+                return False
         if exclusions_path and not os.path.exists(exclusions_path):
             self.main_window.error_dialog("Error", f"File not found: {exclusions_path}")
             return False
@@ -253,8 +385,10 @@ class ICSMerger(toga.App):
         ics1_path, ics2_path, exclusions_path = self.get_paths()
         logging.debug(f"\n\tics1_path:\t{ics1_path}\n\tics2_path:\t{ics2_path}\n\texclusions_path:\t{exclusions_path}")
         sanity_check = self.check_paths(ics1_path, ics2_path, exclusions_path)
-        if sanity_check:
-            asyncio.create_task(analyze(self, ics1_path, ics2_path, exclusions_path))
+        valid_window, window = self.get_window()
+        if sanity_check and valid_window:
+            from .analyze import analyze
+            asyncio.create_task(analyze(self, ics1_path, ics2_path, exclusions_path, window))
 
     def merge_button_action(self, widget):
         """
@@ -270,8 +404,10 @@ class ICSMerger(toga.App):
         all_day = self.checkmark.value
         logging.debug(f"\n\tics1_path:\t{ics1_path}\n\tics2_path:\t{ics2_path}\n\texclusions_path:\t{exclusions_path}\n\tall_day:\t{all_day}")
         sanity_check = self.check_paths(ics1_path, ics2_path, exclusions_path)
-        if sanity_check:
-            asyncio.create_task(run_merge(self, ics1_path, ics2_path, exclusions_path, all_day))
+        valid_window, window = self.get_window()
+        if sanity_check and valid_window:
+            from .merge import run_merge
+            asyncio.create_task(run_merge(self, ics1_path, ics2_path, exclusions_path, all_day, window))
 
     async def save_configuration(self, widget):
             """
@@ -286,11 +422,24 @@ class ICSMerger(toga.App):
             ics1_path, ics2_path, exclusions_path = self.get_paths()
             all_day = self.checkmark.value
 
+            ics2_paths = ics2_path if isinstance(ics2_path, list) else [ics2_path] if ics2_path else []
             config = {
                 'ics1_path': ics1_path,
-                'ics2_path': ics2_path,
+                'ics2_path': ics2_paths[0] if ics2_paths else '',
+                'ics2_paths': ics2_paths,
                 'exclusions_path': exclusions_path,
-                'all_day' : all_day
+                'all_day' : all_day,
+                'date_from' : self.date_from_entry.value,
+                'date_to' : self.date_to_entry.value,
+                'parser' : self.parser,
+                'diff_mode' : self.diff_mode,
+                'expand_recurrences' : self.expand_recurrences,
+                'recurrence_days_before' : self.recurrence_days_before,
+                'recurrence_days_after' : self.recurrence_days_after,
+                'cache_max_bytes' : self.cache_max_bytes,
+                'update_check_hours' : self.update_check_hours,
+                'watch_debounce_seconds' : self.watch_debounce,
+                'profile' : self.profile
             }
             logging.debug(f"config: {config.items()}")
             save_config(self, config)
@@ -305,7 +454,8 @@ class ICSMerger(toga.App):
         try:
             with file_path.open('r') as file:
                 content = file.read()
-            await show_content_in_window(self, content, str(file_path), key)
+            from .content import show_content_in_window
+            await show_content_in_window(self, content, str(file_path), key, file_path)
         except Exception as e:
             self.main_window.error_dialog('Error', f'Failed to open file: {e}')
 
@@ -319,6 +469,7 @@ class ICSMerger(toga.App):
         try:
             with file_path.open('r') as file:
                 content = file.read()
+                from .content import edit_exclusions_window
                 await edit_exclusions_window(self, content, str(file_path))
         except Exception as e:
             self.main_window.error_dialog('Error', f'Failed to open exclusions file: {e}')
@@ -0,0 +1,274 @@
+import os
+import pickle
+import logging
+import hashlib
+import tempfile
+from .ical import load_event_set, load_keyed_events, DEFAULT_PARSER
+from .store import load_event_store
+from .stats import load_calendar_stats
+from .fileio import file_sha256
+from .options import DEFAULT_MAX_BYTES
+
+# Bump when the pickled entry format (or the event tuples) or the entry names change, so stale entries are ignored
+CACHE_VERSION = 3
+
+class EventCache():
+    """
+    An on-disk cache of the events extracted from iCalendar files.
+
+    Each entry holds the events of one file, plus the file's size, mtime and sha256.
+    An entry is used if the size and mtime still match; if only the mtime changed, the
+    file is hashed and the entry is used (and refreshed) if the contents are unchanged.
+    Entries are evicted least recently used first once the cache grows past max_bytes.
+    """
+    def __init__(self, cache_dir, max_bytes=DEFAULT_MAX_BYTES):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        os.makedirs(self.cache_dir, exist_ok=True)
+
+    def load(self, file_path, full=False, parser=DEFAULT_PARSER, cancel=None, expander=None, window=None):
+        """
+        Get the events of a file from the cache, parsing and caching them on a miss.
+
+        Args:
+            file_path: The path to the iCalendar file.
+            full: If True, use the get_event_set_full tuples.
+            parser: The parser to use on a miss, one of options.PARSERS.
+            cancel: An optional threading.Event that aborts parsing when set.
+            expander: An optional recurrence.RecurrenceExpander.
+            window: An optional window.DateWindow that events must overlap.
+                Events are cached separately for each parser, and each key of the expander and window.
+
+        Returns:
+            A set of get_event_set_full tuples if full, otherwise a store.EventStore.
+
+        Raises:
+            Exception: Any error raised while reading or parsing the file.
+        """
+        variant = self.variant(parser, expander, window)
+        events = self.get(file_path, full, variant)
+        if events is None:
+            stat = os.stat(file_path)  # Before parsing, so a concurrent write leaves the entry stale rather than wrong
+            events = parse_file(file_path, full, parser, cancel, expander, window)
+            self.put(file_path, full, events, stat=stat, variant=variant)
+        return events
+
+    def load_stats(self, file_path, parser=DEFAULT_PARSER, cancel=None, expander=None, window=None):
+        """
+        Get the statistics of a file from the cache, collecting and caching them on a miss.
+
+        Args:
+            file_path: The path to the iCalendar file.
+            parser: The parser to use on a miss, one of options.PARSERS.
+            cancel: An optional threading.Event that aborts parsing when set.
+            expander: An optional recurrence.RecurrenceExpander.
+            window: An optional window.DateWindow that events must overlap.
+
+        Returns:
+            stats.CalendarStats: The statistics.
+
+        Raises:
+            Exception: Any error raised while reading or parsing the file.
+        """
+        variant = "|".join(("stats", self.variant(parser, expander, window)))
+        stats = self.get(file_path, False, variant)
+        if stats is None:
+            stat = os.stat(file_path)
+            stats = load_calendar_stats(file_path, parser, cancel, expander, window)
+            self.put(file_path, False, stats, stat=stat, variant=variant)
+        return stats
+
+    def load_keyed(self, file_path, parser=DEFAULT_PARSER, cancel=None, expander=None, window=None):
+        """
+        Get the keyed events of a file (see ical.load_keyed_events) from the cache, loading and caching them on a miss.
+
+        Args:
+            file_path: The path to the iCalendar file.
+            parser: The parser to use on a miss, one of options.PARSERS.
+            cancel: An optional threading.Event that aborts parsing when set.
+            expander: An optional recurrence.RecurrenceExpander.
+            window: An optional window.DateWindow that events must overlap.
+
+        Returns:
+            A list of ical.get_event_list_keyed tuples.
+
+        Raises:
+            Exception: Any error raised while reading or parsing the file.
+        """
+        variant = "|".join(("keyed", self.variant(parser, expander, window)))
+        events = self.get(file_path, False, variant)
+        if events is None:
+            stat = os.stat(file_path)
+            events = load_keyed_events(file_path, parser, cancel, expander, window)
+            self.put(file_path, False, events, stat=stat, variant=variant)
+        return events
+
+    @staticmethod
+    def variant(parser=DEFAULT_PARSER, expander=None, window=None):
+        """
+        Get the variant that entries loaded with the given settings are stored under.
+        watch.SnapshotCache keys its snapshots on it too.
+
+        Args:
+            parser: The parser, one of options.PARSERS. The parsers do not produce identical
+                tuples for every file, so each one has its own entries.
+            expander: An optional recurrence.RecurrenceExpander.
+            window: An optional window.DateWindow.
+
+        Returns:
+            str: The variant (see entry_path).
+        """
+        return "|".join([parser] + [option.key for option in (expander, window) if option is not None])
+
+    def entry_path(self, file_path, full, variant=""):
+        """
+        Get the path of the cache entry for a file.
+
+        Args:
+            file_path: The path to the iCalendar file.
+            full: If True, the entry for the get_event_set_full tuples.
+            variant: Distinguishes entries parsed with different settings (see load).
+
+        Returns:
+            str: The entry path.
+        """
+        name = f"{CACHE_VERSION}:{int(full)}:{variant}:{os.path.abspath(file_path)}"
+        return os.path.join(self.cache_dir, hashlib.sha256(name.encode("utf-8")).hexdigest() + ".pickle")
+
+    def get(self, file_path, full=False, variant=""):
+        """
+        Get the cached events of a file.
+
+        Args:
+            file_path: The path to the iCalendar file.
+            full: If True, the get_event_set_full tuples.
+            variant: See entry_path.
+
+        Returns:
+            The cached events (see load), or None on a miss.
+        """
+        entry_path = self.entry_path(file_path, full, variant)
+        try:
+            with open(entry_path, 'rb') as f:
+                entry = pickle.load(f)
+        except FileNotFoundError:
+            logging.debug(f"Cache miss: {file_path}")
+            return None
+        except Exception as e:
+            logging.error(f"Discarding unreadable cache entry {entry_path}: {e}")
+            self.remove(entry_path)
+            return None
+
+        stat = os.stat(file_path)
+        if entry["size"] != stat.st_size:
+            logging.debug(f"Cache stale (size changed): {file_path}")
+            return None
+        if entry["mtime_ns"] != stat.st_mtime_ns:
+            if entry["sha256"] != file_sha256(file_path):
+                logging.debug(f"Cache stale (contents changed): {file_path}")
+                return None
+            # Same contents, new mtime: refresh the entry so the next lookup is stat-only
+            logging.debug(f"Cache hit (by hash): {file_path}")
+            self.put(file_path, full, entry["events"], entry["sha256"], variant=variant)
+            return entry["events"]
+
+        logging.debug(f"Cache hit: {file_path}")
+        try:
+            os.utime(entry_path)  # Mark as recently used
+        except OSError:
+            pass
+        return entry["events"]
+
+    def put(self, file_path, full, events, sha256=None, stat=None, variant=""):
+        """
+        Cache the events of a file, then evict old entries if the cache is too large.
+
+        Args:
+            file_path: The path to the iCalendar file.
+            full: If True, the get_event_set_full tuples.
+            events: The events (see load).
+            sha256: The file's sha256, if already known.
+            stat: The file's os.stat_result from before it was parsed, if known.
+            variant: See entry_path.
+        """
+        entry_path = self.entry_path(file_path, full, variant)
+        temp_path = None
+        try:
+            stat = stat or os.stat(file_path)
+            entry = {
+                "path": os.path.abspath(file_path),
+                "size": stat.st_size,
+                "mtime_ns": stat.st_mtime_ns,
+                "sha256": sha256 or file_sha256(file_path),
+                "events": events
+            }
+            fd, temp_path = tempfile.mkstemp(dir=self.cache_dir, suffix=".tmp")
+            with os.fdopen(fd, 'wb') as f:
+                pickle.dump(entry, f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(temp_path, entry_path)
+            logging.debug(f"Cached {len(events)} events: {file_path}")
+        except Exception as e:
+            logging.error(f"Failed to cache events for {file_path}: {e}")
+            if temp_path:
+                self.remove(temp_path)
+            return
+        self.evict()
+
+    def evict(self):
+        """
+        Remove the least recently used entries until the cache fits in max_bytes.
+
+        Other loads (see engine.load_concurrently) may be adding and evicting entries at the
+        same time, so entries that disappear while the cache is scanned are skipped.
+        """
+        entries = []
+        try:
+            with os.scandir(self.cache_dir) as scan:
+                for entry in scan:
+                    try:
+                        if entry.is_file() and entry.name.endswith(".pickle"):
+                            stat = entry.stat()
+                            entries.append((stat.st_mtime, stat.st_size, entry.path))
+                    except OSError:
+                        continue
+        except OSError as e:
+            logging.error(f"Failed to scan the cache {self.cache_dir}: {e}")
+            return
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            logging.debug(f"Evicting cache entry: {path}")
+            self.remove(path)
+            total -= size
+
+    def remove(self, entry_path):
+        """
+        Remove a cache entry, ignoring errors.
+
+        Args:
+            entry_path: The entry path.
+        """
+        try:
+            os.remove(entry_path)
+        except OSError:
+            pass
+
+def parse_file(file_path, full=False, parser=DEFAULT_PARSER, cancel=None, expander=None, window=None):
+    """
+    Parse the events of a file in the form they are cached in.
+
+    Args:
+        file_path: The path to the iCalendar file.
+        full: If True, the get_event_set_full tuples.
+        parser: The parser to use, one of options.PARSERS.
+        cancel: An optional threading.Event that aborts parsing when set.
+        expander: An optional recurrence.RecurrenceExpander.
+        window: An optional window.DateWindow that events must overlap.
+
+    Returns:
+        A set of get_event_set_full tuples if full, otherwise a store.EventStore.
+    """
+    if full:
+        return load_event_set(file_path, True, parser, cancel, expander, window)
+    return load_event_store(file_path, parser, cancel, expander, window)
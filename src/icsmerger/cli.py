@@ -0,0 +1,232 @@
+import sys
+import logging
+import argparse
+from .__init__ import __version__
+from .ical import DEFAULT_PARSER, NEWLINES
+from .cache import EventCache
+from .recurrence import RecurrenceExpander, default_window, DEFAULT_DAYS_BEFORE, DEFAULT_DAYS_AFTER
+from .window import DateWindow
+from .timing import profile_call
+from .options import PARSERS, DIFF_MODES, DEFAULT_DIFF_MODE, DEFAULT_WATCH_DEBOUNCE_SECONDS
+from .ical import Cancelled
+from .watch import FileWatcher, SnapshotCache
+from .export import export_result, EXPORT_FORMATS
+from .engine import feed_paths, check_inputs, merge_files, exclusions_report, removals_report, new_events_report, analyze_files, calendars_report, exclusion_list_report
+
+# Headless entry points: python -m icsmerger merge|analyze ...
+# This module (and everything it imports) must not import toga.
+COMMANDS = ("merge", "analyze")
+
+def build_parser():
+    """
+    Build the command line argument parser.
+
+    Returns:
+        argparse.ArgumentParser: The parser.
+    """
+    parser = argparse.ArgumentParser(prog="icsmerger", description="Merge iCalendar ics files without the GUI.")
+    parser.add_argument("--version", action="version", version=f"%(prog)s {__version__}")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    merge_parser = commands.add_parser("merge", help="Merge ICS2 into ICS1 and write the new events to an .ics file.")
+    add_input_arguments(merge_parser)
+    merge_parser.add_argument("-o", "--output", required=True, help="Path to write the new events (.ics) to.")
+    merge_parser.add_argument("--suggestions", help="Path to write the suggested removals to.")
+    merge_parser.add_argument("--export", help="Path to write the new events, suggested removals and excluded events to, as data (CSV, NDJSON or JSON).")
+    merge_parser.add_argument("--export-format", choices=EXPORT_FORMATS, help="Format of --export. Defaults to the one matching its extension (.csv, .ndjson/.jsonl, .json), or CSV.")
+    merge_parser.add_argument("--all-day", action="store_true", help="Convert events to all-day events.")
+    merge_parser.add_argument("--line-endings", choices=NEWLINES, default="lf", help="Line endings of the output file.")
+    merge_parser.add_argument("--diff", choices=DIFF_MODES, default=DEFAULT_DIFF_MODE, help="Compare events by summary and times (event), or match them by UID and report modified events (uid).")
+    merge_parser.add_argument("--watch", action="store_true", help="Keep running, and merge again whenever ICS2 or the exclusions file changes.")
+    merge_parser.add_argument("--debounce", type=float, default=DEFAULT_WATCH_DEBOUNCE_SECONDS, help="With --watch, wait until the files have been unchanged for this many seconds.")
+
+    analyze_parser = commands.add_parser("analyze", help="Report on ICS1, ICS2 and the exclusions file.")
+    add_input_arguments(analyze_parser)
+    return parser
+
+def add_input_arguments(parser):
+    """
+    Add the arguments shared by all commands.
+
+    Args:
+        parser (argparse.ArgumentParser): The command's parser.
+    """
+    parser.add_argument("--ics1", default="", help="Optional: Previous iCal (.ics) file.")
+    parser.add_argument("--ics2", required=True, nargs="+", help="Required: New iCal (.ics) file, or several files to merge as one.")
+    parser.add_argument("--exclusions", default="", help="Optional: Exclusions file.")
+    parser.add_argument("--parser", choices=PARSERS, default=DEFAULT_PARSER, help="Event extraction parser.")
+    parser.add_argument("--cache-dir", help="Cache parsed calendars in this directory, so unchanged files are not re-parsed.")
+    parser.add_argument("--from", dest="date_from", default="", help="Only load events on or after this date (YYYY-MM-DD, today, or an offset such as -30d).")
+    parser.add_argument("--to", dest="date_to", default="", help="Only load events on or before this date (YYYY-MM-DD, today, or an offset such as +6m).")
+    parser.add_argument("--expand-recurrences", action="store_true", help="Compare recurring events occurrence by occurrence.")
+    parser.add_argument("--days-before", type=int, default=DEFAULT_DAYS_BEFORE, help="Expand recurring events from this many days before today.")
+    parser.add_argument("--days-after", type=int, default=DEFAULT_DAYS_AFTER, help="Expand recurring events until this many days after today.")
+    parser.add_argument("--timings", action="store_true", help="Report how long each stage took.")
+    parser.add_argument("--profile", help="Write a cProfile of the run (readable with pstats) to this path.")
+    parser.add_argument("-q", "--quiet", action="store_true", help="Only print errors.")
+
+def get_cache(args):
+    """
+    Get the parsed-calendar cache requested on the command line.
+
+    Args:
+        args (argparse.Namespace): The parsed arguments.
+
+    Returns:
+        EventCache: The cache, or None if --cache-dir was not given.
+    """
+    return EventCache(args.cache_dir) if args.cache_dir else None
+
+def get_expander(args):
+    """
+    Get the recurrence expander requested on the command line.
+
+    Args:
+        args (argparse.Namespace): The parsed arguments.
+
+    Returns:
+        RecurrenceExpander: The expander, or None if --expand-recurrences was not given.
+    """
+    if not args.expand_recurrences:
+        return None
+    return RecurrenceExpander(*default_window(args.days_before, args.days_after))
+
+def get_window(args):
+    """
+    Get the date window requested on the command line.
+
+    Args:
+        args (argparse.Namespace): The parsed arguments.
+
+    Returns:
+        DateWindow: The window, or None if neither --from nor --to was given.
+
+    Raises:
+        ValueError: If a date is invalid.
+    """
+    return DateWindow.from_strings(args.date_from, args.date_to)
+
+def write_section(title, lines):
+    """
+    Write a titled report section to stdout, line by line.
+
+    Args:
+        title (str): The section title.
+        lines: The report lines, e.g. from engine.new_events_report.
+    """
+    sys.stdout.write(f"== {title} ==\n\n")
+    sys.stdout.writelines(lines)
+    sys.stdout.write("\n\n")
+
+def run_merge(args, cache=None):
+    """
+    Run a headless merge.
+
+    Args:
+        args (argparse.Namespace): The parsed arguments.
+        cache: The cache to load the calendars through. Defaults to the one requested on the command line.
+
+    Returns:
+        int: The exit status.
+    """
+    missing = check_inputs(args.ics1, args.ics2, args.exclusions)
+    if missing:
+        print("\n".join(missing), file=sys.stderr)
+        return 1
+
+    result = profile_call(args.profile, merge_files, args.ics1, args.ics2, args.exclusions, args.all_day, args.parser, cache or get_cache(args), output_path=args.output, newline=NEWLINES[args.line_endings], diff_mode=args.diff, expander=get_expander(args), window=args.window)
+    for error in result.errors:
+        print(error, file=sys.stderr)
+    if not result.loaded:
+        sys.stderr.writelines(new_events_report(result))
+        return 1
+
+    if args.suggestions:
+        with open(args.suggestions, 'w') as f:
+            f.writelines(removals_report(result))
+    if args.export:
+        export_result(result, args.export, args.export_format)
+
+    if not args.quiet:
+        write_section("Exclusions", exclusions_report(result))
+        write_section("Suggested Removals", removals_report(result))
+        write_section("New Events", new_events_report(result))
+        print(f"New events written to: {args.output}")
+    if args.timings:
+        write_section("Timings", result.timer.lines())
+    return 1 if result.errors else 0
+
+def run_watch(args, cancel=None):
+    """
+    Merge, then merge again whenever ICS2 or the exclusions file changes, until interrupted.
+
+    The calendars parsed by each merge are kept (see watch.SnapshotCache), so a rerun only
+    parses the files that changed.
+
+    Args:
+        args (argparse.Namespace): The parsed arguments.
+        cancel: An optional threading.Event that stops watching when set.
+
+    Returns:
+        int: The exit status.
+    """
+    snapshots = SnapshotCache(get_cache(args))
+    paths = feed_paths(args.ics2) + ([args.exclusions] if args.exclusions else [])
+    watcher = FileWatcher(paths, debounce=args.debounce)   # Before the first merge, so changes during it are seen
+    try:
+        while True:
+            run_merge(args, snapshots)
+            print(f"Watching {', '.join(paths)} for changes. Press Ctrl+C to stop.", flush=True)
+            changed = watcher.wait(cancel)
+            print(f"Changed: {', '.join(sorted(changed))}. Merging again.", flush=True)
+    except (KeyboardInterrupt, Cancelled):
+        return 0
+    finally:
+        watcher.close()
+
+def run_analyze(args):
+    """
+    Run a headless analysis.
+
+    Args:
+        args (argparse.Namespace): The parsed arguments.
+
+    Returns:
+        int: The exit status.
+    """
+    result = profile_call(args.profile, analyze_files, args.ics1, args.ics2, args.exclusions, args.parser, get_cache(args), expander=get_expander(args), window=args.window)
+    if result.missing:
+        print("\n".join(result.missing), file=sys.stderr)
+        return 1
+    for error in result.errors:
+        print(error, file=sys.stderr)
+    if not result.loaded:
+        return 1
+
+    if not args.quiet:
+        write_section("ICS Information", calendars_report(result))
+        write_section("Exclusions Information", exclusion_list_report(result))
+    if args.timings:
+        write_section("Timings", result.timer.lines())
+    return 1 if result.errors else 0
+
+def main(argv=None):
+    """
+    Run a command line command.
+
+    Args:
+        argv (list): The arguments, without the program name. Defaults to sys.argv[1:].
+
+    Returns:
+        int: The exit status.
+    """
+    parser = build_parser()
+    args = parser.parse_args(argv)
+    logging.debug(f"args: {args}")
+    try:
+        args.window = get_window(args)
+    except ValueError as e:
+        parser.error(f"invalid date window: {e}")
+    if args.command == "merge":
+        return run_watch(args) if args.watch else run_merge(args)
+    return run_analyze(args)
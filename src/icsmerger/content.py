@@ -1,12 +1,14 @@
 
+import io
 import logging
 import toga
 from toga.style import Pack
 from toga.style.pack import COLUMN, ROW
 from icalendar import Calendar
-from .ical import get_event_set_full
+from .ical import get_event_set_full, extract_events, event_sort_key
+from .timing import StageTimer
 
-async def show_content_in_window(self, content, title, key):
+async def show_content_in_window(self, content, title, key, file_path=None):
     def close_handler(widget):
         content_window.close()
         if key == 'ics1': 
@@ -18,13 +20,21 @@ async def show_content_in_window(self, content, title, key):
             self.ics2_browse_button.enabled = True
             self.ics2_view_button.enabled = True
     
-    cal = Calendar.from_ical(content)
-    events = sorted(get_event_set_full(cal), key=lambda x: x[1])
+    timer = StageTimer(f"View {title}")
+    if file_path is not None:
+        events = sorted(self.event_cache.load(file_path, full=True, parser=self.parser), key=event_sort_key)
+    elif self.parser != "calendar":
+        events = sorted(set(extract_events(io.BytesIO(content.encode("utf-8")), full=True)), key=event_sort_key)
+    else:
+        cal = Calendar.from_ical(content)
+        events = sorted(get_event_set_full(cal), key=event_sort_key)
+    timer.mark("load", len(events))
     events_text = ""
     count = 0
     for event in events:
         count += 1
         events_text += f"Event {count}:\n\tStart\t\t\t{event[1]}\n\tEnd:\t\t\t{event[2]}\n\tStamp:\t\t\t{event[3]}\n\tUID:\t\t\t{event[4]}\n\tSummary:\t\t{event[0]}\n\tDescription:\t{event[5]}\n"
+    timer.mark("format")
 
     window_width, window_height = 800, 600
     position_x, position_y = self.window_position(window_width, window_height)
@@ -60,6 +70,8 @@ async def show_content_in_window(self, content, title, key):
     formatted_tab = option_container.content["Formatted"]
     option_container.current_tab = raw_tab
     option_container.current_tab = formatted_tab
+    timer.mark("window")
+    timer.log()
  
     if key == 'ics1': 
         self.ics1_clear_button.enabled = False 
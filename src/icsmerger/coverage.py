@@ -0,0 +1,97 @@
+import logging
+from array import array
+from bisect import bisect_right
+from .store import epoch_micros
+
+MICROSECONDS_PER_DAY = 24 * 60 * 60 * 1000000
+
+# Ranges of days separated by no more than this many days without events are merged,
+# so a quiet week in ICS2 still counts as covered
+DEFAULT_GAP_DAYS = 7
+
+class CoverageIndex():
+    """
+    The days covered by the events of a calendar, as sorted, merged day ranges.
+
+    Days are counted from the epoch using the EventStore columns: the UTC day for aware
+    datetimes, and the wall-clock day for naive datetimes and dates. A lookup is a binary
+    search over the ranges, so checking n events against a calendar costs O(n log m).
+    """
+    def __init__(self, events=None, gap_days=DEFAULT_GAP_DAYS):
+        """
+        Args:
+            events: A store.EventStore, or None for an empty index (see from_spans).
+            gap_days: Merge ranges separated by at most this many days without events.
+        """
+        self.gap_days = gap_days
+        self.range_starts = array('q')  # First day of each merged range, in increasing order
+        self.range_ends = array('q')    # Last day of each merged range
+
+        if not events:
+            return
+        first_days = array('q', (start // MICROSECONDS_PER_DAY for start in events.starts))
+        self.add_spans(
+            (first_days[row], max(first_days[row], (events.ends[row] - 1) // MICROSECONDS_PER_DAY))  # DTEND is exclusive
+            for row in sorted(range(len(events)), key=first_days.__getitem__)
+        )
+        logging.debug(f"Coverage index: {len(events)} events in {len(self.range_starts)} day range(s)")
+
+    @classmethod
+    def from_spans(cls, spans, gap_days=DEFAULT_GAP_DAYS):
+        """
+        Build an index from day spans, e.g. from stats.CalendarStats.spans.
+
+        Args:
+            spans: An iterable of (first day, last day) since the epoch, inclusive.
+            gap_days: Merge ranges separated by at most this many days without events.
+
+        Returns:
+            CoverageIndex: The index.
+        """
+        index = cls(gap_days=gap_days)
+        index.add_spans(sorted(spans))
+        return index
+
+    def add_spans(self, spans):
+        """
+        Merge day spans into the ranges.
+
+        Args:
+            spans: An iterable of (first day, last day), sorted by first day and starting
+                no earlier than the existing ranges.
+        """
+        for first_day, last_day in spans:
+            if self.range_ends and first_day <= self.range_ends[-1] + self.gap_days + 1:
+                if last_day > self.range_ends[-1]:
+                    self.range_ends[-1] = last_day
+            else:
+                self.range_starts.append(first_day)
+                self.range_ends.append(last_day)
+
+    def __len__(self):
+        return len(self.range_starts)
+
+    def covers_day(self, day):
+        """
+        Check whether a day is covered.
+
+        Args:
+            day: Days since the epoch.
+
+        Returns:
+            bool: True if the day is in one of the ranges.
+        """
+        index = bisect_right(self.range_starts, day) - 1
+        return index >= 0 and day <= self.range_ends[index]
+
+    def covers(self, value):
+        """
+        Check whether the day of a date or datetime is covered.
+
+        Args:
+            value: A date or datetime, e.g. an event's dtstart.
+
+        Returns:
+            bool: True if the day is in one of the ranges.
+        """
+        return self.covers_day(epoch_micros(value)[1] // MICROSECONDS_PER_DAY)
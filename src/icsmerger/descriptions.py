@@ -1,7 +1,7 @@
 gui_descriptions = {
     "root_title": "ICS Merger",
     "ics1_description": "The iCal (.ics) file you used for the previous run of this tool.\n\nIf no file, or an invalid file, is provided, an empty iCal with no events will be used. This useful for the first run of this program.",
-    "ics2_description": "The new iCal (.ics) file to grab events from. These events will be merged with events from ICS1, if provided.",
+    "ics2_description": "The new iCal (.ics) file to grab events from. These events will be merged with events from ICS1, if provided. Select several files to merge their events into one new calendar; events in more than one file are only added once.",
     "exclusions_description": "An optional file containing one string per line. When matched to an event's Summary, these strings will cause that event to be excluded from the output",
     "ics1": "ICS1",
     "ics2": "ICS2",
@@ -0,0 +1,124 @@
+import logging
+from datetime import datetime
+from .ical import sort_key, check_cancel, CANCEL_CHECK_INTERVAL
+
+class UidDiff():
+    """
+    The outcome of joining two lists of ical.get_event_list_keyed tuples on UID.
+
+    Attributes:
+        added: Events only in the new calendar.
+        removed: Events only in the old calendar.
+        modified: (old, new) pairs with the same UID whose summary, start or end changed,
+            where the new event is the newer revision.
+        unchanged: The number of events that are the same in both calendars, or where the
+            old event is the newer revision.
+    """
+    def __init__(self):
+        self.added = []
+        self.removed = []
+        self.modified = []
+        self.unchanged = 0
+
+def event_key(event):
+    """
+    Get the identity of a keyed event.
+
+    Args:
+        event: An ical.get_event_list_keyed tuple.
+
+    Returns:
+        A tuple of (uid, recurrence_id sort key), or None if the event has no UID.
+    """
+    if not event[3]:
+        return None
+    return (event[3], sort_key(event[4]) if event[4] is not None else None)
+
+def revision(event):
+    """
+    Get the revision of a keyed event, for picking the newer of two events with the same UID.
+
+    Args:
+        event: An ical.get_event_list_keyed tuple.
+
+    Returns:
+        A tuple of (SEQUENCE, DTSTAMP sort key) that orders older revisions first.
+    """
+    return (event[5], sort_key(event[6]) if event[6] is not None else datetime.min)
+
+def newer(event, other):
+    """
+    Pick the newer of two events with the same UID.
+
+    Args:
+        event: An ical.get_event_list_keyed tuple, or None.
+        other: An ical.get_event_list_keyed tuple.
+
+    Returns:
+        other if it is at least as new as event, otherwise event.
+    """
+    if event is None or revision(other) >= revision(event):
+        return other
+    return event
+
+def diff_by_uid(events1, events2, cancel=None):
+    """
+    Compare two calendars by UID with a hash join: ICS1 is indexed by UID, then ICS2 is
+    probed against the index in one pass. Events without a UID are compared by
+    (summary, dtstart, dtend), as in the "event" diff mode.
+
+    Args:
+        events1: The ical.get_event_list_keyed tuples of the old calendar (ICS1).
+        events2: The ical.get_event_list_keyed tuples of the new calendar (ICS2).
+        cancel: An optional threading.Event, checked every CANCEL_CHECK_INTERVAL events.
+
+    Returns:
+        A UidDiff.
+
+    Raises:
+        Cancelled: If cancel was set.
+    """
+    diff = UidDiff()
+
+    # Build: the newest revision of each ICS1 event by key
+    index = {}
+    unkeyed1 = {}
+    for event in events1:
+        key = event_key(event)
+        if key is None:
+            unkeyed1.setdefault(event[:3], event)
+        else:
+            index[key] = newer(index.get(key), event)
+
+    # Probe with the newest revision of each ICS2 event by key
+    probes = {}
+    unkeyed2 = {}
+    for event in events2:
+        key = event_key(event)
+        if key is None:
+            unkeyed2.setdefault(event[:3], event)
+        else:
+            probes[key] = newer(probes.get(key), event)
+
+    for count, (key, event) in enumerate(probes.items(), 1):
+        if count % CANCEL_CHECK_INTERVAL == 0:
+            check_cancel(cancel)
+        old = index.pop(key, None)
+        if old is None:
+            diff.added.append(event)
+        elif old[:3] == event[:3] or newer(old, event) is old:
+            diff.unchanged += 1
+        else:
+            diff.modified.append((old, event))
+    diff.removed.extend(index.values())
+
+    # UID-less events fall back to the (summary, dtstart, dtend) key
+    for key, event in unkeyed2.items():
+        if key in unkeyed1:
+            diff.unchanged += 1
+        else:
+            diff.added.append(event)
+    diff.removed.extend(event for key, event in unkeyed1.items() if key not in unkeyed2)
+
+    logging.debug(f"UID diff: {len(diff.added)} added, {len(diff.removed)} removed, {len(diff.modified)} modified, {diff.unchanged} unchanged")
+    return diff
@@ -0,0 +1,702 @@
+import os
+import shutil
+import logging
+import tempfile
+from functools import partial
+from concurrent.futures import ThreadPoolExecutor
+from .ical import load_keyed_events, write_ics, as_date, event_sort_key, check_cancel, Cancelled, NEWLINES, DEFAULT_PARSER
+from .exclusions import ExclusionMatcher, read_exclusions, filter_exclusions, format_exclusions
+from .diff import diff_by_uid
+from .store import EventStore, load_event_store, merge_stores
+from .coverage import CoverageIndex
+from .stats import CalendarStats, load_calendar_stats
+from .descriptions import merge_descriptions
+from .timing import StageTimer
+from .options import DEFAULT_DIFF_MODE
+
+# The merge and analysis core. Nothing in this module may import toga, so that
+# it can be driven headless from the command line (see cli.py).
+
+# Stages reported to the progress callbacks of merge_files and analyze_files
+MERGE_STAGES = ("Loading files", "Filtering exclusions", "Comparing calendars", "Building output")
+ANALYZE_STAGES = ("Loading files", "Matching exclusions")
+
+class MergeResult():
+    """
+    The outcome of merging ICS2 into ICS1.
+
+    Attributes:
+        loaded: False if neither calendar could be loaded.
+        first_run: True if no ICS1 was provided (nothing to suggest for removal).
+        exclusions: The exclusion strings, or None if no EXCL file was provided.
+        excluded_ics1: {event: matching exclusion} for events from ICS1 that matched an exclusion.
+        excluded_ics2: {event: matching exclusion} for events from ICS2 that matched an exclusion.
+        diff_mode: How the calendars were compared, one of options.DIFF_MODES.
+        new_events: Events in ICS2 that are not in ICS1 (including the new side of modified).
+        modified: (old, new) pairs of events with the same UID that changed ("uid" diff mode only).
+        removals: Events in ICS1 that are not in ICS2, on dates ICS2 covers (suggested removals).
+        uncovered: Events in ICS1 that are not in ICS2, on dates ICS2 does not cover (not suggested).
+        output_path: The .ics file the new events were written to, or None.
+        spooled: True if output_path is a temporary file owned by the result (see discard_output).
+        errors: Messages for files that could not be loaded.
+        timer: The timing.StageTimer of the merge's stages.
+    """
+    def __init__(self):
+        self.loaded = True
+        self.first_run = False
+        self.exclusions = None
+        self.excluded_ics1 = {}
+        self.excluded_ics2 = {}
+        self.diff_mode = DEFAULT_DIFF_MODE
+        self.new_events = set()
+        self.modified = []
+        self.removals = set()
+        self.uncovered = set()
+        self.output_path = None
+        self.spooled = False
+        self.errors = []
+        self.timer = StageTimer("Merge")
+
+class AnalysisResult():
+    """
+    The outcome of analyzing ICS1, ICS2 and the exclusions file.
+
+    Attributes:
+        ics1_path: The ICS1 path ("" if not provided).
+        window: The window.DateWindow events were loaded from, or None.
+        stats_ics1, stats_ics2: The stats.CalendarStats of each calendar.
+        ics1_count, ics2_count: The number of events in each calendar.
+        earliest_ics1, latest_ics1, earliest_ics2, latest_ics2: The first and last event dates, or None.
+        uncovered_ics1: The number of ICS1 events on dates ICS2 does not cover.
+        exclusions: The exclusion strings, or None if no EXCL file was provided.
+        excluded_ics1, excluded_ics2: Counters of {exclusion: number of matching events} for each calendar.
+        ics2_feeds: The number of ICS2 files, analyzed as one calendar.
+        feed_duplicates: The number of events in more than one ICS2 feed, counted once.
+        missing: Messages for input files that do not exist. If set, nothing was analyzed.
+        loaded: False if ICS2 could not be loaded.
+        errors: Messages for files that could not be loaded.
+        timer: The timing.StageTimer of the analysis's stages.
+    """
+    def __init__(self, ics1_path):
+        self.ics1_path = ics1_path
+        self.window = None
+        self.missing = []
+        self.loaded = True
+        self.ics1_count = 0
+        self.ics2_count = 0
+        self.earliest_ics1 = None
+        self.latest_ics1 = None
+        self.earliest_ics2 = None
+        self.latest_ics2 = None
+        self.uncovered_ics1 = 0
+        self.ics2_feeds = 1
+        self.feed_duplicates = 0
+        self.stats_ics1 = CalendarStats()
+        self.stats_ics2 = CalendarStats()
+        self.exclusions = None
+        self.excluded_ics1 = {}
+        self.excluded_ics2 = {}
+        self.errors = []
+        self.timer = StageTimer("Analysis")
+
+def check_inputs(ics1_path, ics2_path, exclusions_path):
+    """
+    Check that the input files exist.
+
+    Args:
+        ics1_path: The path to the previous iCalendar file, or "" for none.
+        ics2_path: The path to the new iCalendar file, or a list of paths (see feed_paths).
+        exclusions_path: The path to the exclusions file, or "" for none.
+
+    Returns:
+        A list with a message for the first problem found, or an empty list.
+    """
+    if ics1_path and not os.path.exists(ics1_path):
+        return [f"File not found (ICS1): {ics1_path}"]
+    ics2_paths = feed_paths(ics2_path)
+    if not ics2_paths:
+        return ["ICS2 file must be provided"]
+    for path in ics2_paths:
+        if not os.path.exists(path):
+            return [f"File not found (ICS2): {path}"]
+    if exclusions_path and not os.path.exists(exclusions_path):
+        return [f"File not found (exclusion): {exclusions_path}"]
+    return []
+
+def feed_paths(ics2_path):
+    """
+    Get the ICS2 feeds to merge. ICS2 may be one file or a list of files (e.g. one per team),
+    whose events are merged into a single new calendar (see merge_feeds).
+
+    Args:
+        ics2_path: A path, "" for none, or a list of paths.
+
+    Returns:
+        A list of path strings.
+    """
+    if isinstance(ics2_path, (str, os.PathLike)):
+        return [str(ics2_path)] if ics2_path else []
+    return [str(path) for path in ics2_path]
+
+def feed_label(path, ics2_paths):
+    """
+    Name an ICS2 feed in timings and reports.
+
+    Args:
+        path: The path of the feed.
+        ics2_paths: All the ICS2 paths.
+
+    Returns:
+        str: "ICS2", or "ICS2 <file name>" if there are several feeds.
+    """
+    return "ICS2" if len(ics2_paths) == 1 else f"ICS2 {os.path.basename(path)}"
+
+def merge_feeds(feeds, keyed=False, cancel=None):
+    """
+    Combine the events loaded from each ICS2 feed, dropping the events that are in more than one.
+
+    Args:
+        feeds: The store.EventStore (or list of keyed tuples if keyed) of each feed, or None for
+            feeds that could not be loaded.
+        keyed: If True, the feeds are lists of ical.get_event_list_keyed tuples. They are only
+            concatenated, as diff.diff_by_uid keeps the newest revision of each UID.
+        cancel: An optional threading.Event that aborts the merge when set.
+
+    Returns:
+        The combined events, or None if no feed was loaded.
+
+    Raises:
+        Cancelled: If cancel was set.
+    """
+    feeds = [events for events in feeds if events is not None]
+    if not feeds:
+        return None
+    if len(feeds) == 1:
+        return feeds[0]
+    if keyed:
+        return [event for events in feeds for event in events]
+    return merge_stores(feeds, cancel)
+
+def start_stage(stages, index, progress, cancel):
+    """
+    Report the start of a stage, first aborting if cancelled.
+
+    Args:
+        stages: MERGE_STAGES or ANALYZE_STAGES.
+        index: The index of the stage in stages.
+        progress: An optional callback, called as progress(index, len(stages), stages[index]).
+        cancel: An optional threading.Event.
+
+    Raises:
+        Cancelled: If cancel was set.
+    """
+    check_cancel(cancel)
+    logging.debug(f"Stage {index + 1}/{len(stages)}: {stages[index]}")
+    if progress is not None:
+        progress(index, len(stages), stages[index])
+
+def load_calendar_events(file_path, result, parser=DEFAULT_PARSER, cache=None, cancel=None, keyed=False, expander=None, window=None):
+    """
+    Load the events of an iCalendar file, recording any failure in result.errors.
+
+    Args:
+        file_path: The path to the iCalendar file.
+        result: The MergeResult or AnalysisResult collecting errors.
+        parser: The parser to use, one of options.PARSERS.
+        cache: An optional cache.EventCache (or watch.SnapshotCache) to load the events through.
+        cancel: An optional threading.Event that aborts the load when set.
+        keyed: If True, load a list of ical.get_event_list_keyed tuples instead.
+        expander: An optional recurrence.RecurrenceExpander to expand recurring events with.
+        window: An optional window.DateWindow that events must overlap.
+
+    Returns:
+        A store.EventStore (or list if keyed) if successful, None otherwise.
+
+    Raises:
+        Cancelled: If cancel was set.
+    """
+    try:
+        if keyed and cache is not None:
+            return cache.load_keyed(file_path, parser=parser, cancel=cancel, expander=expander, window=window)
+        if keyed:
+            return load_keyed_events(file_path, parser=parser, cancel=cancel, expander=expander, window=window)
+        if cache is not None:
+            return cache.load(file_path, parser=parser, cancel=cancel, expander=expander, window=window)
+        return load_event_store(file_path, parser=parser, cancel=cancel, expander=expander, window=window)
+    except Cancelled:
+        raise
+    except Exception as e:
+        message = f"Failed to load iCal file: {file_path}\n{e}"
+        logging.error(message)
+        result.errors.append(message)
+        return None
+
+def load_stats(file_path, result, parser=DEFAULT_PARSER, cache=None, cancel=None, expander=None, window=None):
+    """
+    Collect the statistics of an iCalendar file, recording any failure in result.errors.
+
+    Args:
+        file_path: The path to the iCalendar file.
+        result: The AnalysisResult collecting errors.
+        parser: The parser to use, one of options.PARSERS.
+        cache: An optional cache.EventCache to load the statistics through.
+        cancel: An optional threading.Event that aborts the load when set.
+        expander: An optional recurrence.RecurrenceExpander to expand recurring events with.
+        window: An optional window.DateWindow that events must overlap.
+
+    Returns:
+        A stats.CalendarStats if successful, None otherwise.
+
+    Raises:
+        Cancelled: If cancel was set.
+    """
+    try:
+        if cache is not None:
+            return cache.load_stats(file_path, parser=parser, cancel=cancel, expander=expander, window=window)
+        return load_calendar_stats(file_path, parser=parser, cancel=cancel, expander=expander, window=window)
+    except Cancelled:
+        raise
+    except Exception as e:
+        message = f"Failed to load iCal file: {file_path}\n{e}"
+        logging.error(message)
+        result.errors.append(message)
+        return None
+
+def load_exclusion_list(file_path, result):
+    """
+    Load the exclusion strings, recording any failure in result.errors.
+
+    Args:
+        file_path: The path to the exclusions file.
+        result: The MergeResult or AnalysisResult collecting errors.
+
+    Returns:
+        The list of exclusion strings, empty on failure.
+    """
+    try:
+        return read_exclusions(file_path)
+    except Exception as e:
+        message = f"Failed to load exclusions file: {file_path}\n{e}"
+        logging.error(message)
+        result.errors.append(message)
+        return []
+
+def load_concurrently(*loads):
+    """
+    Run loads in parallel threads, so the wall time is that of the slowest one rather than
+    the sum (e.g. for files on network shares).
+
+    Args:
+        *loads: Callables taking no arguments.
+
+    Returns:
+        A list of their return values, in the same order.
+
+    Raises:
+        Exception: The first exception raised by a load, in argument order, once all have finished.
+    """
+    with ThreadPoolExecutor(max_workers=len(loads), thread_name_prefix="load") as pool:
+        futures = [pool.submit(load) for load in loads]
+    return [future.result() for future in futures]
+
+def no_file(value=None):
+    """
+    Load an input that was not provided (see load_concurrently).
+
+    Args:
+        value: What to use in place of the file's contents.
+
+    Returns:
+        The value.
+    """
+    return value
+
+def merge_files(ics1_path, ics2_path, exclusions_path, all_day, parser=DEFAULT_PARSER, cache=None, progress=None, cancel=None, output_path=None, newline=NEWLINES["lf"], diff_mode=DEFAULT_DIFF_MODE, expander=None, window=None):
+    """
+    Merge ICS2 into ICS1.
+
+    Args:
+        ics1_path: The path to the previous iCalendar file ("" or a missing file for a first run).
+        ics2_path: The path to the new iCalendar file, or a list of paths whose events are merged
+            into one new calendar (see merge_feeds). ICS1 is the baseline for all of them.
+        exclusions_path: The path to the exclusions file, or "" for none.
+        all_day: If True, convert the new events to all-day events.
+        parser: The parser to use, one of options.PARSERS.
+        cache: An optional cache.EventCache to load the calendars through.
+        progress: An optional callback called at the start of each of MERGE_STAGES (see start_stage).
+        cancel: An optional threading.Event that aborts the merge when set.
+        output_path: The path to write the new events to. If None, they are written to a
+            temporary file, which can be copied with write_output and removed with discard_output.
+        newline: The line ending of the output, one of ical.NEWLINES.values().
+        diff_mode: "event" to compare events by (summary, dtstart, dtend), or "uid" to match
+            them by UID and report changed events as modified (see diff.diff_by_uid).
+        expander: An optional recurrence.RecurrenceExpander, so recurring events are compared
+            occurrence by occurrence. It is shared by both calendars, so an unchanged series is
+            only expanded once.
+        window: An optional window.DateWindow. Only events overlapping it are loaded from either calendar.
+
+    Returns:
+        A MergeResult.
+
+    Raises:
+        Cancelled: If cancel was set.
+    """
+    result = MergeResult()
+    result.diff_mode = diff_mode
+    timer = result.timer
+    keyed = diff_mode == "uid"
+    empty = [] if keyed else EventStore()
+
+    # Load the events from each input file. They are held as compact EventStores (or lists of
+    # keyed tuples, for the "uid" diff mode), and event tuples are only materialized for the
+    # differences and exclusions reported. The files are loaded concurrently, and each load is timed.
+    start_stage(MERGE_STAGES, 0, progress, cancel)
+    ics2_paths = feed_paths(ics2_path)
+    events1, *feeds, exclusions = load_concurrently(
+        partial(timer.measure, "ICS1", load_calendar_events, ics1_path, result, parser, cache, cancel, keyed, expander, window) if os.path.exists(ics1_path) else partial(no_file, empty),
+        *(partial(timer.measure, feed_label(path, ics2_paths), load_calendar_events, path, result, parser, cache, cancel, keyed, expander, window) if os.path.exists(path) else no_file for path in ics2_paths),
+        partial(timer.measure, "EXCL", load_exclusion_list, exclusions_path, result, count=None) if exclusions_path else no_file
+    )
+    if len(feeds) > 1:
+        events2 = timer.measure("ICS2 merged", merge_feeds, feeds, keyed, cancel)
+    else:
+        events2 = merge_feeds(feeds)
+    del feeds
+    timer.mark(MERGE_STAGES[0])
+    if events1 is None and events2 is None:   # Sanity check
+        result.loaded = False
+        timer.log()
+        return result
+
+    events1 = events1 or empty
+    events2 = events2 or empty
+    # Excluded events still show which dates ICS2 covers
+    coverage = CoverageIndex(EventStore.from_events(event[:3] for event in events2) if keyed else events2)
+    result.first_run = not os.path.exists(ics1_path)
+
+    # Apply the exclusions
+    start_stage(MERGE_STAGES, 1, progress, cancel)
+    if exclusions is not None:
+        result.exclusions = exclusions
+        matcher = ExclusionMatcher(result.exclusions)  # Compiled once for both calendars
+        if keyed:
+            events1, excluded1 = filter_exclusions(events1, matcher)
+            events2, excluded2 = filter_exclusions(events2, matcher)
+            result.excluded_ics1 = {event[:3]: excl for event, excl in excluded1.items()}
+            result.excluded_ics2 = {event[:3]: excl for event, excl in excluded2.items()}
+        else:
+            kept1, excluded1 = events1.partition(matcher.match)  # Matched once per distinct summary
+            kept2, excluded2 = events2.partition(matcher.match)
+            result.excluded_ics1 = {events1.event(row): excl for row, excl in excluded1}
+            result.excluded_ics2 = {events2.event(row): excl for row, excl in excluded2}
+            events1, events2 = kept1, kept2
+    timer.mark(MERGE_STAGES[1], len(result.excluded_ics1) + len(result.excluded_ics2))
+
+    # Generate unique events for each calendar
+    start_stage(MERGE_STAGES, 2, progress, cancel)
+    if keyed:
+        diff = diff_by_uid(events1, events2, cancel)
+        result.modified = diff.modified
+        result.new_events = set(diff.added) | {new for old, new in diff.modified}
+        removals = diff.removed
+    else:
+        result.new_events = set(events2.difference(events1))  # These are the initial new events to be added to the output ical
+        removals = (events1.event(row) for row in events1.difference_rows(events2))
+    for event in removals:  # These are used to report possible events to manually remove
+        if coverage.covers(event[1]):
+            result.removals.add(event)
+        else:
+            result.uncovered.add(event)
+    timer.mark(MERGE_STAGES[2], len(result.new_events) + len(result.removals) + len(result.uncovered))
+
+    # Write a new calendar of the new events, once; saving or opening it copies the file
+    start_stage(MERGE_STAGES, 3, progress, cancel)
+    if output_path is None:
+        fd, output_path = tempfile.mkstemp(prefix="icsmerger-", suffix=".ics")
+        os.close(fd)
+        result.spooled = True
+    result.output_path = output_path
+    try:
+        with open(output_path, 'wb') as f:
+            written = write_ics(f, result.new_events, all_day, newline, cancel)
+    except BaseException:
+        discard_output(result)
+        raise
+    timer.mark(MERGE_STAGES[3], written)
+    timer.log()
+
+    return result
+
+def write_output(result, file_path):
+    """
+    Write the merged calendar to a file, by copying the file written by merge_files.
+
+    Args:
+        result: The MergeResult.
+        file_path: The path to write the .ics file to.
+    """
+    if os.path.abspath(file_path) != os.path.abspath(result.output_path):
+        shutil.copyfile(result.output_path, file_path)
+
+def discard_output(result):
+    """
+    Remove the temporary output file of a merge, if it has one.
+
+    Args:
+        result: The MergeResult.
+    """
+    if result.spooled and result.output_path:
+        try:
+            os.remove(result.output_path)
+        except OSError as e:
+            logging.error(f"Failed to remove {result.output_path}: {e}")
+        result.output_path = None
+        result.spooled = False
+
+def exclusions_report(result):
+    """
+    Describe the exclusions applied by a merge.
+
+    Args:
+        result: The MergeResult.
+
+    Yields:
+        The report text, one line (or block) at a time.
+    """
+    if result.exclusions is None:
+        yield "No EXCL file provided.\n\n"
+        return
+    if not result.exclusions:
+        yield "EXCL file was provided, but it was empty.\n\n"
+        return
+    yield "Excluding consideration of any event(s) matching:\n\n"
+    for excl in result.exclusions:
+        yield f"  - '{excl}'\n"
+    yield from format_exclusions(sorted(result.excluded_ics1.items(), key=lambda x: event_sort_key(x[0])), "ICS1")
+    yield from format_exclusions(sorted(result.excluded_ics2.items(), key=lambda x: event_sort_key(x[0])), "ICS2")
+
+def removals_report(result):
+    """
+    Describe the events suggested for removal by a merge.
+
+    Args:
+        result: The MergeResult.
+
+    Yields:
+        The report text, one line (or block) at a time.
+    """
+    if result.first_run:
+        yield "First run detected. No removals from the current calendar are suggested."
+        return
+    if not result.removals:
+        yield "No suggested removals from the current calendar were found in ICS1."
+    else:
+        yield "Consider manually removing the following events from your calendar.\n\nThey existed in ICS1 but are not in ICS2 and thus may no longer be relevant.\n\nThese event(s) are:\n\n"
+        for event in sorted(result.removals, key=event_sort_key):
+            yield f"  - '{event[0]}' ({as_date(event[1])})\n"
+    if result.uncovered:
+        yield f"\n\n{len(result.uncovered)} other event(s) from ICS1 are not in ICS2, but are not suggested because ICS2 has no events around their dates:\n\n"
+        for event in sorted(result.uncovered, key=event_sort_key):
+            yield f"  - '{event[0]}' ({as_date(event[1])})\n"
+
+def new_events_report(result):
+    """
+    Describe the new events found by a merge.
+
+    Args:
+        result: The MergeResult.
+
+    Yields:
+        The report text, one line (or block) at a time.
+    """
+    if not result.loaded:
+        yield f"{merge_descriptions["no_reach"]}"
+        return
+    if not result.new_events:
+        yield "No new events were found in ICS2.\n"
+        return
+    changed = {new for old, new in result.modified}
+    added = [event for event in result.new_events if event not in changed]
+    if added:
+        yield f"There are {len(added)} new event(s) in ICS2 that do not exist in ICS1.\n\nThese event(s) are:\n\n"
+        for event in sorted(added, key=event_sort_key):
+            yield f"  - '{event[0]}' ({as_date(event[1])})\n"
+    if result.modified:
+        yield f"\n{len(result.modified)} event(s) in ICS2 are newer versions of events in ICS1:\n\n"
+        for old, new in sorted(result.modified, key=lambda x: event_sort_key(x[1])):
+            yield f"  - '{old[0]}' ({as_date(old[1])}) -> '{new[0]}' ({as_date(new[1])})\n"
+
+def analyze_files(ics1_path, ics2_path, exclusions_path, parser=DEFAULT_PARSER, cache=None, progress=None, cancel=None, expander=None, window=None):
+    """
+    Analyze ICS1, ICS2 and the exclusions file.
+
+    Args:
+        ics1_path: The path to the previous iCalendar file, or "" for none.
+        ics2_path: The path to the new iCalendar file, or a list of paths analyzed as one
+            calendar, as merge_files merges them.
+        exclusions_path: The path to the exclusions file, or "" for none.
+        parser: The parser to use, one of options.PARSERS.
+        cache: An optional cache.EventCache to load the calendars through.
+        progress: An optional callback called at the start of each of ANALYZE_STAGES (see start_stage).
+        cancel: An optional threading.Event that aborts the analysis when set.
+        expander: An optional recurrence.RecurrenceExpander, so recurring events are counted by occurrence.
+        window: An optional window.DateWindow. Only events overlapping it are counted.
+
+    Returns:
+        An AnalysisResult.
+
+    Raises:
+        Cancelled: If cancel was set.
+    """
+    result = AnalysisResult(ics1_path)
+    result.window = window
+    timer = result.timer
+    result.missing = check_inputs(ics1_path, ics2_path, exclusions_path)
+    if result.missing:
+        return result
+
+    # Each calendar is summarized in a single pass as it is parsed; the events are not kept.
+    # Several ICS2 feeds are loaded as EventStores and merged, so events in more than one feed are
+    # counted once. The files are loaded concurrently, and each load is timed.
+    start_stage(ANALYZE_STAGES, 0, progress, cancel)
+    ics2_paths = feed_paths(ics2_path)
+    result.ics2_feeds = len(ics2_paths)
+    if len(ics2_paths) == 1:
+        loads2 = [partial(timer.measure, "ICS2", load_stats, ics2_paths[0], result, parser, cache, cancel, expander, window)]
+    else:
+        loads2 = [partial(timer.measure, feed_label(path, ics2_paths), load_calendar_events, path, result, parser, cache, cancel, False, expander, window) for path in ics2_paths]
+    stats1, *feeds, exclusions = load_concurrently(
+        partial(timer.measure, "ICS1", load_stats, ics1_path, result, parser, cache, cancel, expander, window) if ics1_path else no_file,
+        *loads2,
+        partial(timer.measure, "EXCL", load_exclusion_list, exclusions_path, result, count=None) if exclusions_path else no_file
+    )
+    if len(feeds) == 1:
+        stats2 = feeds[0]
+    else:
+        stats2 = timer.measure("ICS2 merged", merged_stats, feeds, result, cancel)
+    del feeds
+    timer.mark(ANALYZE_STAGES[0])
+    if stats2 is None:
+        result.loaded = False
+        timer.log()
+        return result
+    stats1 = stats1 or CalendarStats()
+
+    result.stats_ics1, result.stats_ics2 = stats1, stats2
+    result.ics1_count = stats1.count
+    result.ics2_count = stats2.count
+    result.earliest_ics1, result.latest_ics1 = stats1.earliest, stats1.latest
+    result.earliest_ics2, result.latest_ics2 = stats2.earliest, stats2.latest
+    coverage2 = CoverageIndex.from_spans(stats2.spans.items())
+    result.uncovered_ics1 = sum(count for day, count in stats1.start_days.items() if not coverage2.covers_day(day))
+
+    start_stage(ANALYZE_STAGES, 1, progress, cancel)
+    if exclusions is not None:
+        result.exclusions = exclusions
+        matcher = ExclusionMatcher(result.exclusions)
+        result.excluded_ics1 = stats1.excluded(matcher)
+        result.excluded_ics2 = stats2.excluded(matcher)
+    timer.mark(ANALYZE_STAGES[1], sum(result.excluded_ics1.values()) + sum(result.excluded_ics2.values()))
+    timer.log()
+
+    return result
+
+def merged_stats(feeds, result, cancel=None):
+    """
+    Collect the statistics of several ICS2 feeds as one calendar (see merge_feeds).
+
+    Args:
+        feeds: The store.EventStore of each feed, or None for feeds that could not be loaded.
+        result: The AnalysisResult, which gets the number of events in more than one feed.
+        cancel: An optional threading.Event that aborts the merge when set.
+
+    Returns:
+        A stats.CalendarStats, or None if no feed was loaded.
+
+    Raises:
+        Cancelled: If cancel was set.
+    """
+    merged = merge_feeds(feeds, cancel=cancel)
+    if merged is None:
+        return None
+    result.feed_duplicates = sum(len(events) for events in feeds if events is not None) - len(merged)
+    stats = CalendarStats()
+    for event in merged:
+        stats.add(event)
+    return stats.finish()
+
+def calendars_report(result):
+    """
+    Describe the calendars examined by an analysis.
+
+    Args:
+        result: The AnalysisResult.
+
+    Yields:
+        The report text, one line (or block) at a time.
+    """
+    if result.window is not None:
+        yield f"Only events from {result.window} are counted.\n\n"
+    if result.ics1_path:
+        yield f"ICS1 contains {result.ics1_count} events:\n\n"
+        if result.earliest_ics1 and result.latest_ics1:
+            yield f"  - Earliest event in ICS1: {result.earliest_ics1}\n"
+            yield f"  - Latest event in ICS1: {result.latest_ics1}\n"
+        yield from calendar_stats_report(result.stats_ics1, "ICS1")
+
+    if result.ics2_feeds > 1:
+        yield f"\nICS2 ({result.ics2_feeds} files) contains {result.ics2_count} events:\n\n"
+        yield f"  - Events in more than one ICS2 file (counted once): {result.feed_duplicates}\n"
+    else:
+        yield f"\nICS2 contains {result.ics2_count} events:\n\n"
+    if result.earliest_ics2 and result.latest_ics2:
+        yield f"  - Earliest event in ICS2: {result.earliest_ics2}\n"
+        yield f"  - Latest event in ICS2: {result.latest_ics2}\n"
+    yield from calendar_stats_report(result.stats_ics2, "ICS2")
+
+    if result.earliest_ics2 and result.earliest_ics1 and result.earliest_ics2 < result.earliest_ics1:
+        yield "\nWarning: ICS2 has events before the earliest event in ICS1\n"
+    if result.latest_ics2 and result.latest_ics1 and result.latest_ics1 > result.latest_ics2:
+        yield "\nWarning: ICS1 has events after the latest event in ICS2\n"
+    if result.uncovered_ics1:
+        yield f"\nNote: {result.uncovered_ics1} event(s) in ICS1 are on dates ICS2 does not cover, and will not be suggested for removal\n"
+
+def calendar_stats_report(stats, label):
+    """
+    Describe the statistics of one calendar.
+
+    Args:
+        stats: The stats.CalendarStats.
+        label: "ICS1" or "ICS2".
+
+    Yields:
+        The report text, one line (or block) at a time.
+    """
+    if not stats.count:
+        return
+    yield f"  - All-day events in {label}: {stats.all_day}\n"
+    yield f"  - Timed events in {label}: {stats.timed}\n"
+    if stats.duplicates:
+        yield f"  - Duplicate events in {label}: {stats.duplicates}\n"
+    yield f"  - Events per month in {label}:\n"
+    yield from stats.month_lines()
+
+def exclusion_list_report(result):
+    """
+    Describe the exclusions file examined by an analysis.
+
+    Args:
+        result: The AnalysisResult.
+
+    Yields:
+        The report text, one line (or block) at a time.
+    """
+    if result.exclusions is None:
+        yield "No EXCL file provided.\n\n"
+        return
+    if not result.exclusions:
+        yield "EXCL file was provided, but it was empty.\n\n"
+        return
+    yield f"EXCL contains {len(result.exclusions)} exclusions:\n\n"
+    for excl in result.exclusions:
+        yield f"  - '{excl}' (matches {result.excluded_ics1.get(excl, 0)} in ICS1, {result.excluded_ics2.get(excl, 0)} in ICS2)\n"
@@ -1,33 +1,104 @@
 import logging
+from collections import deque
+from .ical import as_date
 
-# Load exclusions from file
-def load_exclusions(main_window, file_path):
-    try:
-        with open(file_path, 'r') as f:
-            return [line.strip() for line in f]
-    except Exception as e:
-        main_window.info_dialog("Error", f"Failed to load exclusions file: {file_path}\n{e}")
-        return []
+class ExclusionMatcher():
+    """
+    Match event summaries against all exclusion strings in a single pass (Aho-Corasick).
 
-# Filter events based on exclusions
+    Exclusions are compared case-insensitively (casefolded), and blank exclusions are ignored.
+    """
+    def __init__(self, exclusions):
+        self.exclusions = []    # Original exclusion strings, indexed by the automaton outputs
+        self.goto = [{}]        # Per state: {character: next state}
+        self.fail = [0]         # Per state: the state for the longest proper suffix that is also a prefix
+        self.output = [None]    # Per state: index of an exclusion ending here (directly or via fail links)
+
+        for excl in exclusions:
+            excl = excl.strip()
+            pattern = excl.casefold()
+            if not pattern:
+                continue
+            state = 0
+            for ch in pattern:
+                next_state = self.goto[state].get(ch)
+                if next_state is None:
+                    next_state = len(self.goto)
+                    self.goto.append({})
+                    self.fail.append(0)
+                    self.output.append(None)
+                    self.goto[state][ch] = next_state
+                state = next_state
+            if self.output[state] is None:
+                self.output[state] = len(self.exclusions)
+                self.exclusions.append(excl)
+
+        # Breadth-first, so every fail target is finished before the states that point to it
+        queue = deque(self.goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for ch, child in self.goto[state].items():
+                queue.append(child)
+                fail = self.fail[state]
+                while fail and ch not in self.goto[fail]:
+                    fail = self.fail[fail]
+                self.fail[child] = self.goto[fail].get(ch, 0)
+                if self.output[child] is None:
+                    self.output[child] = self.output[self.fail[child]]
+        logging.debug(f"Compiled {len(self.exclusions)} exclusions into {len(self.goto)} states")
+
+    def __len__(self):
+        return len(self.exclusions)
+
+    def match(self, text):
+        """
+        Find an exclusion contained in text.
+
+        Args:
+            text (str): The text to scan, typically an event summary.
+
+        Returns:
+            str: The first exclusion found while scanning text, or None.
+        """
+        goto, fail, output = self.goto, self.fail, self.output
+        state = 0
+        for ch in text.casefold():
+            while state and ch not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(ch, 0)
+            if output[state] is not None:
+                return self.exclusions[output[state]]
+        return None
+
+# Read exclusions from file, dropping blank lines
+def read_exclusions(file_path):
+    with open(file_path, 'r') as f:
+        return [line.strip() for line in f if line.strip()]
+
+# Filter events based on exclusions (a list of strings or an ExclusionMatcher)
+# Returns the filtered events and a dict of {excluded event: matching exclusion}
 def filter_exclusions(events, exclusions):
+    matcher = exclusions if isinstance(exclusions, ExclusionMatcher) else ExclusionMatcher(exclusions)
     filtered_events = set()
-    excluded_events = set()
+    excluded_events = {}
+    matches = {}    # Summaries repeat a lot, so only scan each one once
     for event in events:
-        if not any(excl.lower() in event[0].lower() for excl in exclusions):
+        summary = event[0]
+        if summary not in matches:
+            matches[summary] = matcher.match(summary)
+        match = matches[summary]
+        if match is None:
             filtered_events.add(event)
         else:
-            excluded_events.add(event)
+            excluded_events[event] = match
     return filtered_events, excluded_events
 
-def print_exclusions(exclusions, excl, file):
+# Format the events excluded from a file, with the exclusion that matched each one, one line at a time
+def format_exclusions(exclusions, file):
+    yield f"\nExcluded from {file}:\n\n"
     count = 0
-    text = ""
-    excl.value += f"\nExcluded from {file}:\n\n"
-    for event in exclusions:
-        text += f"  - '{event[0]}' ({event[1].date()})\n"
+    for event, match in exclusions:
+        yield f"  - '{event[0]}' ({as_date(event[1])}), matched '{match}'\n"
         count += 1
     if count == 0:
-        excl.value += "  - Nothing Excluded.\n\n"
-    else:
-        excl.value += f"{text}"
\ No newline at end of file
+        yield "  - Nothing Excluded.\n\n"
@@ -0,0 +1,160 @@
+import os
+import csv
+import json
+from .ical import event_sort_key
+
+# Structured exports of a merge's differences, for scripts rather than people (see the *_report
+# functions in engine.py for the text versions). Like engine.py, nothing here may import toga.
+
+EXPORT_FORMATS = ("csv", "ndjson", "json")
+DEFAULT_EXPORT_FORMAT = "csv"
+EXPORT_EXTENSIONS = {".csv": "csv", ".ndjson": "ndjson", ".jsonl": "ndjson", ".json": "json"}
+
+# The fields of each exported row, in CSV column order
+EXPORT_FIELDS = ("change", "calendar", "summary", "start", "end", "reason")
+
+def format_value(value):
+    """
+    Format a date or datetime for export.
+
+    Args:
+        value: A date, datetime, or None.
+
+    Returns:
+        str: The ISO 8601 form, or None.
+    """
+    return value.isoformat() if value is not None else None
+
+def export_row(change, calendar, event, reason):
+    """
+    Build one exported row.
+
+    Args:
+        change: "new", "modified", "removal" or "excluded".
+        calendar: "ICS1" or "ICS2", the calendar the event is from.
+        event: The event tuple.
+        reason: Why the event is reported, e.g. the exclusion it matched.
+
+    Returns:
+        dict: The row, with the keys of EXPORT_FIELDS.
+    """
+    return {
+        "change": change,
+        "calendar": calendar,
+        "summary": event[0],
+        "start": format_value(event[1]),
+        "end": format_value(event[2]),
+        "reason": reason
+    }
+
+def export_rows(result):
+    """
+    Describe the differences found by a merge as rows, one event at a time.
+
+    Rows are, in order: the new events and newer versions of ICS1 events in ICS2, the
+    suggested removals from ICS1, and the events excluded from each calendar with the
+    exclusion each one matched. Each group is ordered by start.
+
+    Args:
+        result: The engine.MergeResult.
+
+    Yields:
+        One dict per event (see export_row).
+    """
+    changed = {new: old for old, new in result.modified}
+    for event in sorted(result.new_events, key=event_sort_key):
+        old = changed.get(event)
+        if old is None:
+            yield export_row("new", "ICS2", event, "not in ICS1")
+        else:
+            yield export_row("modified", "ICS2", event, f"newer version of '{old[0]}' ({format_value(old[1])}) in ICS1")
+    if not result.first_run:
+        for event in sorted(result.removals, key=event_sort_key):
+            yield export_row("removal", "ICS1", event, "not in ICS2")
+    for calendar, excluded in (("ICS1", result.excluded_ics1), ("ICS2", result.excluded_ics2)):
+        for event, excl in sorted(excluded.items(), key=lambda x: event_sort_key(x[0])):
+            yield export_row("excluded", calendar, event, f"matched exclusion '{excl}'")
+
+def write_csv(f, rows):
+    """
+    Write rows as CSV, with a header row.
+
+    Args:
+        f: A text file opened with newline="".
+        rows: An iterable of row dicts.
+
+    Returns:
+        int: The number of rows written.
+    """
+    writer = csv.DictWriter(f, fieldnames=EXPORT_FIELDS)
+    writer.writeheader()
+    count = 0
+    for count, row in enumerate(rows, 1):
+        writer.writerow(row)
+    return count
+
+def write_ndjson(f, rows):
+    """
+    Write rows as newline-delimited JSON, one object per line.
+
+    Args:
+        f: A text file.
+        rows: An iterable of row dicts.
+
+    Returns:
+        int: The number of rows written.
+    """
+    count = 0
+    for count, row in enumerate(rows, 1):
+        f.write(json.dumps(row, ensure_ascii=False) + "\n")
+    return count
+
+def write_json(f, rows):
+    """
+    Write rows as a JSON array, one row at a time rather than building the array first.
+
+    Args:
+        f: A text file.
+        rows: An iterable of row dicts.
+
+    Returns:
+        int: The number of rows written.
+    """
+    f.write("[")
+    count = 0
+    for count, row in enumerate(rows, 1):
+        f.write(",\n  " if count > 1 else "\n  ")
+        f.write(json.dumps(row, ensure_ascii=False))
+    f.write("\n]\n" if count else "]\n")
+    return count
+
+WRITERS = {"csv": write_csv, "ndjson": write_ndjson, "json": write_json}
+
+def format_for_path(file_path, default=DEFAULT_EXPORT_FORMAT):
+    """
+    Pick the export format from a file name.
+
+    Args:
+        file_path: The path to export to.
+        default: The format if the extension is not one of EXPORT_EXTENSIONS.
+
+    Returns:
+        str: One of EXPORT_FORMATS.
+    """
+    return EXPORT_EXTENSIONS.get(os.path.splitext(file_path)[1].lower(), default)
+
+def export_result(result, file_path, export_format=None):
+    """
+    Export the differences found by a merge to a file, streaming the rows as they are built.
+
+    Args:
+        result: The engine.MergeResult.
+        file_path: The path to write to.
+        export_format: One of EXPORT_FORMATS. Defaults to the one matching the file's extension.
+
+    Returns:
+        int: The number of rows written.
+    """
+    export_format = export_format or format_for_path(file_path)
+    with open(file_path, 'w', encoding="utf-8", newline="") as f:
+        return WRITERS[export_format](f, export_rows(result))
@@ -3,6 +3,7 @@ import logging
 import platform
 import subprocess
 import json
+import shutil
 import hashlib
 from pathlib import Path
 
@@ -30,6 +31,29 @@ def get_outdir(self):
     os.makedirs(get_outdir, exist_ok=True)
     return os.path.join(get_outdir, 'out.ics')
 
+def get_event_cachedir(self):
+    """
+    Get the parsed-calendar cache directory (per-OS), next to out.ics.
+
+    Returns:
+        str: The path to the parsed-calendar cache directory.
+    """
+    cache_dir = Path(self.paths.cache) / 'events'
+    logging.info(f"event_cache_dir: {cache_dir}")
+    os.makedirs(cache_dir, exist_ok=True)
+    return str(cache_dir)
+
+def get_profiledir(self):
+    """
+    Get the directory profiles of Analyze and Merge runs are written to (per-OS), next to out.ics.
+
+    Returns:
+        str: The path to the profile directory.
+    """
+    profile_dir = Path(self.paths.cache) / 'profiles'
+    os.makedirs(profile_dir, exist_ok=True)
+    return str(profile_dir)
+
 def load_config(self):
     """
     Load configuration from file.
@@ -102,39 +126,34 @@ def open_output_file(self, file_path):
     except Exception as e:
         logging.error(f"Error opening file: {e}")
 
-def sha_check(contents, sha256):
+def file_sha256(file_path, chunk_size=1024 * 1024):
     """
-    Validate the shasum of contents using sha256.
+    Calculate the sha256 of a file without reading it into memory at once.
 
     Args:
-        contents (bytes): The contents to be validated.
-        sha256 (str): The expected sha256 hash.
+        file_path (str): The path to the file.
+        chunk_size (int): The number of bytes to read at a time.
 
     Returns:
-        bool: True if the shasum is valid, False otherwise.
+        str: The hex digest.
     """
-    calculated_shasum = hashlib.sha256(contents).hexdigest()
-
-    # Check the shasum
-    if calculated_shasum == sha256:
-        logging.debug(f"sha_check succeeded: calculated_shasum: {calculated_shasum} == sha256: {sha256}")
-        return True
-    else:
-        logging.error(f"sha_check failed: calculated_shasum: {calculated_shasum} != sha256: {sha256}")
-        return False
+    digest = hashlib.sha256()
+    with open(file_path, 'rb') as f:
+        while chunk := f.read(chunk_size):
+            digest.update(chunk)
+    return digest.hexdigest()
 
 def save_file(file, save_path, event):
     """
-    Save a file to the specified path.
+    Save a copy of a file to the specified path.
 
     Args:
-        file (bytes): The file contents to be saved.
+        file (str): The path to the file to be saved.
         save_path (str): The path to save the file.
         event (threading.Event): The event to be set after the file is saved.
     """
     try:
-        with open(save_path, "wb") as f:
-            f.write(file)
+        shutil.copyfile(file, save_path)
         logging.debug(f"File saved: {save_path}")
     except Exception as e:
         logging.error(f"Error saving file: {e}")
@@ -1,25 +1,32 @@
 import logging
 from icalendar import Calendar, Event
-from datetime import datetime
+from icalendar.parser import Contentline
+from icalendar.prop import vDDDTypes, vText
+from datetime import datetime, date, time, timedelta, timezone
+from .options import DEFAULT_PARSER
 
-def load_ics(window, file_path):
+# How many events to extract between checks of a cancel event
+CANCEL_CHECK_INTERVAL = 1000
+
+# VEVENT properties that may occur more than once and are all kept by iter_vevents
+MULTI_PROPERTIES = ("EXDATE", "RDATE")
+
+# Line endings for written calendars. "lf" matches the files previously written by the app.
+NEWLINES = {"lf": "\n", "crlf": "\r\n"}
+
+class Cancelled(Exception):
+    """Raised when a cancel event is set while loading or merging calendars."""
+
+def check_cancel(cancel):
     """
-    Load an iCalendar file.
+    Raise Cancelled if a cancel event is set.
 
     Args:
-        window: The window object to display error messages.
-        file_path: The path to the iCalendar file.
-
-    Returns:
-        The loaded iCalendar object if successful, None otherwise.
+        cancel: A threading.Event, or None.
     """
-    try:
-        with open(file_path, 'rb') as f:
-            return Calendar.from_ical(f.read())
-    except Exception as e:
-        window.info_dialog("Error", f"Failed to load iCal file: {file_path}\n{e}")
-        return None
-    
+    if cancel is not None and cancel.is_set():
+        raise Cancelled()
+
 def get_event_set(cal):
     """
     Get a set of events from a calendar.
@@ -50,12 +57,403 @@ def get_event_set_full(cal):
         for component in cal.walk() if component.name == "VEVENT"
     }
 
+def get_event_list_keyed(cal):
+    """
+    Get a list of events with their identity and revision from a calendar.
+
+    Args:
+        cal: The iCalendar object.
+
+    Returns:
+        A list of events, where each event is represented as a tuple of (summary, dtstart, dtend, uid, recurrence_id, sequence, dtstamp).
+    """
+    events = []
+    for component in cal.walk():
+        if component.name == "VEVENT":
+            uid = component.get('uid')
+            recurrence_id = component.get('recurrence-id')
+            dtstamp = component.get('dtstamp')
+            events.append((
+                str(component.get('summary')), component.get('dtstart').dt, component.get('dtend').dt,
+                str(uid) if uid else None, recurrence_id.dt if recurrence_id else None,
+                int(component.get('sequence', 0)), dtstamp.dt if dtstamp else None
+            ))
+    return events
+
+def load_event_set(file_path, full=False, parser=DEFAULT_PARSER, cancel=None, expander=None, window=None):
+    """
+    Load the set of events from an iCalendar file.
+
+    Args:
+        file_path: The path to the iCalendar file.
+        full: If True, return the get_event_set_full tuples instead of the get_event_set tuples.
+        parser: "stream" to extract events without building a Calendar, "parallel" to do so in a process pool,
+            or "calendar" to build a Calendar and use get_event_set.
+        cancel: An optional threading.Event that aborts the load when set.
+        expander: An optional recurrence.RecurrenceExpander (see extract_events).
+        window: An optional window.DateWindow that events must overlap (see extract_events).
+
+    Returns:
+        A set of event tuples.
+
+    Raises:
+        ValueError: If the parser is unknown.
+        Cancelled: If cancel was set.
+        Exception: Any error raised while reading or parsing the file.
+    """
+    if parser == "stream":
+        return set(iter_events(file_path, full, cancel, expander, window))
+    elif parser == "parallel":
+        from .parallel import iter_events_parallel  # parallel.py builds on this module
+        return set(iter_events_parallel(file_path, full, cancel, expander, window=window))
+    elif parser == "calendar":
+        with open(file_path, 'rb') as f:
+            cal = Calendar.from_ical(f.read())
+        check_cancel(cancel)
+        warn_no_expansion(expander)
+        return in_window(get_event_set_full(cal) if full else get_event_set(cal), window)
+    raise ValueError(f"Unknown parser: {parser}")
+
+def load_keyed_events(file_path, parser=DEFAULT_PARSER, cancel=None, expander=None, window=None):
+    """
+    Load the events of an iCalendar file with their identity and revision.
+
+    Unlike load_event_set, this returns a list, as events that differ only in their UID or
+    revision are kept.
+
+    Args:
+        file_path: The path to the iCalendar file.
+        parser: The parser to use, one of options.PARSERS.
+        cancel: An optional threading.Event that aborts the load when set.
+        expander: An optional recurrence.RecurrenceExpander (see extract_events).
+        window: An optional window.DateWindow that events must overlap (see extract_events).
+
+    Returns:
+        A list of get_event_list_keyed tuples.
+
+    Raises:
+        ValueError: If the parser is unknown.
+        Cancelled: If cancel was set.
+        Exception: Any error raised while reading or parsing the file.
+    """
+    if parser == "stream":
+        with open(file_path, 'rb') as f:
+            return list(extract_events(f, cancel=cancel, expander=expander, make_event=event_tuple_keyed, window=window))
+    elif parser == "parallel":
+        from .parallel import iter_events_parallel
+        return list(iter_events_parallel(file_path, cancel=cancel, expander=expander, make_event=event_tuple_keyed, window=window))
+    elif parser == "calendar":
+        with open(file_path, 'rb') as f:
+            cal = Calendar.from_ical(f.read())
+        check_cancel(cancel)
+        warn_no_expansion(expander)
+        return in_window(get_event_list_keyed(cal), window, list)
+    raise ValueError(f"Unknown parser: {parser}")
+
+def warn_no_expansion(expander):
+    """
+    Log that recurring events are not expanded by the "calendar" parser.
+
+    Args:
+        expander: The recurrence.RecurrenceExpander that was requested, or None.
+    """
+    if expander is not None:
+        logging.warning("Recurring events are only expanded by the stream parser.")
+
+def in_window(events, window, container=set):
+    """
+    Keep the events that overlap a date window.
+
+    Args:
+        events: A collection of event tuples.
+        window: A window.DateWindow, or None to keep every event.
+        container: The type of collection to return, if filtered.
+
+    Returns:
+        The events in the window.
+    """
+    if window is None:
+        return events
+    return container(event for event in events if window.contains(event[1], event[2]))
+
+def iter_events(file_path, full=False, cancel=None, expander=None, window=None):
+    """
+    Stream the events of an iCalendar file without building a Calendar object.
+
+    Args:
+        file_path: The path to the iCalendar file.
+        full: If True, yield the get_event_set_full tuples instead of the get_event_set tuples.
+        cancel: An optional threading.Event that aborts the load when set.
+        expander: An optional recurrence.RecurrenceExpander (see extract_events).
+        window: An optional window.DateWindow that events must overlap (see extract_events).
+
+    Yields:
+        One event tuple per VEVENT, in file order.
+    """
+    with open(file_path, 'rb') as f:
+        yield from extract_events(f, full, cancel, expander, window=window)
+
+def extract_events(f, full=False, cancel=None, expander=None, make_event=None, window=None):
+    """
+    Stream the events from a binary file object containing iCalendar data.
+
+    With an expander, recurring events (RRULE or RDATE) are held back until the end of the
+    file, when every RECURRENCE-ID override is known, and then yielded as one event per
+    occurrence in the expander's window.
+
+    With a date window, events are skipped as early as possible: first by the dates written
+    in DTSTART and DTEND, before anything is decoded, and then by their decoded times.
+
+    Args:
+        f: A binary file object (or any iterable of byte lines).
+        full: If True, yield the get_event_set_full tuples instead of the get_event_set tuples.
+        cancel: An optional threading.Event, checked every CANCEL_CHECK_INTERVAL events.
+        expander: An optional recurrence.RecurrenceExpander.
+        make_event: The function building an event tuple from VEVENT properties, overriding full.
+        window: An optional window.DateWindow that events must overlap.
+
+    Yields:
+        One event tuple per VEVENT (or occurrence), in file order.
+
+    Raises:
+        Cancelled: If cancel was set.
+    """
+    make_event = make_event or (event_tuple_full if full else event_tuple)
+    series = []
+    overrides = set()
+    for count, props in enumerate(iter_vevents(unfold_lines(f)), 1):
+        if count % CANCEL_CHECK_INTERVAL == 0:
+            check_cancel(cancel)
+        if expander is not None:
+            if 'RRULE' in props or 'RDATE' in props:
+                series.append(props)
+                continue
+            if 'RECURRENCE-ID' in props:
+                overrides.add(expander.override_key(props))
+        if window is None:
+            yield make_event(props)
+        elif not window.rejects(props):
+            event = make_event(props)
+            if window.contains(event[1], event[2]):
+                yield event
+    for props in series:
+        check_cancel(cancel)
+        for event in expander.expand(props, make_event, overrides):
+            if window is None or window.contains(event[1], event[2]):
+                yield event
+
+def unfold_lines(f):
+    """
+    Unfold iCalendar content lines as they are read.
+
+    Folding is undone on the raw bytes, so multi-byte characters split across a fold are decoded correctly.
+
+    Args:
+        f: An iterable of byte lines.
+
+    Yields:
+        Unfolded content lines as str, without line endings. Blank lines are skipped.
+    """
+    parts = []
+    for raw in f:
+        line = raw.rstrip(b'\r\n')
+        if line[:1] in (b' ', b'\t'):
+            if parts:
+                parts.append(line[1:])
+            continue
+        if parts:
+            yield b''.join(parts).decode('utf-8', errors='replace')
+        parts = [line] if line else []
+    if parts:
+        yield b''.join(parts).decode('utf-8', errors='replace')
+
+def line_name(line):
+    """
+    Get the upper-cased property name of a content line without parsing its parameters or value.
+
+    Args:
+        line: An unfolded content line.
+
+    Returns:
+        The property name.
+    """
+    end = len(line)
+    for separator in (':', ';'):
+        index = line.find(separator, 0, end)
+        if index != -1:
+            end = index
+    return line[:end].upper()
+
+def iter_vevents(lines):
+    """
+    Collect the properties of each VEVENT from a stream of unfolded content lines.
+
+    VTIMEZONE components are parsed as they are encountered so that custom TZIDs resolve the same way they do in Calendar.from_ical.
+    Properties of subcomponents (e.g. VALARM) are ignored, and only the first occurrence of each property is kept,
+    except for MULTI_PROPERTIES, which are kept as a list of every occurrence.
+
+    Args:
+        lines: An iterable of unfolded content lines.
+
+    Yields:
+        A dict of {name: content line} for each VEVENT. Lines are decoded on demand by decode_dt and decode_text.
+    """
+    props = None
+    depth = 0
+    timezone_lines = None
+    for line in lines:
+        upper = line[:12].upper()
+        if timezone_lines is not None:
+            timezone_lines.append(line)
+            if upper.startswith("END:VTIMEZON"):
+                Calendar.from_ical("\r\n".join(timezone_lines))
+                timezone_lines = None
+        elif upper.startswith("BEGIN:"):
+            component = line[6:].strip().upper()
+            if component == "VEVENT" and props is None:
+                props = {}
+                depth = 0
+            elif component == "VTIMEZONE" and props is None:
+                timezone_lines = [line]
+            elif props is not None:
+                depth += 1
+        elif upper.startswith("END:"):
+            if props is not None:
+                if depth == 0:
+                    yield props
+                    props = None
+                else:
+                    depth -= 1
+        elif props is not None and depth == 0:
+            name = line_name(line)
+            if name in MULTI_PROPERTIES:
+                props.setdefault(name, []).append(line)
+            elif name not in props:
+                props[name] = line
+
+def decode_dt(prop):
+    """
+    Decode a date, date-time or duration property.
+
+    Args:
+        prop: A content line from iter_vevents, or None.
+
+    Returns:
+        The decoded date, datetime or timedelta, or None if the property is missing.
+    """
+    if prop is None:
+        return None
+    name, params, value = Contentline(prop).parts()
+    tzid = params.get('TZID') if params else None
+    if tzid:
+        return vDDDTypes.from_ical(value, timezone=tzid)
+    return vDDDTypes.from_ical(value)
+
+def decode_text(prop):
+    """
+    Decode a text property.
+
+    Args:
+        prop: A content line from iter_vevents, or None.
+
+    Returns:
+        The unescaped vText, or None if the property is missing.
+    """
+    if prop is None:
+        return None
+    return vText(Contentline(prop).parts()[2])
+
+def event_end(props, dtstart):
+    """
+    Get the end of an event, falling back to DURATION or the RFC 5545 default when DTEND is missing.
+
+    Args:
+        props: The VEVENT properties from iter_vevents.
+        dtstart: The decoded DTSTART.
+
+    Returns:
+        The decoded end date or datetime.
+    """
+    dtend = decode_dt(props.get('DTEND'))
+    if dtend is not None:
+        return dtend
+    duration = decode_dt(props.get('DURATION'))
+    if duration is not None:
+        return dtstart + duration
+    if isinstance(dtstart, date) and not isinstance(dtstart, datetime):
+        return dtstart + timedelta(days=1)
+    return dtstart
+
+def event_tuple(props):
+    """
+    Build a get_event_set tuple from VEVENT properties.
+
+    Args:
+        props: The VEVENT properties from iter_vevents.
+
+    Returns:
+        A tuple of (summary, dtstart, dtend).
+    """
+    dtstart = decode_dt(props.get('DTSTART'))
+    return (str(decode_text(props.get('SUMMARY'))), dtstart, event_end(props, dtstart))
+
+def event_tuple_full(props):
+    """
+    Build a get_event_set_full tuple from VEVENT properties.
+
+    Args:
+        props: The VEVENT properties from iter_vevents.
+
+    Returns:
+        A tuple of (summary, dtstart, dtend, dtstamp, uid, description).
+    """
+    dtstart = decode_dt(props.get('DTSTART'))
+    return (str(decode_text(props.get('SUMMARY'))), dtstart, event_end(props, dtstart), decode_dt(props.get('DTSTAMP')), decode_text(props.get('UID')), decode_text(props.get('DESCRIPTION')))
+
+def decode_int(prop, default=0):
+    """
+    Decode an integer property, such as SEQUENCE.
+
+    Args:
+        prop: A content line from iter_vevents, or None.
+        default: The value if the property is missing or invalid.
+
+    Returns:
+        int: The decoded value.
+    """
+    if prop is None:
+        return default
+    try:
+        return int(Contentline(prop).parts()[2])
+    except ValueError:
+        return default
+
+def event_tuple_keyed(props):
+    """
+    Build a get_event_list_keyed tuple from VEVENT properties.
+
+    Args:
+        props: The VEVENT properties from iter_vevents.
+
+    Returns:
+        A tuple of (summary, dtstart, dtend, uid, recurrence_id, sequence, dtstamp).
+    """
+    dtstart = decode_dt(props.get('DTSTART'))
+    uid = decode_text(props.get('UID'))
+    return (
+        str(decode_text(props.get('SUMMARY'))), dtstart, event_end(props, dtstart),
+        str(uid) if uid else None, decode_dt(props.get('RECURRENCE-ID')),
+        decode_int(props.get('SEQUENCE')), decode_dt(props.get('DTSTAMP'))
+    )
+
 def create_event(event, all_day):
     """
     Create a new event.
 
     Args:
-        event: A tuple representing the event with (summary, dtstart, dtend).
+        event: A tuple representing the event with (summary, dtstart, dtend), or a
+            get_event_list_keyed tuple, whose UID, RECURRENCE-ID and SEQUENCE are kept so
+            calendar apps update the existing event instead of adding a copy.
         all_day: A boolean indicating if the event is an all-day event.
 
     Returns:
@@ -63,6 +461,11 @@ def create_event(event, all_day):
     """
     new_event = Event()
     new_event.add('summary', event[0])
+    if len(event) > 3 and event[3]:
+        new_event.add('uid', event[3])
+        if event[4] is not None:
+            new_event.add('recurrence-id', event[4])
+        new_event.add('sequence', event[5])
     if all_day:
         new_event.add('dtstart', event[1].date())
         new_event.add('dtend', event[2].date())
@@ -72,3 +475,76 @@ def create_event(event, all_day):
     new_event.add('dtstamp', datetime.now())
     new_event.add('comment', "Processed by ICSMERGER")
     return new_event
+
+def write_ics(f, events, all_day, newline="\n", cancel=None):
+    """
+    Write events to an iCalendar file, one event at a time.
+
+    The events are written in start order, so they are sorted into a list first; only the
+    output is streamed. Unlike building a Calendar and calling to_ical, a single event's
+    iCalendar text is held in memory at a time, rather than that of the whole file.
+
+    Args:
+        f: A file opened in binary mode.
+        events: An iterable of (summary, dtstart, dtend) tuples, in any order.
+        all_day: A boolean indicating if the events should be all-day events.
+        newline: The line ending, one of NEWLINES.values().
+        cancel: An optional threading.Event that aborts the write when set.
+
+    Returns:
+        int: The number of events written.
+
+    Raises:
+        Cancelled: If cancel was set.
+    """
+    newline = newline.encode("ascii")
+    f.write(b"BEGIN:VCALENDAR" + newline)
+    count = 0
+    for count, event in enumerate(sorted(events, key=event_sort_key), 1):
+        if count % CANCEL_CHECK_INTERVAL == 0:
+            check_cancel(cancel)
+        f.write(create_event(event, all_day).to_ical().replace(b"\r\n", newline))
+    f.write(b"END:VCALENDAR" + newline)
+    return count
+
+def as_date(value):
+    """
+    Get the date of a date or datetime.
+
+    Args:
+        value: A date or datetime.
+
+    Returns:
+        The date.
+    """
+    return value.date() if isinstance(value, datetime) else value
+
+def sort_key(value):
+    """
+    Get a key that orders dates, naive datetimes and aware datetimes together.
+
+    Aware datetimes are compared in UTC, and dates as midnight.
+
+    Args:
+        value: A date or datetime.
+
+    Returns:
+        A naive datetime.
+    """
+    if isinstance(value, datetime):
+        if value.tzinfo is not None:
+            return value.astimezone(timezone.utc).replace(tzinfo=None)
+        return value
+    return datetime.combine(value, time())
+
+def event_sort_key(event):
+    """
+    Get the key that orders events by their start.
+
+    Args:
+        event: An event tuple.
+
+    Returns:
+        A naive datetime.
+    """
+    return sort_key(event[1])
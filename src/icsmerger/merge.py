@@ -1,15 +1,19 @@
-import os
 import toga
+import asyncio
 import logging
+from threading import Event
 from toga.style import Pack
 from toga.style.pack import COLUMN, ROW, CENTER, BOLD
-from icalendar import Calendar
-from .ical import load_ics, get_event_set, create_event
-from .exclusions import load_exclusions, filter_exclusions, print_exclusions
-from .descriptions import merge_descriptions
+from .ical import Cancelled
+from .watch import FileWatcher, SnapshotCache
+from .engine import feed_paths, merge_files, write_output, discard_output, exclusions_report, removals_report, new_events_report
 from .fileio import get_outdir, open_output_file
+from .progress import ProgressPanel, TimingsPanel
+from .timing import profile_call
+from .report import ReportWriter
+from .export import export_result
 
-async def run_merge(self, ics1_path, ics2_path, exclusions_path, all_day):
+async def run_merge(self, ics1_path, ics2_path, exclusions_path, all_day, window=None):
     
     async def save_file_dialog(title, suggested):
         file_path = await merge_window.save_file_dialog(title, suggested_filename=suggested)
@@ -19,27 +23,67 @@ async def run_merge(self, ics1_path, ics2_path, exclusions_path, all_day):
         suggestions_file_path = await save_file_dialog("Save Suggestions", "suggestions.txt")
         if suggestions_file_path:
             with open(suggestions_file_path, 'w') as f:
-                f.write(remove_text.value)
+                f.write(remove_report.value())
             merge_window.info_dialog("Save Suggestions", "Suggestions saved successfully.")
 
     async def save_merge_results(widget):
         merge_results_file_path = await save_file_dialog("Save Merge Results", "merge.ics")
         if merge_results_file_path:
-            with open(merge_results_file_path, 'w') as f:
-                f.write(output_cal.to_ical().decode("utf-8").replace('\r\n', '\n').strip())
+            write_output(result, merge_results_file_path)
             merge_window.info_dialog("Save Merge Results", "Merge results saved successfully.")
 
     async def open_merge_results(widget):
         save_path = get_outdir(self)
         try:
             if save_path:
-                with open(save_path, 'w') as f:
-                    f.write(output_cal.to_ical().decode("utf-8").replace('\r\n', '\n').strip())
+                write_output(result, save_path)
             open_output_file(merge_window, save_path)
         except Exception as e:
             merge_window.info_dialog("Error", f"An unknown error occurred during opening: {e}")
 
+    async def export_changes(widget):
+        export_file_path = await merge_window.save_file_dialog("Export Changes", suggested_filename="changes.csv", file_types=["csv", "ndjson", "json"])
+        if export_file_path:
+            try:
+                count = export_result(result, str(export_file_path))
+                merge_window.info_dialog("Export Changes", f"Exported {count} event(s) successfully.")
+            except Exception as e:
+                merge_window.error_dialog("Error", f"Failed to export changes: {e}")
+
+    async def show_all(widget):
+        show_all_button.enabled = False
+        for report in (excl_report, remove_report, merge_report):
+            await report.flush(show_all=True)
+
+    async def toggle_watch(widget):
+        if watch_switch.value:
+            watch_cancel.clear()
+            asyncio.create_task(watch_inputs())
+        else:
+            watch_cancel.set()
+
+    async def watch_inputs():
+        # Merge again whenever ICS2 or EXCL changes, until the switch is turned off or the window is closed
+        paths = feed_paths(ics2_path) + ([exclusions_path] if exclusions_path else [])
+        watcher = FileWatcher(paths, debounce=self.watch_debounce)
+        loop = asyncio.get_running_loop()
+        try:
+            while True:
+                changed = await loop.run_in_executor(None, watcher.wait, watch_cancel)
+                if watch_cancel.is_set():   # Stopped as the change arrived
+                    break
+                logging.info(f"Changed: {sorted(changed)}. Merging again.")
+                await merge()
+        except Cancelled:
+            logging.debug("Stopped watching.")
+        finally:
+            watcher.close()
+
     def close_handler(widget):
+        watch_cancel.set()
+        progress_panel.cancel()
+        if result is not None:
+            discard_output(result)
         merge_window.close()
         # self.merge_button.enabled = True
         # self.merge_open = False
@@ -56,6 +100,23 @@ async def run_merge(self, ics1_path, ics2_path, exclusions_path, all_day):
     excl_text = toga.MultilineTextInput(readonly=True, style=Pack(flex=1))
     remove_text = toga.MultilineTextInput(readonly=True, style=Pack(flex=1))
     merge_text = toga.MultilineTextInput(readonly=True, style=Pack(flex=1))
+    excl_report = ReportWriter(excl_text)
+    remove_report = ReportWriter(remove_text)
+    merge_report = ReportWriter(merge_text)
+
+    # Create progress and result buttons (enabled once the merge has finished)
+    progress_panel = ProgressPanel()
+    timings_panel = TimingsPanel()
+    save_suggestions_button = toga.Button("Save Suggested Removals", on_press=save_suggestions, enabled=False)
+    save_merge_results_button = toga.Button("Save Events to .ics", on_press=save_merge_results, enabled=False, style=Pack(padding_top=0, padding_right=5,padding_bottom=0, padding_left=0))
+    open_merge_results_button = toga.Button("Open Events in Calendar", on_press=open_merge_results, enabled=False, style=Pack(padding=(0,5)))
+    show_all_button = toga.Button("Show All", on_press=show_all, enabled=False)
+    export_button = toga.Button("Export Changes", on_press=export_changes, enabled=False, style=Pack(padding=(0, 5)))
+    watch_switch = toga.Switch("Watch ICS2 and EXCL, and merge again when they change", value=False, on_change=toggle_watch, enabled=False)
+    watch_cancel = Event()
+    # The calendars parsed by the last merge, so a merge after a change only parses the changed files
+    snapshots = SnapshotCache(self.event_cache)
+    result = None
 
     # Create Content Box
     merge_box = toga.Box(style=Pack(direction=COLUMN, padding=10), children=[
@@ -71,26 +132,39 @@ async def run_merge(self, ics1_path, ics2_path, exclusions_path, all_day):
             remove_text,
             merge_text
         ]),
+        # Row 3, merge progress
+        progress_panel.box,
+        # Row 3b, stage timings (collapsed until the merge has finished and it is expanded)
+        timings_panel.box,
+        # Row 3c, watch mode (available once the first merge has finished)
+        toga.Box(style=Pack(direction=ROW, padding=(0, 10)), children=[
+            watch_switch
+        ]),
         toga.Box(style=Pack(direction=ROW, padding=10), children=[
-        # Row 3 
-            # Col 1, just a spacer
-            toga.Label("", style=Pack(direction=ROW, alignment=CENTER, flex=1)),
+        # Row 4 
+            # Col 1, Show All button (for reports too long to show at once) and Export button (CSV/NDJSON/JSON)
+            toga.Box(style=Pack(direction=COLUMN, alignment=CENTER, flex=1), children=[
+                inner := toga.Box(style=Pack(direction=ROW), children=[
+                    show_all_button,
+                    export_button
+                ])
+            ]),
             # Col 2, Save Removals button
             toga.Box(style=Pack(direction=COLUMN, alignment=CENTER, flex=1), children=[
                 inner := toga.Box(style=Pack(direction=ROW), children=[
-                    toga.Button("Save Suggested Removals", on_press=save_suggestions)
+                    save_suggestions_button
                 ])
             ]),
             # Col 3, Save and Open Events Buttons
             toga.Box(style=Pack(direction=COLUMN, alignment=CENTER, flex=1), children=[
                 inner := toga.Box(style=Pack(direction=ROW), children=[
-                    toga.Button("Save Events to .ics", on_press=save_merge_results, style=Pack(padding_top=0, padding_right=5,padding_bottom=0, padding_left=0)),
-                    toga.Button("Open Events in Calendar", on_press=open_merge_results, style=Pack(padding=(0,5)))
+                    save_merge_results_button,
+                    open_merge_results_button
                 ])
             ])
         ]),
         toga.Box(style=Pack(direction=ROW, padding=10), children=[
-        # Row 4, Close button
+        # Row 5, Close button
             toga.Label("", style=Pack(flex=1)),
             toga.Button('Close', on_press=close_handler),
             toga.Label("", style=Pack(flex=1))
@@ -104,75 +178,58 @@ async def run_merge(self, ics1_path, ics2_path, exclusions_path, all_day):
     # self.merge_open = True
     self.main_window.hide()
 
-    # Run the merge
-    output_cal = merge(merge_window, ics1_path, ics2_path, exclusions_path, excl_text, remove_text, merge_text, all_day)
-
-# Main function to merge calendars
-def merge(merge_window, ics1_path, ics2_path, exclusions_path, excl_text, remove_text, merge_text, all_day):
-    try:
-        # Load the calendars from the input files
-        cal1 = load_ics(merge_window, ics1_path) if os.path.exists(ics1_path) else Calendar()
-        cal2 = load_ics(merge_window, ics2_path) if os.path.exists(ics2_path) else None
-        if cal1 is None and cal2 is None:   # Sanity check
-            merge_text.value += f"{merge_descriptions["no_reach"]}"
+    async def merge():
+        nonlocal result
+        if result is not None:
+            discard_output(result)
+            result = None
+        for button in (save_suggestions_button, save_merge_results_button, open_merge_results_button, show_all_button, export_button):
+            button.enabled = False
+        for report in (excl_report, remove_report, merge_report):
+            report.clear()
+        progress_panel.reset()
+
+        # Run the merge in a worker thread, so the window stays responsive (profiling it if enabled)
+        try:
+            result = await progress_panel.run(profile_call, self.profile_path("merge"), merge_files, ics1_path, ics2_path, exclusions_path, all_day, self.parser, snapshots, diff_mode=self.diff_mode, expander=self.get_expander(), window=window)
+        except Cancelled:
+            logging.debug("Merge cancelled.")
+            progress_panel.finish("Merge cancelled.")
             return
-
-        # Create a set of events from each calendar
-        events1 = get_event_set(cal1) if cal1 else set()
-        events2 = get_event_set(cal2) if cal2 else set()
-
-        # Load, apply, and print the exclusions
-        filtered_events1 = set()
-        filtered_events2 = set()
-        excluded_events_ics1 = set()
-        excluded_events_ics2 = set()
-        if not exclusions_path:
-            excl_text.value += "No EXCL file provided.\n\n"
-            exclusions = []
-            filtered_events1 = events1
-            filtered_events2 = events2
-        else:
-            exclusions = load_exclusions(merge_window, exclusions_path)
-            filtered_events1, excluded_events_ics1 = filter_exclusions(events1, exclusions)
-            filtered_events2, excluded_events_ics2 = filter_exclusions(events2, exclusions)
-            if exclusions:
-                excl_text.value += f"Excluding consideration of any event(s) matching:\n\n"
-                for excl in exclusions:
-                    excl_text.value += f"  - '{excl}'\n"
-                print_exclusions(sorted(excluded_events_ics1, key=lambda x: x[1]), excl_text, "ICS1")
-                print_exclusions(sorted(excluded_events_ics2, key=lambda x: x[1]), excl_text, "ICS2")
-            else:
-                excl_text.value += "EXCL file was provided, but it was empty.\n\n"
-
-        # Generate unique events for each calendar
-        unique_events_ics2 = filtered_events2 - filtered_events1  # These are the initial new events to be added to the output ical
-        unique_events_ics1 = filtered_events1 - filtered_events2  # These are used to report possible events to manually remove
-
-        # Create a new calendar from the filtered_events
-        output_cal = Calendar()
-        for event in unique_events_ics2:
-            output_cal.add_component(create_event(event, all_day))
-
-        # If there was an ICS1, report any event that exists in ICS1 but not ICS2 as possible removals, in sorted order
-        if os.path.exists(ics1_path):
-            if unique_events_ics1:
-                remove_text.value += f"Consider manually removing the following events from your calendar.\n\nThey existed in ICS1 but are not in ICS2 and thus may no longer be relevant.\n\nThese event(s) are:\n\n"
-                for event in sorted(unique_events_ics1, key=lambda x: x[1]):
-                    remove_text.value += f"  - '{event[0]}' ({event[1].date()})\n"
-            else:
-                remove_text.value += "No suggested removals from the current calendar were found in ICS1."
-        else:
-            remove_text.value += "First run detected. No removals from the current calendar are suggested."
-
-        # Report overall result
-        if unique_events_ics2:
-            merge_text.value += f"There are {len(unique_events_ics2)} new event(s) in ICS2 that do not exist in ICS1.\n\nThese event(s) are:\n\n"
-            for event in sorted(unique_events_ics2, key=lambda x: x[1]):
-                merge_text.value += f"  - '{event[0]}' ({event[1].date()})\n"
-        else:
-            merge_text.value += "No new events were found in ICS2.\n"
-
-        return output_cal
-
-    except Exception as e:
-        merge_text.value += f"An unknown error occurred during the merge process: {e}\n"
+        except Exception as e:
+            progress_panel.finish("Merge failed.")
+            merge_text.value += f"An unknown error occurred during the merge process: {e}\n"
+            return
+        if progress_panel.cancel_event.is_set():   # Closed as the merge finished
+            discard_output(result)
+            return
+        progress_panel.finish("Merge complete.")
+        timings_panel.show(result.timer)
+
+        if await show_merge_results(merge_window, result, excl_report, remove_report, merge_report):
+            save_suggestions_button.enabled = True
+            save_merge_results_button.enabled = True
+            open_merge_results_button.enabled = True
+            export_button.enabled = True
+        show_all_button.enabled = any(report.truncated for report in (excl_report, remove_report, merge_report))
+
+    await merge()
+    if not progress_panel.cancel_event.is_set():
+        watch_switch.enabled = True
+
+# Display the results of a merge
+async def show_merge_results(merge_window, result, excl_report, remove_report, merge_report):
+    for error in result.errors:
+        merge_window.info_dialog("Error", error)
+    if not result.loaded:
+        merge_report.write(new_events_report(result))
+        await merge_report.flush()
+        return False
+
+    excl_report.write(exclusions_report(result))
+    remove_report.write(removals_report(result))
+    merge_report.write(new_events_report(result))
+    for report in (excl_report, remove_report, merge_report):
+        await report.flush()
+
+    return result.output_path is not None
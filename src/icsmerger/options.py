@@ -0,0 +1,27 @@
+# Choices and defaults for the settings shared by the GUI, the command line and the modules
+# that implement them. This module must stay free of heavy imports (icalendar, requests), so
+# the GUI can read its configuration before any of them are loaded.
+
+# "stream" (extract events line by line), "parallel" (stream chunks of large files in a
+# process pool, see parallel.py) or "calendar" (build the full Calendar tree)
+PARSERS = ("stream", "parallel", "calendar")
+DEFAULT_PARSER = "stream"
+
+# "event" compares (summary, dtstart, dtend); "uid" joins the calendars on UID (and RECURRENCE-ID)
+DIFF_MODES = ("event", "uid")
+DEFAULT_DIFF_MODE = "event"
+
+# The default window, relative to today, that recurring events are expanded in
+DEFAULT_DAYS_BEFORE = 30
+DEFAULT_DAYS_AFTER = 365
+
+# The size the parsed-calendar cache is trimmed to
+DEFAULT_MAX_BYTES = 256 * 1024 * 1024
+
+# Automatic update checks within this many hours of the last one use its result
+DEFAULT_CHECK_INTERVAL_HOURS = 24
+
+# Watch mode: a change is acted on once the watched files have been quiet for this long, and
+# files are polled this often where inotify is not available
+DEFAULT_WATCH_DEBOUNCE_SECONDS = 2.0
+DEFAULT_WATCH_POLL_SECONDS = 1.0
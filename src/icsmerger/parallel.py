@@ -0,0 +1,157 @@
+import io
+import os
+import mmap
+import logging
+import multiprocessing
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor
+from .ical import extract_events, check_cancel, Cancelled
+
+# Files smaller than this are parsed serially: starting the worker processes costs more than it saves
+PARALLEL_MIN_BYTES = 16 * 1024 * 1024
+# The target size of each chunk handed to a worker
+CHUNK_BYTES = 4 * 1024 * 1024
+# How many chunks each worker may have submitted at once. Parsed chunks wait in memory until
+# they are yielded, so this bounds the memory used by workers that get ahead of the consumer.
+CHUNKS_IN_FLIGHT_PER_WORKER = 2
+
+EVENT_BOUNDARY = b"\nBEGIN:VEVENT"
+
+def split_chunks(data, chunk_bytes=CHUNK_BYTES):
+    """
+    Split iCalendar data into chunks of whole VEVENTs.
+
+    Chunks only start at a "BEGIN:VEVENT" line. Folded continuation lines start with a space
+    or tab, so a fold can never be mistaken for a boundary and a VEVENT is never split.
+
+    Args:
+        data: The bytes (or mmap) of an iCalendar file.
+        chunk_bytes: The target chunk size. Chunks are extended to the next boundary.
+
+    Returns:
+        A tuple of (header, [(start, end), ...]). The header is everything before the first
+        VEVENT (the VCALENDAR properties and VTIMEZONEs), plus any VTIMEZONE found after it,
+        and must be prepended to each chunk so custom TZIDs resolve in every chunk.
+        The list is empty if the data has no VEVENT.
+    """
+    first = data.find(EVENT_BOUNDARY)
+    if first == -1:
+        return b"", []
+    first += 1
+    header = [data[:first]]
+
+    # Some exporters write their VTIMEZONEs after the events
+    position = data.find(b"BEGIN:VTIMEZONE", first)
+    while position != -1:
+        end = data.find(b"END:VTIMEZONE", position)
+        if end == -1:
+            break
+        end += len(b"END:VTIMEZONE")
+        header.append(data[position:end] + b"\r\n")
+        position = data.find(b"BEGIN:VTIMEZONE", end)
+
+    chunks = []
+    start = first
+    while start < len(data):
+        boundary = data.find(EVENT_BOUNDARY, start + chunk_bytes)
+        end = len(data) if boundary == -1 else boundary + 1
+        chunks.append((start, end))
+        start = end
+    return b"".join(header), chunks
+
+def parse_chunk(file_path, header, start, end, full=False, make_event=None, window=None):
+    """
+    Parse the events of one chunk of an iCalendar file. Runs in a worker process.
+
+    Args:
+        file_path: The path to the iCalendar file.
+        header: The header from split_chunks.
+        start: The offset of the chunk in the file.
+        end: The offset of the end of the chunk.
+        full: If True, return the get_event_set_full tuples instead of the get_event_set tuples.
+        make_event: The function building an event tuple from VEVENT properties, overriding full.
+        window: An optional window.DateWindow that events must overlap.
+
+    Returns:
+        A list of event tuples, in file order.
+    """
+    with open(file_path, 'rb') as f:
+        f.seek(start)
+        data = f.read(end - start)
+    return list(extract_events(io.BytesIO(header + data), full, make_event=make_event, window=window))
+
+def iter_events_parallel(file_path, full=False, cancel=None, expander=None, make_event=None, window=None,
+                         workers=None, min_bytes=PARALLEL_MIN_BYTES, chunk_bytes=CHUNK_BYTES):
+    """
+    Stream the events of an iCalendar file, parsing chunks of it in a process pool.
+
+    Small files, files that split into a single chunk, and loads that expand recurring
+    events (which need every RECURRENCE-ID in the file at once) are parsed serially.
+    A chunk that fails in the pool (e.g. because worker processes cannot be started) is
+    parsed again in this process, so errors in the file are raised as with ical.iter_events.
+    At most CHUNKS_IN_FLIGHT_PER_WORKER chunks per worker are submitted ahead of the one being
+    yielded, so the events held in memory stay bounded however large the file is.
+
+    Args:
+        file_path: The path to the iCalendar file.
+        full: If True, yield the get_event_set_full tuples instead of the get_event_set tuples.
+        cancel: An optional threading.Event that aborts the load when set.
+        expander: An optional recurrence.RecurrenceExpander (see ical.extract_events).
+        make_event: The function building an event tuple from VEVENT properties, overriding full.
+        window: An optional window.DateWindow that events must overlap.
+        workers: The number of worker processes. Defaults to the number of CPUs.
+        min_bytes: Files smaller than this are parsed serially.
+        chunk_bytes: The target chunk size (see split_chunks).
+
+    Yields:
+        One event tuple per VEVENT, in file order.
+
+    Raises:
+        Cancelled: If cancel was set.
+    """
+    with open(file_path, 'rb') as f:
+        size = os.fstat(f.fileno()).st_size
+        header, chunks = b"", []
+        if expander is None and size >= min_bytes:
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+                header, chunks = split_chunks(data, chunk_bytes)
+        if len(chunks) < 2:
+            yield from extract_events(f, full, cancel, expander, make_event, window)
+            return
+
+    workers = min(workers or os.cpu_count() or 1, len(chunks))
+    logging.debug(f"Parsing {file_path} in {len(chunks)} chunks with {workers} processes")
+    # "spawn" rather than "fork": the GUI runs loads in a worker thread, and forking a threaded process is unsafe
+    with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn")) as pool:
+        pending = iter(chunks)
+        in_flight = deque()     # [(future, start, end)], in file order
+
+        def submit():
+            chunk = next(pending, None)
+            if chunk is None:
+                return
+            try:
+                future = pool.submit(parse_chunk, file_path, header, *chunk, full, make_event, window)
+            except Exception as e:
+                # e.g. the pool broke: the chunk fails like one that failed in a worker
+                future = Future()
+                future.set_exception(e)
+            in_flight.append((future, *chunk))
+
+        for _ in range(workers * CHUNKS_IN_FLIGHT_PER_WORKER):
+            submit()
+        while in_flight:
+            future, start, end = in_flight.popleft()
+            try:
+                check_cancel(cancel)
+                events = future.result()
+            except Cancelled:
+                pool.shutdown(wait=False, cancel_futures=True)
+                raise
+            except Exception as e:
+                logging.warning(f"Parsing chunk {start}-{end} of {file_path} in a worker failed ({e}), parsing it serially.")
+                events = parse_chunk(file_path, header, start, end, full, make_event, window)
+            del future
+            submit()
+            yield from events
+            del events
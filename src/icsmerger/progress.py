@@ -0,0 +1,126 @@
+import asyncio
+import logging
+import functools
+import toga
+from threading import Event
+from toga.style import Pack
+from toga.style.pack import ROW, COLUMN, CENTER
+
+class ProgressPanel():
+    """
+    A stage label, progress bar and Cancel button for work that runs in a worker thread.
+
+    The work function must accept progress and cancel keyword arguments, like
+    engine.merge_files and engine.analyze_files.
+    """
+    def __init__(self):
+        self.cancel_event = Event()
+        self.label = toga.Label("Starting...", style=Pack(padding=(0, 10), width=220))
+        self.progress_bar = toga.ProgressBar(max=1, value=0, style=Pack(padding=(0, 10), flex=1))
+        self.cancel_button = toga.Button("Cancel", on_press=self.cancel, style=Pack(padding=(0, 5)))
+        self.box = toga.Box(style=Pack(direction=ROW, alignment=CENTER, padding=10), children=[
+            self.label,
+            self.progress_bar,
+            self.cancel_button
+        ])
+
+    def cancel(self, widget=None):
+        """
+        Ask the worker to stop at its next cancellation check.
+
+        Args:
+            widget: The widget that triggered the cancel, if any.
+        """
+        if not self.cancel_event.is_set():
+            logging.debug("Cancelling worker.")
+            self.cancel_event.set()
+            self.label.text = "Cancelling..."
+            self.cancel_button.enabled = False
+
+    def reset(self):
+        """
+        Get ready to run the work again, e.g. when a watched file changed.
+        """
+        self.cancel_event.clear()
+        self.progress_bar.value = 0
+        self.label.text = "Starting..."
+        self.cancel_button.enabled = True
+
+    def update(self, index, count, stage):
+        """
+        Show the stage the worker has started. Must be called on the UI thread.
+
+        Args:
+            index: The index of the stage.
+            count: The number of stages.
+            stage: The stage name.
+        """
+        if self.cancel_event.is_set():
+            return
+        self.progress_bar.max = count
+        self.progress_bar.value = index
+        self.label.text = f"{stage}... ({index + 1}/{count})"
+
+    def finish(self, text):
+        """
+        Show that the worker has stopped.
+
+        Args:
+            text: The final status text.
+        """
+        self.progress_bar.value = self.progress_bar.max
+        self.label.text = text
+        self.cancel_button.enabled = False
+
+    async def run(self, func, *args, **kwargs):
+        """
+        Run func in a worker thread, reporting its progress in this panel.
+
+        Args:
+            func: The function to run. It is called as func(*args, progress=..., cancel=..., **kwargs).
+
+        Returns:
+            The return value of func.
+
+        Raises:
+            ical.Cancelled: If the Cancel button was pressed.
+            Exception: Anything raised by func.
+        """
+        loop = asyncio.get_running_loop()
+
+        def progress(index, count, stage):
+            loop.call_soon_threadsafe(self.update, index, count, stage)
+
+        work = functools.partial(func, *args, progress=progress, cancel=self.cancel_event, **kwargs)
+        return await loop.run_in_executor(None, work)
+
+class TimingsPanel():
+    """
+    A collapsible section showing how long each stage of a finished run took (see timing.StageTimer).
+    """
+    def __init__(self):
+        self.switch = toga.Switch("Show stage timings", value=False, on_change=self.toggle, enabled=False)
+        self.text = toga.MultilineTextInput(readonly=True, style=Pack(height=120, font_family='monospace'))
+        self.box = toga.Box(style=Pack(direction=COLUMN, padding=(0, 10)), children=[self.switch])
+
+    def toggle(self, widget):
+        """
+        Expand or collapse the section.
+
+        Args:
+            widget: The switch.
+        """
+        if self.switch.value:
+            self.box.add(self.text)
+        else:
+            self.box.remove(self.text)
+
+    def show(self, timer):
+        """
+        Show the stage timings of a run.
+
+        Args:
+            timer: The timing.StageTimer of the run.
+        """
+        self.text.value = "".join(timer.lines())
+        self.switch.enabled = True
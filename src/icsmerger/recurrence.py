@@ -0,0 +1,219 @@
+import re
+import logging
+import threading
+from collections import OrderedDict
+from datetime import date, datetime, timedelta
+from icalendar.parser import Contentline
+from icalendar.prop import vDDDLists
+from .ical import decode_dt, sort_key
+from .options import DEFAULT_DAYS_BEFORE, DEFAULT_DAYS_AFTER
+
+# Safety limits: occurrences per series, and series kept in the memo cache
+DEFAULT_MAX_OCCURRENCES = 5000
+MEMO_SIZE = 1024
+
+UNTIL_UTC = re.compile(r"(UNTIL=\d{8}(T\d{6})?)Z", re.IGNORECASE)
+
+def default_window(days_before=DEFAULT_DAYS_BEFORE, days_after=DEFAULT_DAYS_AFTER, today=None):
+    """
+    Get a window of dates around today.
+
+    Args:
+        days_before: The number of days before today to start the window.
+        days_after: The number of days after today to end the window.
+        today: The date to center the window on. Defaults to today.
+
+    Returns:
+        A tuple of (first date, last date), inclusive.
+    """
+    today = today or date.today()
+    return today - timedelta(days=days_before), today + timedelta(days=days_after)
+
+def decode_dates(lines):
+    """
+    Decode EXDATE or RDATE properties, each of which may hold a comma separated list.
+
+    Args:
+        lines: The content lines from ical.iter_vevents, or None.
+
+    Returns:
+        A list of dates and datetimes. RDATE periods are skipped.
+    """
+    values = []
+    for line in lines or ():
+        name, params, value = Contentline(line).parts()
+        if params.get('VALUE', '').upper() == 'PERIOD' or '/' in value:
+            logging.debug(f"Skipping {name} period: {value}")
+            continue
+        tzid = params.get('TZID') if params else None
+        values.extend(vDDDLists.from_ical(value, timezone=tzid) if tzid else vDDDLists.from_ical(value))
+    return values
+
+def replace_times(event, dtstart, dtend):
+    """
+    Make the event tuple of one occurrence of a recurring event.
+
+    Args:
+        event: The event tuple of the recurring event (get_event_set, get_event_set_full or get_event_list_keyed).
+        dtstart: The start of the occurrence.
+        dtend: The end of the occurrence.
+
+    Returns:
+        The event tuple with the occurrence's times. A get_event_list_keyed tuple also gets
+        the occurrence start as its RECURRENCE-ID, so each occurrence has its own key.
+    """
+    occurrence = (event[0], dtstart, dtend) + event[3:]
+    if len(occurrence) == 7:
+        occurrence = occurrence[:4] + (dtstart,) + occurrence[5:]
+    return occurrence
+
+class RecurrenceExpander():
+    """
+    Expand recurring events (RRULE, RDATE, EXDATE) into their occurrences in a date window.
+
+    Occurrences are generated lazily from the series start and generation stops at the end
+    of the window, so a daily series costs one step per day up to the window's end rather
+    than its full length. Expansions are memoized by series definition, so a series that
+    appears unchanged in both calendars is only expanded once.
+    """
+    def __init__(self, window_start, window_end, max_occurrences=DEFAULT_MAX_OCCURRENCES):
+        """
+        Args:
+            window_start: The first date to include occurrences from.
+            window_end: The last date to include occurrences from.
+            max_occurrences: The most occurrences to generate for one series.
+        """
+        self.window_start = window_start
+        self.window_end = window_end
+        self.max_occurrences = max_occurrences
+        self.memo = OrderedDict()   # {series definition: ((dtstart, dtend), ...)}, least recently used first
+        self.memo_lock = threading.Lock()   # Both calendars may be loaded concurrently
+
+    @property
+    def key(self):
+        """A string identifying the expansion settings, e.g. for cache entries."""
+        return f"rrule:{self.window_start}:{self.window_end}:{self.max_occurrences}"
+
+    def override_key(self, props):
+        """
+        Get the key that an overridden occurrence is skipped by.
+
+        Args:
+            props: The VEVENT properties of an event with a RECURRENCE-ID.
+
+        Returns:
+            A tuple of (UID, RECURRENCE-ID sort key).
+        """
+        uid = props.get('UID')
+        uid = Contentline(uid).parts()[2] if uid else None
+        return (uid, sort_key(decode_dt(props['RECURRENCE-ID'])))
+
+    def expand(self, props, make_event, overrides=()):
+        """
+        Expand a recurring event.
+
+        Args:
+            props: The VEVENT properties from ical.iter_vevents.
+            make_event: The function building an event tuple from VEVENT properties.
+            overrides: Keys from override_key of the occurrences replaced by other VEVENTs.
+
+        Yields:
+            The event tuple of each occurrence in the window that is not overridden.
+        """
+        event = make_event(props)
+        uid = props.get('UID')
+        uid = Contentline(uid).parts()[2] if uid else None
+        try:
+            occurrences = self.occurrences(props, event[1], event[2])
+        except Exception as e:
+            # An unsupported rule: keep the event as it was before expansion
+            logging.error(f"Failed to expand recurring event '{event[0]}': {e}")
+            yield event
+            return
+        for dtstart, dtend in occurrences:
+            if (uid, sort_key(dtstart)) not in overrides:
+                yield replace_times(event, dtstart, dtend)
+
+    def occurrences(self, props, dtstart, dtend):
+        """
+        Get the occurrences of a series in the window, from the memo cache if possible.
+
+        Args:
+            props: The VEVENT properties from ical.iter_vevents.
+            dtstart: The decoded DTSTART.
+            dtend: The decoded end (see ical.event_end).
+
+        Returns:
+            A tuple of (dtstart, dtend) pairs.
+        """
+        definition = (props.get('RRULE'), tuple(props.get('EXDATE', ())), tuple(props.get('RDATE', ())), dtstart, dtend)
+        with self.memo_lock:
+            occurrences = self.memo.get(definition)
+            if occurrences is not None:
+                self.memo.move_to_end(definition)
+                return occurrences
+        occurrences = tuple(self.generate(props, dtstart, dtend - dtstart))
+        with self.memo_lock:
+            self.memo[definition] = occurrences
+            if len(self.memo) > MEMO_SIZE:
+                self.memo.popitem(last=False)
+        return occurrences
+
+    def generate(self, props, dtstart, duration):
+        """
+        Generate the occurrences of a series in the window, in start order.
+
+        Args:
+            props: The VEVENT properties from ical.iter_vevents.
+            dtstart: The decoded DTSTART.
+            duration: The length of each occurrence.
+
+        Yields:
+            A (dtstart, dtend) pair for each occurrence.
+        """
+        from dateutil.rrule import rruleset, rrulestr  # Only needed when expanding
+
+        # dateutil works on datetimes; all-day series are expanded at midnight and converted back
+        all_day = not isinstance(dtstart, datetime)
+        start = datetime(dtstart.year, dtstart.month, dtstart.day) if all_day else dtstart
+
+        def as_start_type(value):
+            if all_day:
+                return value.date() if isinstance(value, datetime) else value
+            if not isinstance(value, datetime):
+                value = datetime(value.year, value.month, value.day, tzinfo=start.tzinfo)
+            return value
+
+        def as_rule_type(value):
+            value = as_start_type(value)
+            return datetime(value.year, value.month, value.day) if all_day else value
+
+        rules = rruleset()
+        rule = props.get('RRULE')
+        if rule:
+            rule = Contentline(rule).parts()[2]
+            if start.tzinfo is None:
+                rule = UNTIL_UTC.sub(r"\1", rule)   # dateutil rejects a UTC UNTIL for a floating start
+            rules.rrule(rrulestr(rule, dtstart=start))
+        else:
+            rules.rdate(start)  # RDATE only: DTSTART is the first occurrence
+        for value in decode_dates(props.get('RDATE')):
+            rules.rdate(as_rule_type(value))
+        for value in decode_dates(props.get('EXDATE')):
+            rules.exdate(as_rule_type(value))
+
+        window_start = datetime(self.window_start.year, self.window_start.month, self.window_start.day)
+        window_end = datetime(self.window_end.year, self.window_end.month, self.window_end.day) + timedelta(days=1)
+        count = 0
+        for occurrence in rules:
+            key = sort_key(occurrence)
+            if key >= window_end:
+                break
+            if key < window_start:
+                continue
+            occurrence = as_start_type(occurrence)
+            yield occurrence, occurrence + duration
+            count += 1
+            if count >= self.max_occurrences:
+                logging.warning(f"Stopped expanding a recurring event after {count} occurrences.")
+                break
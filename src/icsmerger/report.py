@@ -0,0 +1,75 @@
+import asyncio
+import logging
+
+# Lines written to the widget per update, and the number of lines shown before "Show all" is needed
+DEFAULT_BATCH_LINES = 500
+DEFAULT_LINE_LIMIT = 5000
+
+class ReportWriter():
+    """
+    Accumulate report lines and write them to a MultilineTextInput in bounded batches.
+
+    Every assignment to a widget's value re-sends the whole text to the native widget, so
+    lines are written batch_lines at a time, yielding to the event loop between batches.
+    Only the first line_limit lines are written until show_all is requested.
+    """
+    def __init__(self, widget, batch_lines=DEFAULT_BATCH_LINES, line_limit=DEFAULT_LINE_LIMIT):
+        self.widget = widget
+        self.batch_lines = batch_lines
+        self.line_limit = line_limit
+        self.lines = []
+        self.text = ""      # The text written so far, without the truncation note
+        self.shown = 0      # The number of lines in self.text
+
+    def clear(self):
+        """
+        Remove the report, e.g. before writing the results of another run.
+        """
+        self.lines = []
+        self.text = ""
+        self.shown = 0
+        self.widget.value = ""
+
+    def write(self, lines):
+        """
+        Add lines to the report. Nothing is shown until flush is awaited.
+
+        Args:
+            lines: An iterable of str, e.g. from engine.new_events_report.
+        """
+        self.lines.extend(lines)
+
+    @property
+    def truncated(self):
+        """True if some lines have not been written to the widget."""
+        return self.shown < len(self.lines)
+
+    async def flush(self, show_all=False):
+        """
+        Write the pending lines to the widget.
+
+        Args:
+            show_all: If True, write every line instead of stopping at line_limit.
+        """
+        end = len(self.lines)
+        if not show_all and self.line_limit is not None:
+            end = min(end, self.line_limit)
+        while self.shown < end:
+            batch_end = min(self.shown + self.batch_lines, end)
+            self.text += "".join(self.lines[self.shown:batch_end])
+            self.shown = batch_end
+            self.widget.value = self.text
+            await asyncio.sleep(0)
+        if self.truncated:
+            hidden = len(self.lines) - self.shown
+            logging.debug(f"Report truncated: {hidden} of {len(self.lines)} lines not shown.")
+            self.widget.value = self.text + f"\n... {hidden} more line(s) not shown. Press 'Show All' to display them.\n"
+
+    def value(self):
+        """
+        Get the full report text, including lines not yet shown.
+
+        Returns:
+            str: The report text.
+        """
+        return "".join(self.lines)
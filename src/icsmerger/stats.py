@@ -0,0 +1,170 @@
+import logging
+from collections import Counter
+from datetime import datetime
+from .ical import iter_events, load_event_set, as_date, sort_key, DEFAULT_PARSER
+from .store import epoch_micros, DATE
+from .coverage import MICROSECONDS_PER_DAY
+from .parallel import iter_events_parallel
+
+class CalendarStats():
+    """
+    Statistics about the events of a calendar, collected in one pass as they are extracted.
+
+    Only counters are kept, not the events, so the statistics of a large calendar are
+    small enough to cache (see cache.EventCache.load_stats).
+
+    Attributes:
+        count: The number of events (including duplicates).
+        all_day: The number of all-day (date) events.
+        timed: The number of timed (datetime) events.
+        duplicates: The number of events with the same (summary, dtstart, dtend) as an earlier one.
+        first, last: The events with the earliest and latest start, or None.
+        months: Counter of events by (year, month) of their start.
+        spans: {first day: last day} of the days events cover (days since the epoch, as in
+            coverage.CoverageIndex), for building a coverage index without the events.
+        start_days: Counter of events by the day they start on (days since the epoch).
+        summaries: Counter of events by summary, for counting exclusion matches (see excluded).
+    """
+    def __init__(self):
+        self.count = 0
+        self.all_day = 0
+        self.timed = 0
+        self.duplicates = 0
+        self.first = None
+        self.last = None
+        self.first_key = None
+        self.last_key = None
+        self.months = Counter()
+        self.spans = {}
+        self.start_days = Counter()
+        self.summaries = Counter()
+        self.keys = set()   # The (summary, dtstart, dtend) of the events seen, for counting duplicates
+
+    def add(self, event):
+        """
+        Count an event.
+
+        Args:
+            event: An event tuple, starting with (summary, dtstart, dtend).
+        """
+        summary, dtstart, dtend = event[0], event[1], event[2]
+        self.count += 1
+
+        key = (summary, dtstart, dtend)
+        if key in self.keys:
+            self.duplicates += 1
+        else:
+            self.keys.add(key)
+
+        kind, start = epoch_micros(dtstart)
+        if kind == DATE:
+            self.all_day += 1
+        else:
+            self.timed += 1
+
+        start_key = sort_key(dtstart)
+        if self.first_key is None or start_key < self.first_key:
+            self.first, self.first_key = event, start_key
+        if self.last_key is None or start_key > self.last_key:
+            self.last, self.last_key = event, start_key
+        self.months[(start_key.year, start_key.month)] += 1
+
+        first_day = start // MICROSECONDS_PER_DAY
+        last_day = max(first_day, (epoch_micros(dtend)[1] - 1) // MICROSECONDS_PER_DAY) if dtend is not None else first_day
+        if last_day > self.spans.get(first_day, first_day - 1):
+            self.spans[first_day] = last_day
+        self.start_days[first_day] += 1
+        self.summaries[summary] += 1
+
+    def collect(self, events):
+        """
+        Count events as they pass through.
+
+        Args:
+            events: An iterable of event tuples.
+
+        Yields:
+            The same events.
+        """
+        for event in events:
+            self.add(event)
+            yield event
+
+    def __len__(self):
+        return self.count
+
+    def finish(self):
+        """
+        Release the memory only needed while collecting.
+
+        Returns:
+            CalendarStats: This object.
+        """
+        self.keys = set()
+        logging.debug(f"Stats: {self.count} events, {self.duplicates} duplicates, {len(self.months)} months")
+        return self
+
+    @property
+    def earliest(self):
+        """The date of the earliest event, or None."""
+        return as_date(self.first[1]) if self.first else None
+
+    @property
+    def latest(self):
+        """The date of the latest event, or None."""
+        return as_date(self.last[1]) if self.last else None
+
+    def excluded(self, matcher):
+        """
+        Count the events matching each exclusion.
+
+        Args:
+            matcher: An exclusions.ExclusionMatcher.
+
+        Returns:
+            Counter: {exclusion: number of events}. Each distinct summary is matched once.
+        """
+        counts = Counter()
+        for summary, count in self.summaries.items():
+            match = matcher.match(summary)
+            if match is not None:
+                counts[match] += count
+        return counts
+
+    def month_lines(self):
+        """
+        Describe the per-month histogram.
+
+        Yields:
+            One line per month with events, in order.
+        """
+        for (year, month), count in sorted(self.months.items()):
+            yield f"      {datetime(year, month, 1):%Y-%m}: {count}\n"
+
+def load_calendar_stats(file_path, parser=DEFAULT_PARSER, cancel=None, expander=None, window=None):
+    """
+    Collect the statistics of an iCalendar file.
+
+    With the "stream" and "parallel" parsers, each event is counted as it is extracted and then dropped,
+    so the calendar is never held in memory.
+
+    Args:
+        file_path: The path to the iCalendar file.
+        parser: The parser to use, one of options.PARSERS.
+        cancel: An optional threading.Event that aborts the load when set.
+        expander: An optional recurrence.RecurrenceExpander (see ical.extract_events).
+        window: An optional window.DateWindow that events must overlap (see ical.extract_events).
+
+    Returns:
+        CalendarStats: The statistics.
+    """
+    stats = CalendarStats()
+    if parser == "stream":
+        events = iter_events(file_path, cancel=cancel, expander=expander, window=window)
+    elif parser == "parallel":
+        events = iter_events_parallel(file_path, cancel=cancel, expander=expander, window=window)
+    else:
+        events = load_event_set(file_path, parser=parser, cancel=cancel, expander=expander, window=window)
+    for event in events:
+        stats.add(event)
+    return stats.finish()
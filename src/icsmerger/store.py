@@ -0,0 +1,478 @@
+import heapq
+import logging
+from array import array
+from bisect import bisect_left
+from datetime import datetime, timedelta, timezone
+from .ical import load_event_set, iter_events, check_cancel, CANCEL_CHECK_INTERVAL, DEFAULT_PARSER
+from .parallel import iter_events_parallel
+
+# Kinds of date values. Values of different kinds never compare equal, as with date/datetime objects.
+DATE, NAIVE, AWARE = 0, 1, 2
+
+EPOCH = datetime(1970, 1, 1)
+EPOCH_UTC = datetime(1970, 1, 1, tzinfo=timezone.utc)
+MICROSECOND = timedelta(microseconds=1)
+
+def epoch_micros(value):
+    """
+    Encode a date or datetime as microseconds since the epoch.
+
+    Args:
+        value: A date or datetime.
+
+    Returns:
+        A tuple of (kind, microseconds): UTC for AWARE datetimes, wall clock for NAIVE datetimes and DATEs.
+    """
+    if isinstance(value, datetime):
+        if value.tzinfo is not None and value.utcoffset() is not None:
+            return AWARE, (value - EPOCH_UTC) // MICROSECOND
+        return NAIVE, (value - EPOCH) // MICROSECOND
+    return DATE, (datetime(value.year, value.month, value.day) - EPOCH) // MICROSECOND
+
+class EventStore():
+    """
+    A compact, columnar set of (summary, dtstart, dtend) events.
+
+    Summaries are interned once per store, dtstart/dtend are int64 microseconds since the
+    epoch (UTC for aware datetimes, wall clock for naive datetimes and dates) with a kind
+    and time zone column, and each row has a precomputed hash key. Event tuples are only
+    materialized on demand, e.g. for the (usually small) difference between two stores.
+
+    Rows compare like the tuples they came from: aware datetimes are equal if they are the
+    same instant, and dates, naive and aware datetimes are never equal to each other. Row
+    order is insertion order, and duplicate events are dropped, as in a set.
+    """
+    __slots__ = ("summaries", "summary_ids", "summary_id_map", "starts", "ends", "kinds", "start_zones", "end_zones", "zones", "zone_ids", "keys", "sorted_keys", "sorted_rows")
+
+    def __init__(self):
+        self.summaries = []             # Interned summaries, indexed by summary_ids
+        self.summary_id_map = {}        # {summary: index in summaries}
+        self.summary_ids = array('l')
+        self.starts = array('q')
+        self.ends = array('q')
+        self.kinds = array('B')         # start kind + 3 * end kind
+        self.start_zones = array('H')   # Index in zones, for AWARE values
+        self.end_zones = array('H')
+        self.zones = [None]             # tzinfo objects, so aware values come back in their original zone
+        self.zone_ids = {}
+        self.keys = array('q')          # hash((summary, start, end, kinds)) per row
+        self.sorted_keys = None         # keys in order, and the matching rows (built on demand)
+        self.sorted_rows = None
+
+    @classmethod
+    def from_events(cls, events):
+        """
+        Build a store from event tuples.
+
+        Args:
+            events: An iterable of (summary, dtstart, dtend) tuples. Duplicates are dropped.
+
+        Returns:
+            EventStore: The store.
+        """
+        store = cls()
+        for event in events:
+            store.append(event[0], event[1], event[2])
+        store.dedupe()
+        return store
+
+    def __len__(self):
+        return len(self.keys)
+
+    def __iter__(self):
+        for row in range(len(self)):
+            yield self.event(row)
+
+    def __getstate__(self):
+        # Keys use str hashes, which differ between processes, so they are rebuilt on load
+        return {
+            "summaries": self.summaries,
+            "summary_ids": self.summary_ids,
+            "starts": self.starts,
+            "ends": self.ends,
+            "kinds": self.kinds,
+            "start_zones": self.start_zones,
+            "end_zones": self.end_zones,
+            "zones": self.zones
+        }
+
+    def __setstate__(self, state):
+        self.__init__()
+        for name, value in state.items():
+            setattr(self, name, value)
+        self.summary_id_map = {summary: index for index, summary in enumerate(self.summaries)}
+        self.zone_ids = {zone: index for index, zone in enumerate(self.zones) if zone is not None}
+        self.keys = array('q', (self.row_hash(row) for row in range(len(self.summary_ids))))
+
+    def encode(self, value):
+        """
+        Encode a date or datetime.
+
+        Args:
+            value: A date or datetime.
+
+        Returns:
+            A tuple of (kind, microseconds since the epoch, zone index).
+        """
+        kind, micros = epoch_micros(value)
+        if kind != AWARE:
+            return kind, micros, 0
+        return kind, micros, self.zone_index(value.tzinfo)
+
+    def zone_index(self, zone):
+        """
+        Get the index of a time zone in zones, adding it if needed.
+
+        Args:
+            zone: A tzinfo.
+
+        Returns:
+            int: The zone index.
+        """
+        index = self.zone_ids.get(zone)
+        if index is None:
+            index = self.zone_ids[zone] = len(self.zones)
+            self.zones.append(zone)
+        return index
+
+    def summary_index(self, summary):
+        """
+        Get the index of a summary in summaries, interning it if needed.
+
+        Args:
+            summary: The event summary.
+
+        Returns:
+            int: The summary index.
+        """
+        summary_id = self.summary_id_map.get(summary)
+        if summary_id is None:
+            summary_id = self.summary_id_map[summary] = len(self.summaries)
+            self.summaries.append(summary)
+        return summary_id
+
+    def decode(self, kind, micros, zone):
+        """
+        Decode a value encoded by encode.
+
+        Args:
+            kind: DATE, NAIVE or AWARE.
+            micros: Microseconds since the epoch.
+            zone: The zone index.
+
+        Returns:
+            The date or datetime.
+        """
+        if kind == AWARE:
+            return (EPOCH_UTC + micros * MICROSECOND).astimezone(self.zones[zone])
+        value = EPOCH + micros * MICROSECOND
+        return value.date() if kind == DATE else value
+
+    def append(self, summary, dtstart, dtend):
+        """
+        Add an event row, without checking for duplicates (see dedupe).
+
+        Args:
+            summary: The event summary.
+            dtstart: The start date or datetime.
+            dtend: The end date or datetime.
+        """
+        summary_id = self.summary_index(summary)
+        start_kind, start, start_zone = self.encode(dtstart)
+        end_kind, end, end_zone = self.encode(dtend)
+        kinds = start_kind + 3 * end_kind
+        self.summary_ids.append(summary_id)
+        self.starts.append(start)
+        self.ends.append(end)
+        self.kinds.append(kinds)
+        self.start_zones.append(start_zone)
+        self.end_zones.append(end_zone)
+        self.keys.append(hash((summary, start, end, kinds)))
+        self.sorted_keys = self.sorted_rows = None
+
+    def append_row(self, other, row):
+        """
+        Add a row of another store, copying its encoded values (see append).
+
+        Args:
+            other: The other EventStore.
+            row: The row index in the other store.
+        """
+        self.summary_ids.append(self.summary_index(other.summary(row)))
+        self.starts.append(other.starts[row])
+        self.ends.append(other.ends[row])
+        self.kinds.append(other.kinds[row])
+        start_zone, end_zone = other.start_zones[row], other.end_zones[row]
+        self.start_zones.append(self.zone_index(other.zones[start_zone]) if start_zone else 0)
+        self.end_zones.append(self.zone_index(other.zones[end_zone]) if end_zone else 0)
+        self.keys.append(other.keys[row])
+        self.sorted_keys = self.sorted_rows = None
+
+    def row_hash(self, row):
+        """
+        Calculate the hash key of a row.
+
+        Args:
+            row: The row index.
+
+        Returns:
+            int: The hash key.
+        """
+        return hash((self.summaries[self.summary_ids[row]], self.starts[row], self.ends[row], self.kinds[row]))
+
+    def event(self, row):
+        """
+        Materialize a row as an event tuple.
+
+        Args:
+            row: The row index.
+
+        Returns:
+            A tuple of (summary, dtstart, dtend).
+        """
+        kinds = self.kinds[row]
+        return (
+            self.summaries[self.summary_ids[row]],
+            self.decode(kinds % 3, self.starts[row], self.start_zones[row]),
+            self.decode(kinds // 3, self.ends[row], self.end_zones[row])
+        )
+
+    def summary(self, row):
+        """
+        Get the summary of a row.
+
+        Args:
+            row: The row index.
+
+        Returns:
+            str: The summary.
+        """
+        return self.summaries[self.summary_ids[row]]
+
+    def sort_key(self, row):
+        """
+        Get the key that orders rows by start, then end. Rows of any two stores have
+        equal keys exactly when they are the same event (see same_event).
+
+        Args:
+            row: The row index.
+
+        Returns:
+            A tuple of (dtstart, dtend, kinds, summary), with the times as microseconds since the epoch.
+        """
+        return (self.starts[row], self.ends[row], self.kinds[row], self.summary(row))
+
+    def iter_sorted(self, tag=0):
+        """
+        Iterate over the rows in sort_key order, e.g. as one input of a k-way merge (see merge_stores).
+
+        Args:
+            tag: A value yielded with each row, e.g. to tell the stores of a merge apart.
+
+        Yields:
+            A tuple of (sort key, tag, row) per row, in order.
+        """
+        for row in sorted(range(len(self)), key=self.sort_key):
+            yield self.sort_key(row), tag, row
+
+    def same_event(self, row, other, other_row):
+        """
+        Check whether a row of this store and a row of another store are the same event.
+
+        Args:
+            row: The row index in this store.
+            other: The other EventStore (may be this store).
+            other_row: The row index in the other store.
+
+        Returns:
+            bool: True if the events are equal.
+        """
+        return (self.starts[row] == other.starts[other_row]
+            and self.ends[row] == other.ends[other_row]
+            and self.kinds[row] == other.kinds[other_row]
+            and self.summary(row) == other.summary(other_row))
+
+    def build_index(self):
+        """
+        Sort the hash keys, so rows can be looked up by key with a binary search.
+        """
+        if self.sorted_keys is None:
+            order = sorted(range(len(self)), key=self.keys.__getitem__)
+            self.sorted_keys = array('q', (self.keys[row] for row in order))
+            self.sorted_rows = array('q', order)
+
+    def find(self, other, other_row):
+        """
+        Find a row of another store in this store.
+
+        Args:
+            other: The other EventStore.
+            other_row: The row index in the other store.
+
+        Returns:
+            int: The matching row index in this store, or None.
+        """
+        self.build_index()
+        key = other.keys[other_row]
+        position = bisect_left(self.sorted_keys, key)
+        while position < len(self.sorted_keys) and self.sorted_keys[position] == key:
+            row = self.sorted_rows[position]
+            if self.same_event(row, other, other_row):
+                return row
+            position += 1
+        return None
+
+    def dedupe(self):
+        """
+        Drop duplicate rows, keeping the first occurrence of each event.
+        """
+        self.build_index()
+        duplicates = set()
+        run_start = 0
+        for position in range(1, len(self.sorted_keys)):
+            if self.sorted_keys[position] != self.sorted_keys[run_start]:
+                run_start = position
+                continue
+            row = self.sorted_rows[position]
+            for previous in range(run_start, position):
+                previous_row = self.sorted_rows[previous]
+                if previous_row not in duplicates and self.same_event(previous_row, self, row):
+                    duplicates.add(max(row, previous_row))
+                    break
+        if duplicates:
+            logging.debug(f"Dropping {len(duplicates)} duplicate event(s)")
+            self.keep(row for row in range(len(self)) if row not in duplicates)
+
+    def keep(self, rows):
+        """
+        Keep only the given rows, in place.
+
+        Args:
+            rows: An iterable of row indexes, in increasing order.
+        """
+        selected = self.select(rows)
+        for name in ("summary_ids", "starts", "ends", "kinds", "start_zones", "end_zones", "keys", "sorted_keys", "sorted_rows"):
+            setattr(self, name, getattr(selected, name))
+
+    def select(self, rows):
+        """
+        Build a store from some of the rows of this one. The summaries and zones are shared.
+
+        Args:
+            rows: An iterable of row indexes.
+
+        Returns:
+            EventStore: The new store.
+        """
+        rows = array('q', rows)
+        selected = EventStore()
+        selected.summaries = self.summaries
+        selected.summary_id_map = self.summary_id_map
+        selected.zones = self.zones
+        selected.zone_ids = self.zone_ids
+        for name in ("summary_ids", "starts", "ends", "kinds", "start_zones", "end_zones", "keys"):
+            column = getattr(self, name)
+            setattr(selected, name, array(column.typecode, (column[row] for row in rows)))
+        return selected
+
+    def partition(self, match):
+        """
+        Split the store by a summary matcher, calling it once per distinct summary.
+
+        Args:
+            match: A callable taking a summary and returning a reason (e.g. the matching exclusion) or None.
+
+        Returns:
+            A tuple of (EventStore of the unmatched rows, list of (row, reason) for the matched rows).
+        """
+        reasons = [match(summary) for summary in self.summaries]
+        kept = []
+        matched = []
+        for row, summary_id in enumerate(self.summary_ids):
+            reason = reasons[summary_id]
+            if reason is None:
+                kept.append(row)
+            else:
+                matched.append((row, reason))
+        return self.select(kept), matched
+
+    def difference_rows(self, other):
+        """
+        Get the rows of this store whose events are not in another.
+
+        Args:
+            other: The other EventStore.
+
+        Yields:
+            The row indexes in this store that have no match in other.
+        """
+        for row in range(len(self)):
+            if other.find(self, row) is None:
+                yield row
+
+    def difference(self, other):
+        """
+        Get the events in this store that are not in another.
+
+        Args:
+            other: The other EventStore.
+
+        Yields:
+            The event tuples of the rows of this store that have no match in other.
+        """
+        for row in self.difference_rows(other):
+            yield self.event(row)
+
+def load_event_store(file_path, parser=DEFAULT_PARSER, cancel=None, expander=None, window=None):
+    """
+    Load the events of an iCalendar file into an EventStore.
+
+    With the "stream" and "parallel" parsers, events go straight from the file into the store, so the
+    event tuples are never all held in memory at once.
+
+    Args:
+        file_path: The path to the iCalendar file.
+        parser: The parser to use, one of options.PARSERS.
+        cancel: An optional threading.Event that aborts the load when set.
+        expander: An optional recurrence.RecurrenceExpander (see ical.extract_events).
+        window: An optional window.DateWindow that events must overlap (see ical.extract_events).
+
+    Returns:
+        EventStore: The store.
+    """
+    if parser == "stream":
+        return EventStore.from_events(iter_events(file_path, cancel=cancel, expander=expander, window=window))
+    if parser == "parallel":
+        return EventStore.from_events(iter_events_parallel(file_path, cancel=cancel, expander=expander, window=window))
+    return EventStore.from_events(load_event_set(file_path, parser=parser, cancel=cancel, expander=expander, window=window))
+
+def merge_stores(stores, cancel=None):
+    """
+    Merge several stores into one, dropping the events that are in more than one of them.
+
+    The rows of each store are sorted by start (see EventStore.sort_key) and the sorted
+    streams are merged with a k-way heap merge, so duplicates across stores arrive next
+    to each other and are dropped as they are met. Only one row per store is held by the
+    merge at a time, and the merged store holds each distinct event once.
+
+    Args:
+        stores: The EventStores, e.g. one per ICS2 feed.
+        cancel: An optional threading.Event, checked every CANCEL_CHECK_INTERVAL rows.
+
+    Returns:
+        EventStore: The distinct events of all the stores, ordered by start.
+
+    Raises:
+        Cancelled: If cancel was set.
+    """
+    merged = EventStore()
+    previous = None
+    count = 0
+    for count, (key, index, row) in enumerate(heapq.merge(*(store.iter_sorted(index) for index, store in enumerate(stores))), 1):
+        if count % CANCEL_CHECK_INTERVAL == 0:
+            check_cancel(cancel)
+        if key != previous:
+            merged.append_row(stores[index], row)
+            previous = key
+    logging.debug(f"Merged {len(stores)} stores: {count} events, {count - len(merged)} duplicate(s) across stores")
+    return merged
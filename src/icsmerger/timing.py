@@ -0,0 +1,170 @@
+import os
+import time
+import logging
+from datetime import datetime
+
+class StageTimer():
+    """
+    Time the consecutive stages of a piece of work, e.g. the phases of the GUI startup or of a merge.
+
+    Each stage runs from the previous mark (or the creation of the timer) to its own mark.
+    Work done within a stage, possibly concurrently (e.g. loading each input file), can be
+    timed as parts of it with measure; parts are reported with their stage but not added to the total.
+    """
+    def __init__(self, name, clock=time.perf_counter):
+        """
+        Args:
+            name: The name of the work, used in the report.
+            clock: The function giving the current time in seconds.
+        """
+        self.name = name
+        self.clock = clock
+        self.stages = []    # [(stage, seconds, count)], in order
+        self.parts = {}     # {stage: [(part, seconds, count)]}
+        self.pending = []   # Parts of the stage in progress
+        self.last = clock()
+
+    def add(self, stage, seconds, count=None):
+        """
+        Record a stage that was timed elsewhere.
+
+        Args:
+            stage: The stage name.
+            seconds: How long it took.
+            count: The number of events the stage produced, or None.
+        """
+        self.stages.append((stage, seconds, count))
+        if self.pending:
+            self.parts[stage], self.pending = self.pending, []
+
+    def mark(self, stage, count=None):
+        """
+        End a stage.
+
+        Args:
+            stage: The name of the stage that just finished.
+            count: The number of events the stage produced, or None.
+        """
+        now = self.clock()
+        self.add(stage, now - self.last, count)
+        self.last = now
+
+    def measure(self, part, func, *args, count=len):
+        """
+        Run part of the stage in progress, timing it. Safe to call from several threads at once.
+
+        Args:
+            part: The part name, e.g. "ICS1".
+            func: The function to run.
+            *args: Its arguments.
+            count: A function giving the number of events from func's result, or None not to count them.
+
+        Returns:
+            The return value of func.
+        """
+        started = self.clock()
+        value = func(*args)
+        events = count(value) if count is not None and value is not None else None
+        self.pending.append((part, self.clock() - started, events))
+        return value
+
+    @property
+    def total(self):
+        """The total time of the stages, in seconds."""
+        return sum(stage[1] for stage in self.stages)
+
+    def report(self):
+        """
+        Describe the stage times.
+
+        Returns:
+            str: One line, e.g. "Startup: imports 80.1 ms, config 2.0 ms (total 82.1 ms)".
+        """
+        stages = []
+        for stage, seconds, count in self.stages:
+            text = format_time(stage, seconds, count)
+            if stage in self.parts:
+                text += " [" + "; ".join(format_time(*part) for part in self.parts[stage]) + "]"
+            stages.append(text)
+        return f"{self.name}: {', '.join(stages)} (total {self.total * 1000:.1f} ms)"
+
+    def lines(self):
+        """
+        Describe the stage times, one stage per line, for the timings section of a window.
+
+        Yields:
+            The report text, one line at a time.
+        """
+        for stage, seconds, count in self.stages:
+            yield format_time(stage, seconds, count) + "\n"
+            for part in self.parts.get(stage, []):
+                yield f"    {format_time(*part)}\n"
+        yield f"Total: {self.total * 1000:.1f} ms\n"
+
+    def log(self, level=logging.INFO):
+        """
+        Log the report.
+
+        Args:
+            level: The logging level.
+        """
+        logging.log(level, self.report())
+
+def format_time(stage, seconds, count=None):
+    """
+    Describe the time of one stage.
+
+    Args:
+        stage: The stage name.
+        seconds: How long it took.
+        count: The number of events it produced, or None.
+
+    Returns:
+        str: e.g. "Loading files 120.5 ms" or "ICS1 80.2 ms (3000 events)".
+    """
+    text = f"{stage} {seconds * 1000:.1f} ms"
+    if count is not None:
+        text += f" ({count} events)"
+    return text
+
+def profile_path(directory, name):
+    """
+    Get a new path to write a profile to.
+
+    Args:
+        directory: The directory to write profiles to.
+        name: The name of the work profiled, e.g. "merge".
+
+    Returns:
+        str: e.g. "<directory>/merge-20240102-090000.pstats".
+    """
+    return os.path.join(directory, f"{name}-{datetime.now():%Y%m%d-%H%M%S}.pstats")
+
+def profile_call(file_path, func, *args, **kwargs):
+    """
+    Call a function, profiling it with cProfile if a path is given.
+
+    The profile is written even if func raises, and can be read with pstats
+    (e.g. python -m pstats <file>). Calls made in other threads, such as the concurrent
+    loads of engine.merge_files, are only included from Python 3.12.
+
+    Args:
+        file_path: The path to write the profile to, or None not to profile.
+        func: The function to call.
+        *args, **kwargs: Its arguments.
+
+    Returns:
+        The return value of func.
+    """
+    if file_path is None:
+        return func(*args, **kwargs)
+    import cProfile
+    profiler = cProfile.Profile()
+    try:
+        return profiler.runcall(func, *args, **kwargs)
+    finally:
+        try:
+            profiler.dump_stats(file_path)
+            logging.info(f"Profile written to {file_path}")
+        except OSError as e:
+            logging.error(f"Failed to write profile {file_path}: {e}")
@@ -1,22 +1,267 @@
+import os
 import platform
 import logging
 import requests
 import toga
 import asyncio
 import json
+import time
+import hashlib
+import tempfile
 from toga.style import Pack
 from toga.style.pack import COLUMN, ROW, CENTER
-from pathlib import Path
 from threading import Thread, Event
 from .__init__ import __version__
-from .fileio import open_output_file, sha_check, save_file
+from .fileio import open_output_file, save_file
+from .options import DEFAULT_CHECK_INTERVAL_HOURS
 
 # "main" (main) or "dev" (icsmerger-dev)
 BRANCH = "main"
 
+# Update downloads are streamed to disk in chunks of this size
+DOWNLOAD_CHUNK_BYTES = 1024 * 1024
+# (connect, read) timeouts in seconds for update requests
+DOWNLOAD_TIMEOUT = (10, 60)
+CHECK_TIMEOUT = (5, 10)
+
+# The last versions.json response is kept in the config directory, and automatic checks
+# within options.DEFAULT_CHECK_INTERVAL_HOURS (or the configured interval) do not use the network
+VERSIONS_CACHE_FILE = "versions_cache.json"
+
+# Download progress is posted to the UI at most this often, and only after this many more bytes
+PROGRESS_INTERVAL = 0.1
+PROGRESS_BYTES = 256 * 1024
+
+session = None
+
+def get_session():
+    """
+    Get the requests session shared by update checks and downloads, so connections are pooled.
+
+    Returns:
+        requests.Session: The session.
+    """
+    global session
+    if session is None:
+        session = requests.Session()
+        adapter = requests.adapters.HTTPAdapter(pool_connections=2, pool_maxsize=4, max_retries=1)
+        session.mount("https://", adapter)
+        session.mount("http://", adapter)
+    return session
+
+def load_versions_cache(cache_path):
+    """
+    Load the cached versions.json response.
+
+    Args:
+        cache_path (str): The path to the cache file.
+
+    Returns:
+        dict: {"versions", "etag", "last_modified", "checked"}, or None if there is no usable cache.
+    """
+    try:
+        with open(cache_path, 'r') as f:
+            cache = json.load(f)
+        if "versions" in cache and "checked" in cache:
+            return cache
+    except FileNotFoundError:
+        pass
+    except Exception as e:
+        logging.error(f"Ignoring unreadable update cache {cache_path}: {e}")
+    return None
+
+def save_versions_cache(cache_path, cache):
+    """
+    Save the versions.json response and the time it was checked.
+
+    Args:
+        cache_path (str): The path to the cache file.
+        cache (dict): See load_versions_cache.
+    """
+    try:
+        fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(cache_path) or ".", suffix=".tmp")
+        with os.fdopen(fd, 'w') as f:
+            json.dump(cache, f)
+        os.replace(temp_path, cache_path)
+    except OSError as e:
+        logging.error(f"Failed to save update cache {cache_path}: {e}")
+
+def fetch_versions(url, cache_path, max_age, session=None, now=None):
+    """
+    Get the contents of versions.json, from the cache if it was checked recently.
+
+    Outside max_age, the request is conditional on the cached ETag (or Last-Modified), so an
+    unchanged file costs a 304 response without a body.
+
+    Args:
+        url (str): The URL of versions.json.
+        cache_path (str): The path to the cache file.
+        max_age (float): Use the cache without a request if it was checked less than this many seconds ago.
+            0 always sends a (conditional) request.
+        session: An optional requests.Session to request with.
+        now (float): The current time. Defaults to time.time().
+
+    Returns:
+        The decoded versions.json.
+
+    Raises:
+        requests.exceptions.RequestException: If the request failed or returned an error status.
+        ValueError: If the response was not valid JSON.
+    """
+    now = time.time() if now is None else now
+    cache = load_versions_cache(cache_path)
+    if cache is not None and 0 <= now - cache["checked"] < max_age:
+        logging.info(f"Using update check from {time.ctime(cache['checked'])}")
+        return cache["versions"]
+
+    headers = {}
+    if cache is not None and cache.get("etag"):
+        headers["If-None-Match"] = cache["etag"]
+    if cache is not None and cache.get("last_modified"):
+        headers["If-Modified-Since"] = cache["last_modified"]
+    logging.info(f"Checking update file at: {url}")
+    response = (session or requests).get(url, headers=headers, timeout=CHECK_TIMEOUT)
+    if response.status_code == 304 and cache is not None:
+        logging.debug("Update file not modified since the last check.")
+        cache["checked"] = now
+    else:
+        response.raise_for_status()
+        cache = {
+            "versions": json.loads(response.text),
+            "etag": response.headers.get("ETag"),
+            "last_modified": response.headers.get("Last-Modified"),
+            "checked": now
+        }
+    save_versions_cache(cache_path, cache)
+    return cache["versions"]
+
+def partial_path(file_path, sha256):
+    """
+    Get the path an interrupted download of a file is kept at, so it can be resumed.
+
+    Args:
+        file_path (str): The path the download is saved to (named after its version).
+        sha256 (str): The expected sha256 hex digest, so a re-released file is not resumed.
+
+    Returns:
+        str: The path of the partial download.
+    """
+    return f"{file_path}.{sha256[:16]}.part"
+
+def download_file(url, file_path, sha256, progress=None, session=None, chunk_size=DOWNLOAD_CHUNK_BYTES):
+    """
+    Stream a download to a file, hashing it as it arrives, resuming an interrupted download.
+
+    The download is written to partial_path(file_path, sha256), which is renamed to
+    file_path only if the whole download has the expected sha256, so memory use does not
+    grow with the file size and file_path never holds a partial or corrupt download.
+    If the download fails, the partial file is kept, and the next call only requests the
+    rest of the file (with an HTTP Range request); a server that ignores the range and answers
+    200 restarts the download from the beginning. Rather than saving the sha256 state next to
+    the partial file (hashlib cannot export a digest's state), resuming deliberately re-hashes
+    the bytes already on disk: that is much faster than downloading them again, and there is
+    no saved state that could disagree with the file.
+
+    Args:
+        url (str): The URL to download.
+        file_path (str): The path to save the download to.
+        sha256 (str): The expected sha256 hex digest.
+        progress: An optional callback, called as progress(downloaded bytes, total bytes) after each
+            chunk. The total is 0 if the server did not send a Content-Length.
+        session: An optional requests.Session to download with.
+        chunk_size (int): The number of bytes to read at a time.
+
+    Raises:
+        requests.exceptions.RequestException: If the download failed.
+        ValueError: If the download did not have the expected sha256. The partial file is removed.
+        OSError: If the file could not be written.
+    """
+    part_path = partial_path(file_path, sha256)
+    digest = hashlib.sha256()
+    downloaded = 0
+    if os.path.exists(part_path):
+        with open(part_path, 'rb') as f:
+            while chunk := f.read(chunk_size):
+                digest.update(chunk)
+                downloaded += len(chunk)
+        logging.info(f"Resuming download of {url} after {downloaded} bytes")
+
+    headers = {"Range": f"bytes={downloaded}-"} if downloaded else {}
+    with (session or requests).get(url, headers=headers, stream=True, timeout=DOWNLOAD_TIMEOUT) as response:
+        if downloaded and response.status_code == 416:
+            # Nothing left to request: the partial file may already be complete
+            logging.debug(f"Range not satisfiable, checking the {downloaded} bytes already downloaded")
+        else:
+            response.raise_for_status()
+            if downloaded and response.status_code != 206:
+                logging.info("The server does not support resuming downloads, restarting.")
+                digest = hashlib.sha256()
+                downloaded = 0
+            total = int(response.headers.get('content-length', 0))
+            if total:
+                total += downloaded
+            with open(part_path, 'ab' if downloaded else 'wb') as f:
+                for chunk in response.iter_content(chunk_size):
+                    f.write(chunk)
+                    digest.update(chunk)
+                    downloaded += len(chunk)
+                    if progress is not None:
+                        progress(downloaded, total)
+
+    if digest.hexdigest() != sha256:
+        os.remove(part_path)
+        raise ValueError(f"sha256 mismatch: downloaded {digest.hexdigest()}, expected {sha256}")
+    logging.debug(f"Downloaded {downloaded} bytes with sha256 {sha256} to {file_path}")
+    os.replace(part_path, file_path)
+
+class ThrottledProgress():
+    """
+    Forward download progress from a worker thread to a callback on the event loop.
+
+    Updates are dropped unless PROGRESS_INTERVAL has passed and PROGRESS_BYTES more have
+    arrived since the last one posted, so a fast download does not flood the UI. The
+    final update of a download of known size is always posted.
+    """
+    def __init__(self, callback, loop, min_interval=PROGRESS_INTERVAL, min_bytes=PROGRESS_BYTES, clock=time.monotonic):
+        """
+        Args:
+            callback: Called on the loop as callback(downloaded bytes, total bytes).
+            loop: The asyncio event loop to call the callback on.
+            min_interval (float): The least time in seconds between updates.
+            min_bytes (int): The least number of bytes between updates.
+            clock: The function giving the current time in seconds.
+        """
+        self.callback = callback
+        self.loop = loop
+        self.min_interval = min_interval
+        self.min_bytes = min_bytes
+        self.clock = clock
+        self.posted_at = None
+        self.posted_bytes = 0
+
+    def __call__(self, downloaded, total):
+        """
+        Report progress. Safe to call from any thread.
+
+        Args:
+            downloaded (int): The bytes downloaded so far.
+            total (int): The size of the download, or 0 if unknown.
+        """
+        now = self.clock()
+        finished = total and downloaded >= total
+        if not finished and self.posted_at is not None and (
+                now - self.posted_at < self.min_interval or downloaded - self.posted_bytes < self.min_bytes):
+            return
+        self.posted_at = now
+        self.posted_bytes = downloaded
+        self.loop.call_soon_threadsafe(self.callback, downloaded, total)
+
 async def update_checker(self, type):
     update = Updater(self, __version__, type)
-    
+    if update.platform is not None:
+        # The network request runs in a worker thread, so the UI is never blocked
+        await asyncio.to_thread(update.check_for_updates)
+
     logging.debug(f"\n\tUpdate check result:\n\t"
                     f"check_success: {update.check_success}\n\t"
                     f"update_available: {update.update_available}\n\t"
@@ -80,13 +325,14 @@ class Updater():
         self.server_version = None
         self.local_version = local_version
         self.message = None
-        self.file = None
+        self.file = None    # The path of the downloaded update file
         self.sha256 = None
         self.exit = True
         self.save_finished = Event()
-        self.file_size = 0
-        self.downloaded_size = 0
         self.automatic = None
+        self.cache_path = os.path.join(toga.App.app.paths.config, VERSIONS_CACHE_FILE)
+        self.check_interval_hours = getattr(toga.App.app, "update_check_hours", DEFAULT_CHECK_INTERVAL_HOURS)
+        self.updater_ui = UpdaterUI(main_window)
 
         if type:
             self.automatic = True
@@ -110,53 +356,25 @@ class Updater():
             self.message = Updater.messages["platform"]
             self.check_success = False
             return
-
-        self.updater_ui = UpdaterUI(main_window)
-
-        self.check_for_updates()
         return
 
     async def update_helper(self, update, result):
         logging.debug(f"update_helper: {result}, {self}")
         if result:
             logging.debug("User elected to update.")
-            update_thread = Thread(target=self.download_update)
-            update_thread.start()
-            progress_started = False
-            while update_thread.is_alive():
-                if self.file_size == 0:
-                    # File size not yet known
-                    pass
-                elif self.file_size != 0 and progress_started == False:
-                    # Create progress bar
-                    progress_started = True
-                    update.updater_ui.start_progress(self.file_size)
-                    # logging.debug(f"Start progress bar with: {self.file_size}")
-                else:
-                    # Update progress bar
-                    update.updater_ui.update_progress(self.downloaded_size)
-                    # logging.debug(f"{self.downloaded_size} of {self.file_size} downloaded.")
-                await asyncio.sleep(0.01)
+            # Download in a worker thread; it posts throttled progress to the UI, and the
+            # future completes when the download has finished
+            loop = asyncio.get_running_loop()
+            progress = ThrottledProgress(update.updater_ui.show_progress, loop)
+            await loop.run_in_executor(None, self.download_update, progress)
             update.updater_ui.stop_progress()
             if self.update_success:
                 # self.progress_label.text = 'Downloading Complete'
                 logging.debug("Download successful.")
                 if (await update.updater_ui.install_update()):
-                    # User elected to install the update, save the file and open it
-                    save_base_path = Path(toga.App.app.paths.config)
-                    logging.debug(f"Save path: {save_base_path}")
-                    logging.debug(f"Save file name: {self.update_file_name}")
-                    save_path = f"{save_base_path}/{self.update_file_name}"
-                    logging.debug(f"Save file path: {save_path}")
-                    if save_path:
-                        save_thread = Thread(target=save_file, args=(self.file, save_path, self.save_finished))
-                        save_thread.start()
-                        self.save_finished.wait()
-                        self.save_finished.clear()
-                        logging.debug(f"Update file saved to {save_path}. Opening file and exiting.")
-                        open_output_file(self, save_path)
-                    else:
-                        logging.error(f"Save path {save_path} not found. Exiting.")
+                    # User elected to install the update, open the downloaded file
+                    logging.debug(f"Update file downloaded to {self.file}. Opening file and exiting.")
+                    open_output_file(self, self.file)
                     toga.App.app.exit()
                 else:
                     # User elected not to install the update
@@ -184,123 +402,106 @@ class Updater():
             return
 
     def check_for_updates(self):
-        # Download the version file
+        # Download the version file, unless it was checked recently (manual checks always ask the server)
+        max_age = self.check_interval_hours * 60 * 60 if self.automatic else 0
         try:
-            response = requests.get(self.version_url)
-            logging.info(f"Checking update file at: {self.version_url}")
-
-            # If download was successful, check the version
-            if response.status_code == 200:
-                
-                ## FOR TESTING ##
-                # self.platform = "windows"
-                # self.platform = "macos"
-                # self.platform = "linux"
-                #################
-
-                def find_release(versions, index):
-                    try:
-                        self.server_version = versions[index]['version']
-                        self.sha256 = versions[index]['shasum'][self.platform]
-                        return True
-                    except KeyError:
-                        logging.error(f"Found version {self.server_version}, but no release found for {self.platform}")
-                        find_release(versions, (index - 1))
-                    except IndexError:
-                        logging.error(f"No release for '{self.platform}' found in {Updater.version_file}.")
-                        return False
-                
-                versions = json.loads(response.text)
+            versions = fetch_versions(self.version_url, self.cache_path, max_age, get_session())
+        except requests.exceptions.HTTPError as e:
+            self.check_success = False
+            self.message = Updater.messages["check_error"] + "\nHTTP Status: " + str(e.response.status_code)
+            logging.error(self.message)
+            return
+        except (requests.exceptions.RequestException, ValueError) as e:
+            self.check_success = False
+            self.message = Updater.messages["check_error"] + str(e)
+            logging.error(self.message)
+            return
 
-                release_available = find_release(versions, -1)
-                
-                if not release_available:
-                    self.check_success = False
-                    self.message = "No release found for this platform."
-                    logging.error(self.message)
-                    return
-
-                logging.info(f"Local version: {self.local_version}, Server version: {self.server_version}, Server sha256: {self.sha256}")
-
-                ## FOR TESTING ##
-                # self.local_version="0.4.0"
-                # self.server_version="0.2.0"
-                #################
-
-                # If the server version is newer, download the update
-                if self.server_version > self.local_version:
-                    self.check_success = True
-                    self.update_available = True
-                    self.message = self.messages["update_available"]
-                    logging.info(f"Update available: {self.server_version}")
-                    return
-
-                # Otherwise, no update is available
-                else:
-                    self.check_success = True
-                    self.update_available = False
-                    self.message = Updater.messages["no_update"]
-                    logging.info(self.message)
-                    return
-            else:
-                self.check_success = False
-                self.message = Updater.messages["check_error"] + "\nHTTP Status: " + str(response.status_code)
-                logging.error(self.message)
-                return
-        except requests.exceptions.RequestException as e:
+        ## FOR TESTING ##
+        # self.platform = "windows"
+        # self.platform = "macos"
+        # self.platform = "linux"
+        #################
+
+        def find_release(versions, index):
+            try:
+                self.server_version = versions[index]['version']
+                self.sha256 = versions[index]['shasum'][self.platform]
+                return True
+            except KeyError:
+                logging.error(f"Found version {self.server_version}, but no release found for {self.platform}")
+                return find_release(versions, (index - 1))
+            except IndexError:
+                logging.error(f"No release for '{self.platform}' found in {Updater.version_file}.")
+                return False
+
+        release_available = find_release(versions, -1)
+
+        if not release_available:
             self.check_success = False
-            self.message = Updater.messages["check_error" + str(e)]
+            self.message = "No release found for this platform."
             logging.error(self.message)
             return
 
+        logging.info(f"Local version: {self.local_version}, Server version: {self.server_version}, Server sha256: {self.sha256}")
+
+        ## FOR TESTING ##
+        # self.local_version="0.4.0"
+        # self.server_version="0.2.0"
+        #################
+
+        # If the server version is newer, download the update
+        if self.server_version > self.local_version:
+            self.check_success = True
+            self.update_available = True
+            self.message = self.messages["update_available"]
+            logging.info(f"Update available: {self.server_version}")
+            return
+
+        # Otherwise, no update is available
+        else:
+            self.check_success = True
+            self.update_available = False
+            self.message = Updater.messages["no_update"]
+            logging.info(self.message)
+            return
+
     # def download_update(self, progress_box):
 
-    def download_update(self):
+    def download_update(self, progress=None):
         # URL of the new application files on the server
         self.update_file_name = self.update_file_base_name + "-" + self.server_version + "-" + self.update_file_platform + self.update_file_extension
         update_url = f"{Updater.update_base_url}/v{self.server_version}/{self.update_file_name}"
         logging.info(f"Downloading update from: {update_url}")
 
-        # Download the new application files
+        # Stream the new application file to the cache directory
         try:
-            response = requests.get(update_url, stream=True)
-            if response.status_code == 200:
-                self.file_size = int(response.headers.get('content-length', 0))
-                # logging.debug(f"File size: {self.file_size}")
-
-                chunks = []
-                for chunk in response.iter_content(1024):
-                    chunks.append(chunk)
-                    self.downloaded_size += len(chunk)
-                    # logging.debug(f"Chunk size: {len(chunk)}, Total size: {self.downloaded_size}")
-                
-                content = b''.join(chunks)
-
-                sha_check(content, self.sha256)
-                if sha_check:
-                    # Download and check success
-                    self.update_success = True
-                    self.message = Updater.messages["download_success"]
-                    logging.info(self.message)
-                    self.file = content
-                    return
-                else:
-                    # Download failure
-                    self.update_success = False
-                    self.message = Updater.messages["sha_fail"]
-                    logging.error(self.message)
-                    return
-            else:
-                self.update_success = False
-                self.message = f"{Updater.messages["download_error"]} {str(e)}"
-                logging.error(self.message)
-                return
-        except requests.exceptions.RequestException as e:
+            download_dir = os.path.join(toga.App.app.paths.cache, "updates")
+            os.makedirs(download_dir, exist_ok=True)
+            file_path = os.path.join(download_dir, self.update_file_name)
+            # Interrupted downloads of other versions can no longer be resumed
+            for name in os.listdir(download_dir):
+                if name.endswith(".part") and name != os.path.basename(partial_path(file_path, self.sha256)):
+                    os.remove(os.path.join(download_dir, name))
+            download_file(update_url, file_path, self.sha256, progress, get_session())
+        except ValueError as e:
+            # Download failure
+            self.update_success = False
+            self.message = Updater.messages["sha_fail"]
+            logging.error(f"{self.message} {e}")
+            return
+        except (requests.exceptions.RequestException, OSError) as e:
             self.update_success = False
             self.message = f"{Updater.messages["download_error"]} {str(e)}"
             logging.error(self.message)
             return
 
+        # Download and check success
+        self.update_success = True
+        self.message = Updater.messages["download_success"]
+        logging.info(self.message)
+        self.file = file_path
+
 class UpdaterUI():
     def __init__(self, main_window):
         window_width, window_height = 400, 150
@@ -326,6 +527,7 @@ class UpdaterUI():
             #     ])
         ])
         self.update_window.content = self.progress_box
+        self.max_size = None
         return
 
     def show(self):
@@ -368,6 +570,15 @@ class UpdaterUI():
         result = await self.update_window.info_dialog("Save Update File", "Update file saved successfully.")    
         return result
 
+    def show_progress(self, downloaded, total):
+        # Start the progress bar once the download size is known
+        if not total:
+            return
+        if self.max_size is None:
+            self.start_progress(total)
+        self.update_progress(downloaded)
+        return
+
     def start_progress(self, size):
         self.max_size = size
         self.progress_bar.max = 100
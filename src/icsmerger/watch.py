@@ -0,0 +1,307 @@
+import os
+import sys
+import time
+import select
+import struct
+import logging
+from .ical import load_keyed_events, check_cancel, DEFAULT_PARSER
+from .cache import EventCache, parse_file
+from .options import DEFAULT_WATCH_DEBOUNCE_SECONDS, DEFAULT_WATCH_POLL_SECONDS
+
+# Watch mode: rerun a merge whenever ICS2 or the exclusions file changes (see cli.py and merge.py).
+# Like engine.py, nothing in this module may import toga.
+
+# inotify(7) event masks
+IN_MODIFY = 0x00000002
+IN_ATTRIB = 0x00000004
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_NONBLOCK = 0o4000
+IN_CLOEXEC = 0o2000000
+# Files are often replaced (written elsewhere and renamed over) rather than rewritten, so the
+# directories are watched, not the files
+WATCH_MASK = IN_MODIFY | IN_ATTRIB | IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE
+EVENT_HEADER = struct.Struct("iIII")    # wd, mask, cookie, len (followed by the name)
+
+# How often the inotify backend checks for a cancel while no events arrive
+INOTIFY_TICK_SECONDS = 0.25
+
+def file_signature(file_path):
+    """
+    Get what identifies a version of a file.
+
+    Args:
+        file_path: The path to the file.
+
+    Returns:
+        A tuple of (size, mtime in ns, inode), or None if the file does not exist.
+    """
+    try:
+        stat = os.stat(file_path)
+    except OSError:
+        return None
+    return (stat.st_size, stat.st_mtime_ns, stat.st_ino)
+
+class PollingBackend():
+    """
+    Report every watched file as possibly changed, once per interval. Works everywhere.
+    """
+    def __init__(self, paths, interval=DEFAULT_WATCH_POLL_SECONDS):
+        self.paths = paths
+        self.interval = interval
+
+    def wait(self, cancel=None):
+        """
+        Wait for one interval.
+
+        Args:
+            cancel: An optional threading.Event that ends the wait early when set.
+
+        Returns:
+            The set of paths that may have changed.
+        """
+        if cancel is not None:
+            cancel.wait(self.interval)
+        else:
+            time.sleep(self.interval)
+        return set(self.paths)
+
+    def close(self):
+        pass
+
+class InotifyBackend():
+    """
+    Report the watched files whose directories had inotify events (Linux only, through ctypes).
+    """
+    def __init__(self, paths):
+        """
+        Args:
+            paths: The paths to watch.
+
+        Raises:
+            OSError: If inotify is not available.
+        """
+        import ctypes
+        import ctypes.util
+        self.paths = paths
+        self.libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+        self.fd = self.libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+        self.watches = {}   # {watch descriptor: {file name: path}}
+        try:
+            directories = {}
+            for path in paths:
+                directory, name = os.path.split(os.path.abspath(path))
+                directories.setdefault(directory, {})[name] = path
+            for directory, names in directories.items():
+                wd = self.libc.inotify_add_watch(self.fd, os.fsencode(directory), WATCH_MASK)
+                if wd < 0:
+                    raise OSError(ctypes.get_errno(), f"inotify_add_watch failed for {directory}")
+                self.watches[wd] = names
+        except BaseException:
+            self.close()
+            raise
+
+    def wait(self, cancel=None):
+        """
+        Wait for inotify events, or INOTIFY_TICK_SECONDS.
+
+        Args:
+            cancel: Not used; the wait is short enough for the caller to check it.
+
+        Returns:
+            The set of paths that may have changed.
+        """
+        readable, _, _ = select.select([self.fd], [], [], INOTIFY_TICK_SECONDS)
+        if not readable:
+            return set()
+        try:
+            data = os.read(self.fd, 64 * 1024)
+        except BlockingIOError:
+            return set()
+
+        changed = set()
+        offset = 0
+        while offset + EVENT_HEADER.size <= len(data):
+            wd, mask, cookie, length = EVENT_HEADER.unpack_from(data, offset)
+            name = os.fsdecode(data[offset + EVENT_HEADER.size:offset + EVENT_HEADER.size + length].rstrip(b"\0"))
+            offset += EVENT_HEADER.size + length
+            if mask & (IN_Q_OVERFLOW | IN_IGNORED):
+                # Events were lost, or a directory went away: check everything
+                changed.update(self.paths)
+            elif name in self.watches.get(wd, {}):
+                changed.add(self.watches[wd][name])
+        return changed
+
+    def close(self):
+        if self.fd >= 0:
+            os.close(self.fd)
+            self.fd = -1
+
+def create_backend(paths, poll_interval=DEFAULT_WATCH_POLL_SECONDS):
+    """
+    Get the best available way to watch files: inotify on Linux, stat polling elsewhere.
+
+    Args:
+        paths: The paths to watch.
+        poll_interval: The polling interval, if polling.
+
+    Returns:
+        An InotifyBackend or PollingBackend.
+    """
+    if sys.platform.startswith("linux"):
+        try:
+            return InotifyBackend(paths)
+        except (OSError, AttributeError) as e:
+            logging.warning(f"inotify is not available ({e}), polling for changes instead.")
+    return PollingBackend(paths, poll_interval)
+
+class FileWatcher():
+    """
+    Wait for changes to a set of files, debouncing bursts of writes.
+
+    A file has changed when its size, mtime or inode (see file_signature) differ from when it
+    was last seen, so events that leave a file as it was (e.g. reading it) are ignored.
+    """
+    def __init__(self, paths, debounce=DEFAULT_WATCH_DEBOUNCE_SECONDS, poll_interval=DEFAULT_WATCH_POLL_SECONDS, backend=None, clock=time.monotonic):
+        """
+        Args:
+            paths: The paths to watch.
+            debounce: How long, in seconds, files must stay unchanged after a change before it is reported.
+            poll_interval: The polling interval, if inotify is not available.
+            backend: The backend to use (see create_backend).
+            clock: The function giving the current time in seconds.
+        """
+        self.paths = [str(path) for path in paths]
+        self.debounce = debounce
+        self.clock = clock
+        self.backend = backend or create_backend(self.paths, poll_interval)
+        self.signatures = {path: file_signature(path) for path in self.paths}
+        logging.debug(f"Watching {self.paths} with {type(self.backend).__name__}")
+
+    def check(self, paths):
+        """
+        Find which of some paths changed since they were last seen.
+
+        Args:
+            paths: The paths that may have changed.
+
+        Returns:
+            The set of paths that changed.
+        """
+        changed = set()
+        for path in paths:
+            signature = file_signature(path)
+            if signature != self.signatures.get(path):
+                self.signatures[path] = signature
+                changed.add(path)
+        return changed
+
+    def wait(self, cancel=None):
+        """
+        Wait until some of the files change, then until they have been quiet for debounce seconds.
+
+        Args:
+            cancel: An optional threading.Event that aborts the wait when set.
+
+        Returns:
+            The set of paths that changed.
+
+        Raises:
+            Cancelled: If cancel was set.
+        """
+        changed = set()
+        last_change = None
+        while True:
+            check_cancel(cancel)
+            found = self.check(self.backend.wait(cancel))
+            if found:
+                changed |= found
+                last_change = self.clock()
+            elif changed and self.clock() - last_change >= self.debounce:
+                logging.debug(f"Changed: {sorted(changed)}")
+                return changed
+
+    def close(self):
+        """
+        Stop watching.
+        """
+        self.backend.close()
+
+class SnapshotCache():
+    """
+    The last parsed events of each file, kept in memory between the runs of a watch.
+
+    It is passed to engine.merge_files in place of a cache.EventCache, so a rerun only parses
+    the inputs that changed and diffs them against the snapshot of the others. Misses are
+    loaded through an optional EventCache.
+    """
+    def __init__(self, cache=None):
+        """
+        Args:
+            cache: An optional cache.EventCache to load misses through.
+        """
+        self.cache = cache
+        self.snapshots = {}     # {(path, kind, variant): (file_signature, events)}
+
+    def lookup(self, file_path, kind, parser, expander, window, load):
+        """
+        Get the snapshot of a file, loading a new one if the file changed.
+
+        Args:
+            file_path: The path to the iCalendar file.
+            kind: What was loaded, e.g. "events" or "keyed".
+            parser: The parser, one of options.PARSERS.
+            expander: An optional recurrence.RecurrenceExpander.
+            window: An optional window.DateWindow.
+            load: A function loading the file on a miss.
+
+        Returns:
+            The events (or statistics) of the file.
+        """
+        key = (os.path.abspath(file_path), kind, EventCache.variant(parser, expander, window))
+        signature = file_signature(file_path)   # Before loading, so a concurrent write leaves the snapshot stale rather than wrong
+        snapshot = self.snapshots.get(key)
+        if snapshot is not None and snapshot[0] == signature:
+            logging.debug(f"Snapshot hit: {file_path}")
+            return snapshot[1]
+        events = load()
+        self.snapshots[key] = (signature, events)
+        return events
+
+    def load(self, file_path, full=False, parser=DEFAULT_PARSER, cancel=None, expander=None, window=None):
+        """
+        Get the events of a file (see cache.EventCache.load).
+        """
+        if self.cache is not None:
+            load = lambda: self.cache.load(file_path, full, parser, cancel, expander, window)
+        else:
+            load = lambda: parse_file(file_path, full, parser, cancel, expander, window)
+        return self.lookup(file_path, ("events", full), parser, expander, window, load)
+
+    def load_keyed(self, file_path, parser=DEFAULT_PARSER, cancel=None, expander=None, window=None):
+        """
+        Get the keyed events of a file (see cache.EventCache.load_keyed).
+        """
+        if self.cache is not None:
+            load = lambda: self.cache.load_keyed(file_path, parser, cancel, expander, window)
+        else:
+            load = lambda: load_keyed_events(file_path, parser, cancel, expander, window)
+        return self.lookup(file_path, "keyed", parser, expander, window, load)
+
+    def load_stats(self, file_path, parser=DEFAULT_PARSER, cancel=None, expander=None, window=None):
+        """
+        Get the statistics of a file (see cache.EventCache.load_stats).
+        """
+        from .stats import load_calendar_stats
+        if self.cache is not None:
+            load = lambda: self.cache.load_stats(file_path, parser, cancel, expander, window)
+        else:
+            load = lambda: load_calendar_stats(file_path, parser, cancel, expander, window)
+        return self.lookup(file_path, "stats", parser, expander, window, load)
@@ -0,0 +1,157 @@
+import re
+from datetime import date, datetime, timedelta
+from .ical import sort_key
+
+# Relative window dates: "today", or an offset from today such as "+6m", "-30d" or "+2w"
+RELATIVE_DATE = re.compile(r"^([+-]\d+)([dwmy])$")
+
+def parse_window_date(text, today=None):
+    """
+    Parse a window boundary.
+
+    Args:
+        text: "" for no boundary, an ISO date (YYYY-MM-DD), "today", or an offset from
+            today in days, weeks, months or years (e.g. "+6m", "-30d").
+        today: The date relative boundaries are computed from. Defaults to today.
+
+    Returns:
+        The date, or None for no boundary.
+
+    Raises:
+        ValueError: If the text is not a valid boundary.
+    """
+    text = (text or "").strip().lower()
+    if not text:
+        return None
+    today = today or date.today()
+    if text == "today":
+        return today
+    match = RELATIVE_DATE.match(text)
+    if match is None:
+        return date.fromisoformat(text)
+    count, unit = int(match.group(1)), match.group(2)
+    if unit == "d":
+        return today + timedelta(days=count)
+    if unit == "w":
+        return today + timedelta(weeks=count)
+    months = today.month - 1 + (count if unit == "m" else 12 * count)
+    year, month = today.year + months // 12, months % 12 + 1
+    for day in (today.day, 30, 29, 28):  # Clamp to the end of shorter months
+        try:
+            return date(year, month, day)
+        except ValueError:
+            continue
+
+def raw_date(line):
+    """
+    Read the date of a DTSTART or DTEND content line without decoding it.
+
+    Args:
+        line: A content line from ical.iter_vevents, or None.
+
+    Returns:
+        The date written in the value (before any time zone conversion), or None.
+    """
+    if line is None:
+        return None
+    value = line.rpartition(':')[2]
+    try:
+        return date(int(value[0:4]), int(value[4:6]), int(value[6:8]))
+    except ValueError:
+        return None
+
+class DateWindow():
+    """
+    A range of dates that events must overlap to be loaded.
+
+    Either boundary may be None (unbounded). Both boundaries are inclusive.
+    """
+    def __init__(self, start=None, end=None):
+        """
+        Args:
+            start: The first date, or None.
+            end: The last date, or None.
+
+        Raises:
+            ValueError: If start is after end.
+        """
+        if start and end and start > end:
+            raise ValueError(f"The window starts ({start}) after it ends ({end})")
+        self.start = start
+        self.end = end
+        # Bounds in the event sort key space (see ical.sort_key)
+        self.start_key = datetime(start.year, start.month, start.day) if start else None
+        self.end_key = datetime(end.year, end.month, end.day) + timedelta(days=1) if end else None
+
+    @classmethod
+    def from_strings(cls, start, end, today=None):
+        """
+        Build a window from boundary strings (see parse_window_date).
+
+        Args:
+            start: The first date as a string, or "".
+            end: The last date as a string, or "".
+            today: The date relative boundaries are computed from. Defaults to today.
+
+        Returns:
+            DateWindow: The window, or None if both boundaries are empty.
+
+        Raises:
+            ValueError: If a boundary is invalid.
+        """
+        start, end = parse_window_date(start, today), parse_window_date(end, today)
+        if start is None and end is None:
+            return None
+        return cls(start, end)
+
+    def __str__(self):
+        return f"{self.start or '...'} to {self.end or '...'}"
+
+    @property
+    def key(self):
+        """A string identifying the window, e.g. for cache entries."""
+        return f"window:{self.start}:{self.end}"
+
+    def contains(self, dtstart, dtend):
+        """
+        Check whether an event overlaps the window.
+
+        Args:
+            dtstart: The event start.
+            dtend: The event end (exclusive).
+
+        Returns:
+            bool: True if the event overlaps the window.
+        """
+        start = sort_key(dtstart)
+        if self.end_key is not None and start >= self.end_key:
+            return False
+        if self.start_key is not None and start < self.start_key:
+            end = sort_key(dtend) if dtend is not None else start
+            if end <= self.start_key:
+                return False
+        return True
+
+    def rejects(self, props):
+        """
+        Check, without decoding the event, whether it is certainly outside the window.
+
+        Only the dates written in DTSTART and DTEND are read, with a day of slack for time
+        zones, so events near the boundaries must still be checked with contains.
+
+        Args:
+            props: The VEVENT properties from ical.iter_vevents.
+
+        Returns:
+            bool: True if the event can be skipped.
+        """
+        start = raw_date(props.get('DTSTART'))
+        if start is None:
+            return False
+        if self.end is not None and start > self.end + timedelta(days=1):
+            return True
+        if self.start is not None:
+            end = raw_date(props.get('DTEND'))
+            if end is not None and max(start, end) < self.start - timedelta(days=1):
+                return True
+        return False
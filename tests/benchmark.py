@@ -0,0 +1,165 @@
+"""
+Benchmark the merge pipeline on synthetic calendars (see synthetic.py).
+
+Each stage is timed and its peak memory measured with tracemalloc, for every combination
+of event count, recurring share and exclusion list size. Results are written as JSON so
+runs can be compared over time:
+
+    python tests/benchmark.py --events 1000 10000 --exclusions 10 1000 -o benchmark.json
+"""
+import io
+import os
+import sys
+import json
+import time
+import argparse
+import platform
+import tempfile
+import tracemalloc
+from datetime import datetime, timezone
+from pathlib import Path
+
+from icalendar import Calendar
+
+# Run as a script, tests/ comes first on sys.path, where tests/icsmerger.py would shadow the package (see conftest.py)
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "src"))
+from synthetic import write_calendar_pair, write_exclusions
+
+from icsmerger import __version__
+from icsmerger.ical import get_event_set, load_event_set, create_event, write_ics
+from icsmerger.exclusions import ExclusionMatcher, read_exclusions, filter_exclusions
+from icsmerger.store import EventStore
+from icsmerger.engine import merge_files
+
+def measure(stage, func, *args):
+    """
+    Run one stage, timing it and measuring its peak memory.
+
+    Args:
+        stage: The stage name.
+        func: The function to run.
+        *args: Its arguments.
+
+    Returns:
+        A tuple of (the stage's result, {"stage", "seconds", "peak_bytes"}).
+    """
+    tracemalloc.reset_peak()
+    before = tracemalloc.get_traced_memory()[0]
+    started = time.perf_counter()
+    value = func(*args)
+    seconds = time.perf_counter() - started
+    peak = tracemalloc.get_traced_memory()[1] - before
+    return value, {"stage": stage, "seconds": round(seconds, 6), "peak_bytes": peak}
+
+def run_case(directory, events, recurring, exclusions, seed=0):
+    """
+    Benchmark every stage for one combination of settings.
+
+    Stages are the steps of a merge, run one at a time on the same inputs. The parsers all
+    parse ICS2: the Calendar parse and get_event_set of the "calendar" parser, and the
+    "stream" parser. Then come building an EventStore, exclusion filtering (filter_exclusions
+    on sets, as in the original merge(), and the store partition used by merges now), the
+    diff of the filtered calendars (the set difference of merge(), then the EventStore
+    difference), writing the new events (create_event and to_ical separately, then both
+    streamed by write_ics), and finally merge_files end to end. ICS1 is prepared outside the
+    timed stages.
+
+    Args:
+        directory: A pathlib.Path to write the inputs to.
+        events: The number of events per calendar.
+        recurring: The fraction of recurring series.
+        exclusions: The number of exclusions.
+        seed: The random seed.
+
+    Returns:
+        A list of result dicts.
+    """
+    ics1, ics2 = write_calendar_pair(directory, events, recurring=recurring, seed=seed)
+    excl = write_exclusions(directory / "exclusions.txt", exclusions, events, seed)
+    case = {"events": events, "recurring": recurring, "exclusions": exclusions, "ics2_bytes": os.path.getsize(ics2)}
+    results = []
+
+    def record(stage, func, *args, count=len):
+        # count gets the number of events the stage produced from its result
+        value, result = measure(stage, func, *args)
+        result.update(case)
+        result["count"] = count(value)
+        results.append(result)
+        return value
+
+    matcher = ExclusionMatcher(read_exclusions(excl))
+    set1 = load_event_set(ics1)
+    filtered1, _ = filter_exclusions(set1, matcher)
+    kept1, _ = EventStore.from_events(set1).partition(matcher.match)
+
+    data = Path(ics2).read_bytes()
+    cal = record("load_ics", Calendar.from_ical, data, count=lambda cal: events)
+    set2 = record("get_event_set", get_event_set, cal)
+    del cal
+    record("stream_parse", load_event_set, ics2)
+    store2 = record("event_store", EventStore.from_events, set2)
+    filtered2, _ = record("filter_exclusions", filter_exclusions, set2, matcher, count=lambda result: len(result[1]))
+    kept2, _ = record("partition_exclusions", store2.partition, matcher.match, count=lambda result: len(result[1]))
+    new_events = record("set_diff", lambda: filtered2 - filtered1)
+    record("store_diff", lambda: set(kept2.difference(kept1)))
+    created = record("create_event", lambda: [create_event(event, False) for event in new_events])
+    record("to_ical", calendar_ical, created, count=lambda data: len(new_events))
+    del created
+    record("write_ics", lambda: write_ics(io.BytesIO(), new_events, False), count=lambda written: written)
+    record("merge_files", lambda: merge_files(ics1, ics2, excl, False, output_path=str(directory / "out.ics")), count=lambda result: len(result.new_events))
+    return results
+
+def calendar_ical(created):
+    """
+    Serialize events as a whole calendar, as the original merge() did.
+
+    Args:
+        created: A list of icalendar Events.
+
+    Returns:
+        bytes: The iCalendar data.
+    """
+    cal = Calendar()
+    for event in created:
+        cal.add_component(event)
+    return cal.to_ical()
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the merge pipeline on synthetic calendars.")
+    parser.add_argument("--events", type=int, nargs="+", default=[1000, 10000], help="Events per calendar.")
+    parser.add_argument("--recurring", type=float, nargs="+", default=[0.0, 0.1], help="Fractions of recurring series.")
+    parser.add_argument("--exclusions", type=int, nargs="+", default=[10, 1000], help="Exclusion list sizes.")
+    parser.add_argument("--seed", type=int, default=0, help="Random seed for the synthetic calendars.")
+    parser.add_argument("-o", "--output", default="benchmark.json", help="Path to write the results (JSON) to.")
+    args = parser.parse_args(argv)
+
+    results = []
+    tracemalloc.start()
+    try:
+        for events in args.events:
+            for recurring in args.recurring:
+                for exclusions in args.exclusions:
+                    with tempfile.TemporaryDirectory() as directory:
+                        case = run_case(Path(directory), events, recurring, exclusions, args.seed)
+                    for result in case:
+                        print(f"{events:>8} events {recurring:>4} recurring {exclusions:>6} exclusions  "
+                              f"{result['stage']:<22} {result['seconds'] * 1000:>10.1f} ms {result['peak_bytes'] / 1e6:>9.1f} MB")
+                    results += case
+    finally:
+        tracemalloc.stop()
+
+    report = {
+        "version": __version__,
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "created": datetime.now(timezone.utc).isoformat(),
+        "seed": args.seed,
+        "results": results
+    }
+    with open(args.output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"Results written to {args.output}")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
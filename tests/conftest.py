@@ -0,0 +1,15 @@
+import sys
+import importlib
+from pathlib import Path
+
+# pytest puts tests/ first on sys.path (again before each test module), where the test runner
+# tests/icsmerger.py would shadow the package. Put src/ in front of it and import the package
+# here, so "icsmerger" is the package whether the suite is run with pytest,
+# "python -m tests.icsmerger" or "briefcase dev --test".
+SRC_DIR = str(Path(__file__).resolve().parent.parent / "src")   # As helpers.SRC_DIR
+if SRC_DIR in sys.path:
+    sys.path.remove(SRC_DIR)
+sys.path.insert(0, SRC_DIR)
+if not hasattr(sys.modules.get("icsmerger"), "__path__"):
+    sys.modules.pop("icsmerger", None)
+importlib.import_module("icsmerger")
@@ -0,0 +1,89 @@
+# Calendars and other inputs shared by the tests. Test modules import these from here,
+# rather than from each other.
+import os
+import sys
+from pathlib import Path
+
+SRC_DIR = str(Path(__file__).resolve().parent.parent / "src")
+
+SAMPLE = (
+    "BEGIN:VCALENDAR\r\n"
+    "VERSION:2.0\r\n"
+    "PRODID:-//ICS Merger//Tests//EN\r\n"
+    "BEGIN:VTIMEZONE\r\n"
+    "TZID:Custom/Zone\r\n"
+    "BEGIN:STANDARD\r\n"
+    "DTSTART:19700101T000000\r\n"
+    "TZOFFSETFROM:+0300\r\n"
+    "TZOFFSETTO:+0300\r\n"
+    "END:STANDARD\r\n"
+    "END:VTIMEZONE\r\n"
+    "BEGIN:VEVENT\r\n"
+    "SUMMARY:Team meeting\\, weekly\r\n"
+    "DTSTART;TZID=Europe/Berlin:20240105T100000\r\n"
+    "DTEND;TZID=Europe/Berlin:20240105T110000\r\n"
+    "DTSTAMP:20240101T000000Z\r\n"
+    "UID:event-1@example.com\r\n"
+    "DESCRIPTION:A description that is long enough that it has to be folded o\r\n"
+    " nto the next line with a caf\r\n"
+    " \xc3\xa9 in it\r\n"
+    "BEGIN:VALARM\r\n"
+    "ACTION:DISPLAY\r\n"
+    "DESCRIPTION:Alarm\r\n"
+    "TRIGGER:-PT15M\r\n"
+    "END:VALARM\r\n"
+    "END:VEVENT\r\n"
+    "BEGIN:VEVENT\r\n"
+    "SUMMARY:Holiday\r\n"
+    "DTSTART;VALUE=DATE:20240704\r\n"
+    "DTEND;VALUE=DATE:20240705\r\n"
+    "DTSTAMP:20240101T000000Z\r\n"
+    "UID:event-2@example.com\r\n"
+    "END:VEVENT\r\n"
+    "BEGIN:VEVENT\r\n"
+    "SUMMARY:Custom zone\r\n"
+    "DTSTART;TZID=Custom/Zone:20240301T090000\r\n"
+    "DTEND;TZID=Custom/Zone:20240301T093000\r\n"
+    "DTSTAMP:20240101T000000Z\r\n"
+    "UID:event-3@example.com\r\n"
+    "END:VEVENT\r\n"
+    "END:VCALENDAR\r\n"
+).encode("latin-1")
+
+
+def write_calendar(path, events):
+    lines = ["BEGIN:VCALENDAR", "VERSION:2.0", "PRODID:-//ICS Merger//Tests//EN"]
+    for uid, summary, start, end in events:
+        lines += [
+            "BEGIN:VEVENT",
+            f"UID:{uid}",
+            f"SUMMARY:{summary}",
+            f"DTSTART:{start}",
+            f"DTEND:{end}",
+            "DTSTAMP:20240101T000000Z",
+            "END:VEVENT",
+        ]
+    lines.append("END:VCALENDAR")
+    path.write_text("\r\n".join(lines) + "\r\n")
+    return str(path)
+
+
+def make_inputs(tmp_path):
+    ics1 = write_calendar(tmp_path / "ics1.ics", [
+        ("1", "Standup", "20240102T090000Z", "20240102T091500Z"),
+        ("2", "Cancelled review", "20240103T100000Z", "20240103T110000Z"),
+    ])
+    ics2 = write_calendar(tmp_path / "ics2.ics", [
+        ("1", "Standup", "20240102T090000Z", "20240102T091500Z"),
+        ("3", "Planning", "20240104T100000Z", "20240104T110000Z"),
+        ("4", "Lunch (private)", "20240104T120000Z", "20240104T130000Z"),
+    ])
+    exclusions = tmp_path / "exclusions.txt"
+    exclusions.write_text("private\n")
+    return ics1, ics2, str(exclusions)
+
+
+def python_env():
+    # The environment for a Python subprocess importing the package: src/ goes first, ahead
+    # of tests/ and the test runner tests/icsmerger.py (see conftest.py)
+    return dict(os.environ, PYTHONPATH=os.pathsep.join([SRC_DIR] + sys.path))
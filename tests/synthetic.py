@@ -0,0 +1,172 @@
+"""
+Deterministic synthetic iCalendar files for tests and benchmarks (see benchmark.py).
+
+The same arguments always produce the same bytes, so benchmark runs are comparable.
+"""
+import random
+from datetime import datetime, timedelta
+
+WORDS = (
+    "standup", "review", "planning", "lunch", "retro", "sync", "demo", "interview", "training",
+    "offsite", "budget", "design", "release", "support", "onboarding", "all-hands", "1:1", "workshop",
+)
+
+# (TZID, VTIMEZONE lines or None for a zone icalendar resolves itself)
+TIMEZONES = (
+    ("Custom/Zone", [
+        "BEGIN:VTIMEZONE", "TZID:Custom/Zone",
+        "BEGIN:STANDARD", "DTSTART:19700101T000000", "TZOFFSETFROM:+0300", "TZOFFSETTO:+0300", "END:STANDARD",
+        "END:VTIMEZONE",
+    ]),
+    ("Europe/Berlin", None),
+    ("America/New_York", None),
+)
+
+def fold(line):
+    """
+    Fold a content line at 75 octets, as RFC 5545 requires.
+
+    Args:
+        line: The unfolded line.
+
+    Returns:
+        The folded line, with CRLF between the parts.
+    """
+    data = line.encode("utf-8")
+    parts = []
+    while len(data) > 75:
+        cut = 75 if not parts else 74
+        while cut and (data[cut] & 0xC0) == 0x80:  # Don't split a multi-byte character
+            cut -= 1
+        parts.append(data[:cut])
+        data = data[cut:]
+    parts.append(data)
+    return b"\r\n ".join(parts).decode("utf-8")
+
+def event_rng(index, seed):
+    """Get the random generator for one event, so each event depends only on its index and the seed."""
+    return random.Random(seed * 1000003 + index)
+
+def summary(index, seed=0):
+    """
+    Get the summary of an event.
+
+    Args:
+        index: The event index.
+        seed: The random seed.
+
+    Returns:
+        str: The summary. About one in four repeats an earlier event's, as in real calendars.
+    """
+    rng = event_rng(index, seed)
+    if index and rng.random() < 0.25:
+        return summary(rng.randrange(index), seed)
+    return f"{rng.choice(WORDS).title()} {rng.choice(WORDS)} #{index}"
+
+def vevent(index, seed=0, recurring=0.0, timezones=True, folded=True, start=datetime(2024, 1, 1), days=365):
+    """
+    Build the lines of one VEVENT.
+
+    Args:
+        index: The event index.
+        seed, recurring, timezones, folded, start, days: See calendar_bytes.
+
+    Returns:
+        A list of content lines.
+    """
+    rng = event_rng(index, seed)
+    name = summary(index, seed)
+    dtstart = start + timedelta(days=rng.randrange(days), minutes=15 * rng.randrange(32, 72))
+    kind = rng.random()
+    if kind < 0.15:
+        # All-day
+        day = dtstart.date()
+        times = [f"DTSTART;VALUE=DATE:{day:%Y%m%d}", f"DTEND;VALUE=DATE:{day + timedelta(days=1):%Y%m%d}"]
+    elif timezones and kind < 0.55:
+        tzid = rng.choice(TIMEZONES)[0]
+        times = [f"DTSTART;TZID={tzid}:{dtstart:%Y%m%dT%H%M%S}", f"DTEND;TZID={tzid}:{dtstart + timedelta(minutes=30):%Y%m%dT%H%M%S}"]
+    elif kind < 0.9:
+        times = [f"DTSTART:{dtstart:%Y%m%dT%H%M%S}Z", f"DTEND:{dtstart + timedelta(hours=1):%Y%m%dT%H%M%S}Z"]
+    else:
+        # Floating
+        times = [f"DTSTART:{dtstart:%Y%m%dT%H%M%S}", f"DTEND:{dtstart + timedelta(minutes=45):%Y%m%dT%H%M%S}"]
+
+    lines = ["BEGIN:VEVENT", f"UID:event-{index}@synthetic.example", f"SUMMARY:{name}"] + times
+    lines.append("DTSTAMP:20240101T000000Z")
+    if rng.random() < recurring:
+        lines.append(rng.choice(("RRULE:FREQ=WEEKLY;COUNT=20", "RRULE:FREQ=DAILY;INTERVAL=2;COUNT=30", "RRULE:FREQ=MONTHLY;COUNT=12")))
+    if folded:
+        description = f"DESCRIPTION:Agenda for {name}: " + " ".join(rng.choice(WORDS) for _ in range(rng.randint(10, 40))) + " — café"
+        lines.append(fold(description))
+    if rng.random() < 0.1:
+        lines += ["BEGIN:VALARM", "ACTION:DISPLAY", "DESCRIPTION:Reminder", "TRIGGER:-PT15M", "END:VALARM"]
+    lines.append("END:VEVENT")
+    return lines
+
+def calendar_bytes(count, first=0, recurring=0.0, timezones=True, folded=True, seed=0, start=datetime(2024, 1, 1), days=365):
+    """
+    Generate an iCalendar file.
+
+    Args:
+        count: The number of VEVENTs.
+        first: The index of the first event. Calendars with overlapping index ranges share those events.
+        recurring: The fraction of events that are recurring series (with an RRULE).
+        timezones: If True, a share of events use TZIDs, including a custom VTIMEZONE.
+        folded: If True, events have long DESCRIPTIONs folded over several lines.
+        seed: The random seed.
+        start: The first day events are spread from.
+        days: The number of days events are spread over.
+
+    Returns:
+        bytes: The calendar.
+    """
+    lines = ["BEGIN:VCALENDAR", "VERSION:2.0", "PRODID:-//ICS Merger//Synthetic//EN"]
+    if timezones:
+        for tzid, vtimezone in TIMEZONES:
+            lines += vtimezone or []
+    for index in range(first, first + count):
+        lines += vevent(index, seed, recurring, timezones, folded, start, days)
+    lines.append("END:VCALENDAR")
+    return ("\r\n".join(lines) + "\r\n").encode("utf-8")
+
+def write_calendar_pair(directory, count, recurring=0.0, timezones=True, folded=True, seed=0, churn=0.05):
+    """
+    Write an ICS1 and an ICS2 that share most of their events, like two exports of one calendar.
+
+    Args:
+        directory: A pathlib.Path to write ics1.ics and ics2.ics to.
+        count: The number of events in each calendar.
+        recurring, timezones, folded, seed: See calendar_bytes.
+        churn: The fraction of ICS1 events missing from ICS2, and of ICS2 events that are new.
+
+    Returns:
+        A tuple of the (ics1, ics2) paths as strings.
+    """
+    shift = int(count * churn)
+    ics1_path, ics2_path = directory / "ics1.ics", directory / "ics2.ics"
+    ics1_path.write_bytes(calendar_bytes(count, 0, recurring, timezones, folded, seed))
+    ics2_path.write_bytes(calendar_bytes(count, shift, recurring, timezones, folded, seed))
+    return str(ics1_path), str(ics2_path)
+
+def write_exclusions(path, count, events, seed=0):
+    """
+    Write an exclusions file.
+
+    Args:
+        path: A pathlib.Path to write to.
+        count: The number of exclusions. Half are parts of event summaries, half match nothing.
+        events: The number of events to pick summaries from.
+        seed: The random seed of the calendars.
+
+    Returns:
+        str: The path.
+    """
+    rng = random.Random(seed)
+    lines = []
+    for index in range(count):
+        if index % 2 == 0:
+            lines.append(summary(rng.randrange(events), seed).split(" ", 1)[1])  # e.g. "review #12"
+        else:
+            lines.append(f"never-{index}-{rng.randrange(10 ** 9)}")
+    path.write_text("\n".join(lines) + "\n")
+    return str(path)
@@ -1,3 +1,46 @@
+import subprocess
+import sys
+
+from icsmerger.timing import StageTimer
+
+from helpers import python_env
+
+
 def test_first():
     """An initial test for the app."""
     assert 1 + 1 == 2
+
+
+# Importing the GUI must stay cheap: the heavy modules are only imported when first used
+IMPORT_BUDGET_SECONDS = 1.0
+LAZY_MODULES = ("icalendar", "requests", "icsmerger.engine", "icsmerger.update", "icsmerger.content")
+
+
+def test_app_import_budget():
+    env = python_env()
+    code = (
+        "import sys, time; started = time.perf_counter(); import icsmerger.app; "
+        f"print(time.perf_counter() - started); print([name for name in {LAZY_MODULES!r} if name in sys.modules])"
+    )
+    seconds, loaded = subprocess.run([sys.executable, "-c", code], env=env, capture_output=True, text=True, check=True).stdout.splitlines()
+    assert loaded == "[]"
+    assert float(seconds) < IMPORT_BUDGET_SECONDS
+
+
+def test_stage_timer():
+    clock = iter([0.0, 0.5, 0.75]).__next__
+    timer = StageTimer("Startup", clock=clock)
+    timer.add("imports", 0.25)
+    timer.mark("config")
+    timer.mark("window")
+    assert timer.report() == "Startup: imports 250.0 ms, config 500.0 ms, window 250.0 ms (total 1000.0 ms)"
+
+
+def test_stage_timer_parts():
+    clock = iter([0.0, 0.25, 0.5, 1.0, 1.5]).__next__
+    timer = StageTimer("Merge", clock=clock)
+    assert timer.measure("ICS1", list, "abc") == ["a", "b", "c"]
+    timer.mark("Loading files")
+    timer.mark("Comparing calendars", 2)
+    assert timer.report() == "Merge: Loading files 1000.0 ms [ICS1 250.0 ms (3 events)], Comparing calendars 500.0 ms (2 events) (total 1500.0 ms)"
+    assert list(timer.lines()) == ["Loading files 1000.0 ms\n", "    ICS1 250.0 ms (3 events)\n", "Comparing calendars 500.0 ms (2 events)\n", "Total: 1500.0 ms\n"]
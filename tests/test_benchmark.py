@@ -0,0 +1,25 @@
+import json
+
+from benchmark import main
+from synthetic import calendar_bytes, write_calendar_pair
+from icsmerger.ical import load_event_set
+
+
+def test_synthetic_calendars_are_deterministic(tmp_path):
+    assert calendar_bytes(50, recurring=0.2, seed=3) == calendar_bytes(50, recurring=0.2, seed=3)
+    ics1, ics2 = write_calendar_pair(tmp_path, 100, churn=0.1)
+    events1, events2 = load_event_set(ics1), load_event_set(ics2, parser="calendar")
+    assert len(events1) == len(events2) == 100
+    assert len(events1 & events2) == 90
+
+
+def test_benchmark_writes_results(tmp_path):
+    output = tmp_path / "benchmark.json"
+    assert main(["--events", "50", "--recurring", "0.1", "--exclusions", "4", "-o", str(output)]) == 0
+    report = json.loads(output.read_text())
+    stages = [result["stage"] for result in report["results"]]
+    assert stages[0] == "load_ics" and stages[-1] == "merge_files"
+    assert {"get_event_set", "filter_exclusions", "set_diff", "create_event", "to_ical"} <= set(stages)
+    counts = {result["stage"]: result["count"] for result in report["results"]}
+    assert counts["set_diff"] == counts["store_diff"] == counts["create_event"] == counts["to_ical"]
+    assert all(result["seconds"] >= 0 and result["peak_bytes"] >= 0 for result in report["results"])
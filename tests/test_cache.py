@@ -0,0 +1,124 @@
+import os
+
+from icsmerger import cache
+from icsmerger.cache import EventCache
+
+from helpers import write_calendar
+
+
+def counting_loader(monkeypatch):
+    calls = []
+    original = cache.parse_file
+
+    def parse_file(*args, **kwargs):
+        calls.append(args[0])
+        return original(*args, **kwargs)
+
+    monkeypatch.setattr(cache, "parse_file", parse_file)
+    return calls
+
+
+def test_unchanged_file_is_not_reparsed(tmp_path, monkeypatch):
+    calls = counting_loader(monkeypatch)
+    path = write_calendar(tmp_path / "a.ics", [("1", "Standup", "20240102T090000Z", "20240102T091500Z")])
+    event_cache = EventCache(str(tmp_path / "cache"))
+    first = set(event_cache.load(path))
+    assert set(event_cache.load(path)) == first
+    assert len(calls) == 1
+
+    # Touched but identical: validated by hash
+    stat = os.stat(path)
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+    assert set(event_cache.load(path)) == first
+    assert len(calls) == 1
+
+
+def test_changed_file_is_reparsed(tmp_path, monkeypatch):
+    calls = counting_loader(monkeypatch)
+    path = write_calendar(tmp_path / "a.ics", [("1", "Standup", "20240102T090000Z", "20240102T091500Z")])
+    event_cache = EventCache(str(tmp_path / "cache"))
+    event_cache.load(path)
+    write_calendar(tmp_path / "a.ics", [("1", "Retro", "20240102T090000Z", "20240102T091500Z")])
+    assert [event[0] for event in event_cache.load(path)] == ["Retro"]
+    assert len(calls) == 2
+
+
+def test_least_recently_used_entry_is_evicted(tmp_path):
+    cache_dir = tmp_path / "cache"
+    a = write_calendar(tmp_path / "a.ics", [("1", "a", "20240102T090000Z", "20240102T091500Z")])
+    b = write_calendar(tmp_path / "b.ics", [("1", "b", "20240102T090000Z", "20240102T091500Z")])
+    EventCache(str(cache_dir)).load(a)
+    entry_size = sum(entry.stat().st_size for entry in os.scandir(cache_dir))
+
+    event_cache = EventCache(str(cache_dir), max_bytes=entry_size * 3 // 2)
+    os.utime(event_cache.entry_path(a, False, event_cache.variant()), (0, 0))
+    event_cache.load(b)
+    assert not os.path.exists(event_cache.entry_path(a, False, event_cache.variant()))
+    assert os.path.exists(event_cache.entry_path(b, False, event_cache.variant()))
+
+
+def test_parsers_have_separate_entries(tmp_path, monkeypatch):
+    calls = counting_loader(monkeypatch)
+    path = write_calendar(tmp_path / "a.ics", [("1", "Standup", "20240102T090000Z", "20240102T091500Z")])
+    event_cache = EventCache(str(tmp_path / "cache"))
+    stream = set(event_cache.load(path, parser="stream"))
+    calendar = set(event_cache.load(path, parser="calendar"))
+    assert len(calls) == 2
+    assert calendar == stream
+
+    # Each parser is then served its own entry
+    event_cache.load(path, parser="stream")
+    event_cache.load(path, parser="calendar")
+    assert len(calls) == 2
+    assert os.path.exists(event_cache.entry_path(path, False, event_cache.variant("stream")))
+    assert os.path.exists(event_cache.entry_path(path, False, event_cache.variant("calendar")))
+
+
+def test_concurrent_loads_with_eviction(tmp_path):
+    # Every put evicts the entries of the other loads, while they are scanning the cache
+    from icsmerger.engine import load_concurrently
+    paths = [
+        write_calendar(tmp_path / f"{i}.ics", [(str(i), f"Event {i}", "20240102T090000Z", "20240102T091500Z")])
+        for i in range(8)
+    ]
+    event_cache = EventCache(str(tmp_path / "cache"), max_bytes=1)
+    for _ in range(10):
+        results = load_concurrently(*(lambda path=path: event_cache.load(path) for path in paths))
+        assert [[event[0] for event in events] for events in results] == [[f"Event {i}"] for i in range(8)]
+
+
+def test_evict_skips_entries_removed_during_scan(tmp_path, monkeypatch):
+    a = write_calendar(tmp_path / "a.ics", [("1", "a", "20240102T090000Z", "20240102T091500Z")])
+    b = write_calendar(tmp_path / "b.ics", [("1", "b", "20240102T090000Z", "20240102T091500Z")])
+    event_cache = EventCache(str(tmp_path / "cache"), max_bytes=1)
+    event_cache.load(a)
+    scandir = os.scandir
+
+    class RacingScan():
+        # Lists the entries, then another load evicts them before they are stat'ed
+        def __init__(self, path):
+            with scandir(path) as scan:
+                self.entries = list(scan)
+            for entry in self.entries:
+                os.remove(entry.path)
+
+        def __enter__(self):
+            return iter(self.entries)
+
+        def __exit__(self, *exc_info):
+            pass
+
+    monkeypatch.setattr(os, "scandir", RacingScan)
+    assert [event[0] for event in event_cache.load(b)] == ["b"]
+
+
+def test_keyed_events_are_cached(tmp_path, monkeypatch):
+    calls = []
+    original = cache.load_keyed_events
+    monkeypatch.setattr(cache, "load_keyed_events", lambda *args: calls.append(args[0]) or original(*args))
+    path = write_calendar(tmp_path / "a.ics", [("1", "Standup", "20240102T090000Z", "20240102T091500Z")])
+    event_cache = EventCache(str(tmp_path / "cache"))
+    first = event_cache.load_keyed(path)
+    assert event_cache.load_keyed(path) == first
+    assert [event[3] for event in first] == ["1"]
+    assert len(calls) == 1
@@ -0,0 +1,27 @@
+from datetime import date
+
+from icsmerger.coverage import CoverageIndex
+from icsmerger.store import EventStore
+
+
+def day(value):
+    return (value - date(1970, 1, 1)).days
+
+
+def test_ranges_are_merged_within_gap():
+    events = EventStore.from_events([
+        ("a", date(2024, 1, 1), date(2024, 1, 3)),
+        ("b", date(2024, 1, 5), date(2024, 1, 6)),
+        ("c", date(2024, 3, 1), date(2024, 3, 2)),
+    ])
+    coverage = CoverageIndex(events, gap_days=2)
+    assert len(coverage) == 2
+    assert coverage.covers_day(day(date(2024, 1, 4)))
+    assert not coverage.covers_day(day(date(2024, 1, 6)))
+    assert not coverage.covers_day(day(date(2023, 12, 31)))
+    assert coverage.covers_day(day(date(2024, 3, 1)))
+
+
+def test_empty_calendar_covers_nothing():
+    coverage = CoverageIndex(EventStore())
+    assert not coverage.covers_day(0)
@@ -0,0 +1,23 @@
+from datetime import datetime, timezone
+
+from icsmerger.diff import diff_by_uid
+
+
+def event(summary, hour, uid, sequence=0):
+    start = datetime(2024, 1, 2, hour, tzinfo=timezone.utc)
+    return (summary, start, start.replace(hour=hour + 1), uid, None, sequence, datetime(2024, 1, 1, tzinfo=timezone.utc))
+
+
+def test_newer_revision_wins():
+    diff = diff_by_uid([event("Review", 9, "a", sequence=2)], [event("Review (old)", 8, "a", sequence=1)])
+    assert (diff.added, diff.removed, diff.modified, diff.unchanged) == ([], [], [], 1)
+
+    diff = diff_by_uid([event("Review", 9, "a", sequence=1)], [event("Review", 10, "a", sequence=2)])
+    assert diff.modified == [(event("Review", 9, "a", sequence=1), event("Review", 10, "a", sequence=2))]
+
+
+def test_events_without_uid_fall_back_to_event_key():
+    diff = diff_by_uid([event("Lunch", 12, None), event("Gym", 18, None)], [event("Lunch", 12, None), event("Gym", 19, None)])
+    assert [e[0] for e in diff.added] == ["Gym"]
+    assert [e[1].hour for e in diff.removed] == [18]
+    assert diff.unchanged == 1
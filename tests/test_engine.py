@@ -0,0 +1,159 @@
+import os
+import subprocess
+import sys
+from threading import Barrier, Event
+
+import pytest
+
+from icsmerger.cli import main
+from icsmerger.engine import merge_files, analyze_files, write_output, discard_output, load_concurrently, calendars_report, MERGE_STAGES
+from icsmerger.ical import Cancelled, load_event_set
+
+from helpers import write_calendar, make_inputs, python_env
+
+
+def test_merge_files(tmp_path):
+    ics1, ics2, exclusions = make_inputs(tmp_path)
+    result = merge_files(ics1, ics2, exclusions, False)
+    assert [event[0] for event in result.new_events] == ["Planning"]
+    assert [event[0] for event in result.removals] == ["Cancelled review"]
+    assert [event[0] for event in result.excluded_ics2] == ["Lunch (private)"]
+    assert not result.errors
+
+
+def test_merge_files_reports_progress(tmp_path):
+    ics1, ics2, exclusions = make_inputs(tmp_path)
+    stages = []
+    merge_files(ics1, ics2, exclusions, False, progress=lambda index, count, stage: stages.append(stage))
+    assert stages == list(MERGE_STAGES)
+
+
+def test_load_concurrently():
+    # Each load waits for the others, so this only finishes if they run at the same time
+    barrier = Barrier(3, timeout=5)
+
+    def load(value):
+        barrier.wait()
+        return value
+
+    assert load_concurrently(lambda: load(1), lambda: load(2), lambda: load(3)) == [1, 2, 3]
+
+
+def test_merge_files_cancel(tmp_path):
+    ics1, ics2, exclusions = make_inputs(tmp_path)
+    cancel = Event()
+
+    def progress(index, count, stage):
+        if index == 1:
+            cancel.set()
+
+    with pytest.raises(Cancelled):
+        merge_files(ics1, ics2, exclusions, False, progress=progress, cancel=cancel)
+
+
+def test_analyze_files_missing(tmp_path):
+    result = analyze_files("", str(tmp_path / "nope.ics"), "")
+    assert result.missing
+
+
+def test_cli_merge(tmp_path, capsys):
+    ics1, ics2, exclusions = make_inputs(tmp_path)
+    output = tmp_path / "out.ics"
+    assert main(["merge", "--ics1", ics1, "--ics2", ics2, "--exclusions", exclusions, "-o", str(output)]) == 0
+    assert "SUMMARY:Planning" in output.read_text()
+    assert "Cancelled review" in capsys.readouterr().out
+
+
+def test_cli_does_not_import_toga():
+    env = python_env()
+    code = "import sys, icsmerger.cli; print('toga' in sys.modules)"
+    output = subprocess.run([sys.executable, "-c", code], env=env, capture_output=True, text=True, check=True).stdout
+    assert output.strip() == "False"
+
+
+def test_merge_files_skips_removals_outside_ics2(tmp_path):
+    ics1 = write_calendar(tmp_path / "ics1.ics", [
+        ("1", "Old", "20230102T090000Z", "20230102T091500Z"),
+        ("2", "Cancelled review", "20240103T100000Z", "20240103T110000Z"),
+    ])
+    ics2 = write_calendar(tmp_path / "ics2.ics", [
+        ("3", "Kickoff", "20240102T100000Z", "20240102T110000Z"),
+        ("4", "Planning", "20240104T100000Z", "20240104T110000Z"),
+    ])
+    result = merge_files(ics1, ics2, "", False)
+    assert [event[0] for event in result.removals] == ["Cancelled review"]
+    assert [event[0] for event in result.uncovered] == ["Old"]
+
+
+def test_merge_output_is_written_once_and_copied(tmp_path):
+    ics1, ics2, exclusions = make_inputs(tmp_path)
+    result = merge_files(ics1, ics2, exclusions, False, newline="\r\n")
+    assert result.spooled and os.path.exists(result.output_path)
+    spool = result.output_path
+    copy = tmp_path / "copy.ics"
+    write_output(result, str(copy))
+    assert copy.read_bytes() == open(spool, "rb").read()
+    assert b"SUMMARY:Planning\r\n" in copy.read_bytes()
+    assert {event[0] for event in load_event_set(str(copy), parser="calendar")} == {"Planning"}
+    discard_output(result)
+    assert not os.path.exists(spool)
+
+
+def test_merge_files_uid_diff(tmp_path):
+    ics1 = write_calendar(tmp_path / "ics1.ics", [
+        ("1", "Standup", "20240102T090000Z", "20240102T091500Z"),
+        ("2", "Review", "20240103T100000Z", "20240103T110000Z"),
+        ("3", "Retro", "20240104T100000Z", "20240104T110000Z"),
+    ])
+    ics2 = write_calendar(tmp_path / "ics2.ics", [
+        ("1", "Standup", "20240102T090000Z", "20240102T091500Z"),
+        ("2", "Review (moved)", "20240103T140000Z", "20240103T150000Z"),
+        ("4", "Planning", "20240104T120000Z", "20240104T130000Z"),
+    ])
+    result = merge_files(ics1, ics2, "", False, diff_mode="uid")
+    assert [(old[0], new[0]) for old, new in result.modified] == [("Review", "Review (moved)")]
+    assert sorted(event[0] for event in result.new_events) == ["Planning", "Review (moved)"]
+    assert [event[0] for event in result.removals] == ["Retro"]
+    assert "UID:2\n" in open(result.output_path).read()
+    discard_output(result)
+
+
+def test_merge_files_timings_and_profile(tmp_path, capsys):
+    import pstats
+    ics1, ics2, exclusions = make_inputs(tmp_path)
+    result = merge_files(ics1, ics2, exclusions, False)
+    assert [stage for stage, seconds, count in result.timer.stages] == list(MERGE_STAGES)
+    # The loads run concurrently, so their parts are in the order they finished
+    assert {part: count for part, seconds, count in result.timer.parts["Loading files"]} == {"ICS1": 2, "ICS2": 3, "EXCL": None}
+    assert result.timer.stages[-1][2] == 1
+    discard_output(result)
+
+    profile = tmp_path / "merge.pstats"
+    output = tmp_path / "out.ics"
+    assert main(["merge", "--ics1", ics1, "--ics2", ics2, "-o", str(output), "--timings", "--profile", str(profile)]) == 0
+    assert "== Timings ==" in capsys.readouterr().out
+    assert pstats.Stats(str(profile)).total_calls > 0
+
+
+def test_merge_files_multiple_feeds(tmp_path):
+    ics1 = write_calendar(tmp_path / "ics1.ics", [
+        ("1", "Standup", "20240102T090000Z", "20240102T091500Z"),
+        ("2", "Cancelled review", "20240103T100000Z", "20240103T110000Z"),
+    ])
+    team_a = write_calendar(tmp_path / "team-a.ics", [
+        ("1", "Standup", "20240102T090000Z", "20240102T091500Z"),
+        ("3", "Planning", "20240104T100000Z", "20240104T110000Z"),
+    ])
+    team_b = write_calendar(tmp_path / "team-b.ics", [
+        ("3b", "Planning", "20240104T100000Z", "20240104T110000Z"),
+        ("4", "Retro", "20240105T100000Z", "20240105T110000Z"),
+    ])
+    result = merge_files(ics1, [team_a, team_b], "", False)
+    assert sorted(event[0] for event in result.new_events) == ["Planning", "Retro"]
+    assert [event[0] for event in result.removals] == ["Cancelled review"]
+    assert open(result.output_path).read().count("SUMMARY:Planning") == 1
+    discard_output(result)
+
+    result = analyze_files(ics1, [team_a, team_b], "")
+    assert result.ics2_count == 3 and result.feed_duplicates == 1
+    assert "ICS2 (2 files) contains 3 events" in "".join(calendars_report(result))
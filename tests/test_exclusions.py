@@ -0,0 +1,25 @@
+from icsmerger.exclusions import ExclusionMatcher, filter_exclusions
+
+
+def test_matcher_matches_like_substring_search():
+    exclusions = ["he", "she", "his", "hers", "Private", "", "  "]
+    summaries = ["ushers", "HIS meeting", "private lunch", "nothing", "sh", "", "Straße"]
+    matcher = ExclusionMatcher(exclusions)
+    assert len(matcher) == 5
+    for summary in summaries:
+        expected = any(excl.strip() and excl.casefold() in summary.casefold() for excl in exclusions)
+        assert (matcher.match(summary) is not None) == expected
+
+
+def test_matcher_reports_matching_exclusion():
+    matcher = ExclusionMatcher(["Lunch", "standup"])
+    assert matcher.match("Daily Standup") == "standup"
+    assert matcher.match("Team lunch") == "Lunch"
+    assert matcher.match("Retro") is None
+
+
+def test_filter_exclusions_ignores_blank_exclusions():
+    events = {("Lunch", 1, 2), ("Retro", 3, 4)}
+    filtered, excluded = filter_exclusions(events, ["", "lunch"])
+    assert filtered == {("Retro", 3, 4)}
+    assert excluded == {("Lunch", 1, 2): "lunch"}
@@ -0,0 +1,51 @@
+import csv
+import json
+
+from icsmerger.cli import main
+from icsmerger.engine import merge_files, discard_output
+from icsmerger.export import export_result, export_rows, format_for_path
+
+from helpers import make_inputs
+
+
+EXPECTED = [
+    ("new", "ICS2", "Planning", "2024-01-04T10:00:00+00:00", "not in ICS1"),
+    ("removal", "ICS1", "Cancelled review", "2024-01-03T10:00:00+00:00", "not in ICS2"),
+    ("excluded", "ICS2", "Lunch (private)", "2024-01-04T12:00:00+00:00", "matched exclusion 'private'"),
+]
+
+
+def test_export_formats(tmp_path):
+    ics1, ics2, exclusions = make_inputs(tmp_path)
+    result = merge_files(ics1, ics2, exclusions, False)
+    try:
+        assert [(row["change"], row["calendar"], row["summary"], row["start"], row["reason"]) for row in export_rows(result)] == EXPECTED
+        rows = list(export_rows(result))
+
+        assert export_result(result, str(tmp_path / "changes.csv")) == 3
+        with open(tmp_path / "changes.csv", newline="") as f:
+            assert list(csv.DictReader(f)) == rows
+        assert export_result(result, str(tmp_path / "changes.ndjson")) == 3
+        assert [json.loads(line) for line in open(tmp_path / "changes.ndjson")] == rows
+        assert export_result(result, str(tmp_path / "changes.json")) == 3
+        assert json.load(open(tmp_path / "changes.json")) == rows
+    finally:
+        discard_output(result)
+
+
+def test_export_empty_json_and_format_for_path(tmp_path):
+    ics1, ics2, exclusions = make_inputs(tmp_path)
+    result = merge_files(ics2, ics2, "", False)
+    try:
+        assert export_result(result, str(tmp_path / "changes.json")) == 0
+        assert json.load(open(tmp_path / "changes.json")) == []
+    finally:
+        discard_output(result)
+    assert [format_for_path(path) for path in ("a.CSV", "a.jsonl", "a.json", "a.txt")] == ["csv", "ndjson", "json", "csv"]
+
+
+def test_cli_export(tmp_path):
+    ics1, ics2, exclusions = make_inputs(tmp_path)
+    export = tmp_path / "changes.txt"
+    assert main(["merge", "--ics1", ics1, "--ics2", ics2, "--exclusions", exclusions, "-o", str(tmp_path / "out.ics"), "--export", str(export), "--export-format", "ndjson", "-q"]) == 0
+    assert [json.loads(line)["change"] for line in open(export)] == ["new", "removal", "excluded"]
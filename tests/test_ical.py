@@ -0,0 +1,32 @@
+from icsmerger.ical import load_event_set, unfold_lines
+
+from helpers import SAMPLE
+
+
+def write_sample(tmp_path):
+    path = tmp_path / "sample.ics"
+    path.write_bytes(SAMPLE)
+    return path
+
+
+def test_unfold_lines():
+    lines = list(unfold_lines([b"DESCRIPTION:ab\r\n", b" cd\r\n", b"\r\n", b"SUMMARY:x\n"]))
+    assert lines == ["DESCRIPTION:abcd", "SUMMARY:x"]
+
+
+def test_unfold_lines_split_character():
+    lines = list(unfold_lines(["SUMMARY:caf\xc3\r\n".encode("latin-1"), " \xa9\r\n".encode("latin-1")]))
+    assert lines == ["SUMMARY:café"]
+
+
+def test_stream_matches_calendar(tmp_path):
+    path = write_sample(tmp_path)
+    assert load_event_set(path, parser="stream") == load_event_set(path, parser="calendar")
+
+
+def test_stream_matches_calendar_full(tmp_path):
+    path = write_sample(tmp_path)
+    stream = sorted(load_event_set(path, full=True, parser="stream"), key=lambda x: x[4])
+    calendar = sorted(load_event_set(path, full=True, parser="calendar"), key=lambda x: x[4])
+    assert stream == calendar
+    assert "café" in stream[0][5]
@@ -0,0 +1,68 @@
+from concurrent.futures import Future
+
+from icsmerger import parallel
+from icsmerger.ical import load_event_set, load_keyed_events
+from icsmerger.parallel import iter_events_parallel, split_chunks, CHUNKS_IN_FLIGHT_PER_WORKER
+
+from helpers import SAMPLE
+
+
+def write_large_sample(tmp_path, copies=40):
+    # Many copies of the sample events, each with its own summary
+    header, body = SAMPLE.split(b"BEGIN:VEVENT", 1)
+    body, footer = (b"BEGIN:VEVENT" + body).rsplit(b"END:VCALENDAR", 1)
+    events = [body.replace(b"SUMMARY:", b"SUMMARY:%d " % copy) for copy in range(copies)]
+    path = tmp_path / "large.ics"
+    path.write_bytes(header + b"".join(events) + b"END:VCALENDAR" + footer)
+    return str(path)
+
+
+def test_split_chunks_keeps_events_whole(tmp_path):
+    data = open(write_large_sample(tmp_path), "rb").read()
+    header, chunks = split_chunks(data, chunk_bytes=1000)
+    assert len(chunks) > 2
+    assert b"BEGIN:VTIMEZONE" in header and b"BEGIN:VEVENT" not in header
+    assert chunks[0][0] == data.index(b"BEGIN:VEVENT") and chunks[-1][1] == len(data)
+    for start, end in chunks:
+        assert data[start:end].startswith(b"BEGIN:VEVENT")
+        assert data[start:end].count(b"BEGIN:VEVENT") == data[start:end].count(b"END:VEVENT")
+
+
+def test_parallel_matches_stream(tmp_path):
+    path = write_large_sample(tmp_path)
+    events = list(iter_events_parallel(path, full=True, workers=2, min_bytes=0, chunk_bytes=1000))
+    assert len(events) == 120
+    assert set(events) == load_event_set(path, full=True, parser="stream")
+    assert load_keyed_events(path, parser="parallel") == load_keyed_events(path, parser="stream")
+
+
+def test_parallel_bounds_chunks_in_flight(tmp_path, monkeypatch):
+    submitted = []
+
+    class InlinePool():
+        # Parses each chunk as it is submitted, recording its start
+        def __init__(self, max_workers, mp_context):
+            pass
+
+        def __enter__(self):
+            return self
+
+        def __exit__(self, *exc_info):
+            pass
+
+        def submit(self, func, *args):
+            submitted.append(args[2])
+            future = Future()
+            future.set_result(func(*args))
+            return future
+
+    monkeypatch.setattr(parallel, "ProcessPoolExecutor", InlinePool)
+    path = write_large_sample(tmp_path)
+    header, chunks = split_chunks(open(path, "rb").read(), chunk_bytes=1000)
+    assert len(chunks) > 2 * CHUNKS_IN_FLIGHT_PER_WORKER + 1
+    events = iter_events_parallel(path, full=True, workers=2, min_bytes=0, chunk_bytes=1000)
+    next(events)
+    # The first chunk's replacement is submitted before its events are yielded
+    assert len(submitted) == 2 * CHUNKS_IN_FLIGHT_PER_WORKER + 1
+    assert len(list(events)) == 119
+    assert submitted == [start for start, end in chunks]
@@ -0,0 +1,70 @@
+from datetime import date, datetime
+from zoneinfo import ZoneInfo
+
+from icsmerger.ical import load_event_set, load_keyed_events
+from icsmerger.recurrence import RecurrenceExpander
+
+
+SERIES = """BEGIN:VCALENDAR
+VERSION:2.0
+PRODID:-//ICS Merger//Tests//EN
+BEGIN:VEVENT
+UID:standup
+SUMMARY:Standup
+DTSTART;TZID=Europe/Berlin:20240101T090000
+DTEND;TZID=Europe/Berlin:20240101T091500
+RRULE:FREQ=DAILY
+EXDATE;TZID=Europe/Berlin:20240103T090000
+DTSTAMP:20240101T000000Z
+END:VEVENT
+BEGIN:VEVENT
+UID:standup
+RECURRENCE-ID;TZID=Europe/Berlin:20240104T090000
+SUMMARY:Standup (late)
+DTSTART;TZID=Europe/Berlin:20240104T100000
+DTEND;TZID=Europe/Berlin:20240104T101500
+DTSTAMP:20240101T000000Z
+END:VEVENT
+BEGIN:VEVENT
+UID:holiday
+SUMMARY:Holiday
+DTSTART;VALUE=DATE:20240101
+DTEND;VALUE=DATE:20240102
+RRULE:FREQ=YEARLY;UNTIL=20300101T000000Z
+DTSTAMP:20240101T000000Z
+END:VEVENT
+END:VCALENDAR
+"""
+
+
+def write_series(tmp_path):
+    path = tmp_path / "series.ics"
+    path.write_text(SERIES.replace("\n", "\r\n"))
+    return str(path)
+
+
+def test_occurrences_in_window(tmp_path):
+    path = write_series(tmp_path)
+    expander = RecurrenceExpander(date(2024, 1, 2), date(2024, 1, 5))
+    events = sorted(load_event_set(path, expander=expander), key=lambda x: (x[0], str(x[1])))
+    berlin = ZoneInfo("Europe/Berlin")
+    assert [(summary, start) for summary, start, end in events] == [
+        ("Standup", datetime(2024, 1, 2, 9, tzinfo=berlin)),
+        ("Standup", datetime(2024, 1, 5, 9, tzinfo=berlin)),
+        ("Standup (late)", datetime(2024, 1, 4, 10, tzinfo=berlin)),
+    ]
+    # The holiday's only occurrence (Jan 1) is outside the window
+
+
+def test_series_are_memoized_and_keyed_by_occurrence(tmp_path):
+    path = write_series(tmp_path)
+    expander = RecurrenceExpander(date(2024, 1, 1), date(2025, 12, 31))
+    events = load_keyed_events(path, expander=expander)
+    assert len(expander.memo) == 2
+    holidays = [event for event in events if event[0] == "Holiday"]
+    assert [event[1] for event in holidays] == [date(2024, 1, 1), date(2025, 1, 1)]
+    assert [event[4] for event in holidays] == [event[1] for event in holidays]
+
+    memo = dict(expander.memo)
+    load_keyed_events(path, expander=expander)
+    assert all(expander.memo[key] is value for key, value in memo.items())
@@ -0,0 +1,38 @@
+import asyncio
+
+from icsmerger.report import ReportWriter
+
+
+class Widget:
+    def __init__(self):
+        self.value = ""
+        self.updates = 0
+
+    def __setattr__(self, name, value):
+        if name == "value":
+            self.__dict__["updates"] = self.__dict__.get("updates", 0) + 1
+        super().__setattr__(name, value)
+
+
+def test_flush_writes_in_batches():
+    widget = Widget()
+    widget.updates = 0
+    report = ReportWriter(widget, batch_lines=10, line_limit=None)
+    report.write(f"line {i}\n" for i in range(95))
+    asyncio.run(report.flush())
+    assert widget.value == report.value()
+    assert widget.updates == 10
+
+
+def test_flush_stops_at_limit_until_show_all():
+    widget = Widget()
+    report = ReportWriter(widget, batch_lines=10, line_limit=20)
+    report.write(f"line {i}\n" for i in range(50))
+    asyncio.run(report.flush())
+    assert report.truncated
+    assert widget.value.startswith("".join(f"line {i}\n" for i in range(20)))
+    assert "30 more line(s) not shown" in widget.value
+
+    asyncio.run(report.flush(show_all=True))
+    assert not report.truncated
+    assert widget.value == report.value()
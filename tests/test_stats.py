@@ -0,0 +1,62 @@
+from datetime import date
+
+from icsmerger.cache import EventCache
+from icsmerger.engine import analyze_files, exclusion_list_report
+from icsmerger.exclusions import ExclusionMatcher
+from icsmerger import stats as stats_module
+from icsmerger.stats import CalendarStats, load_calendar_stats
+
+from helpers import write_calendar, make_inputs
+
+
+def test_stats_are_collected_in_one_pass():
+    stats = CalendarStats()
+    events = [
+        ("Holiday", date(2024, 1, 1), date(2024, 1, 2)),
+        ("Standup", date(2024, 1, 2), date(2024, 1, 3)),
+        ("Standup", date(2024, 1, 2), date(2024, 1, 3)),
+        ("Review", date(2024, 3, 5), date(2024, 3, 6)),
+    ]
+    assert list(stats.collect(events)) == events
+    stats.finish()
+    assert (stats.count, stats.all_day, stats.timed, stats.duplicates) == (4, 4, 0, 1)
+    assert (stats.earliest, stats.latest) == (date(2024, 1, 1), date(2024, 3, 5))
+    assert list(stats.month_lines()) == ["      2024-01: 3\n", "      2024-03: 1\n"]
+    assert stats.excluded(ExclusionMatcher(["stand", "nothing"])) == {"stand": 2}
+
+
+def test_duplicates_are_counted_exactly(monkeypatch):
+    # Events whose hashes collide are still different events
+    monkeypatch.setattr(stats_module, "hash", lambda value: 0, raising=False)
+    stats = CalendarStats()
+    for event in [
+        ("Standup", date(2024, 1, 2), date(2024, 1, 3)),
+        ("Review", date(2024, 1, 2), date(2024, 1, 3)),
+        ("Review", date(2024, 1, 2), date(2024, 1, 3)),
+    ]:
+        stats.add(event)
+    assert stats.duplicates == 1
+
+
+def test_stats_file_and_cache(tmp_path):
+    path = write_calendar(tmp_path / "a.ics", [
+        ("1", "Standup", "20240102T090000Z", "20240102T091500Z"),
+        ("2", "Planning", "20240204T100000Z", "20240204T110000Z"),
+    ])
+    stats = load_calendar_stats(path, parser="stream")
+    assert (stats.count, stats.timed) == (2, 2)
+
+    cache = EventCache(str(tmp_path / "cache"))
+    first = cache.load_stats(path)
+    cached = cache.load_stats(path)
+    assert cached is not first
+    assert (cached.count, dict(cached.months)) == (2, {(2024, 1): 1, (2024, 2): 1})
+
+
+def test_analyze_files_counts_exclusion_matches(tmp_path):
+    ics1, ics2, exclusions = make_inputs(tmp_path)
+    result = analyze_files(ics1, ics2, exclusions)
+    assert (result.ics1_count, result.ics2_count) == (2, 3)
+    assert result.earliest_ics2 == date(2024, 1, 2)
+    assert result.excluded_ics2 == {"private": 1}
+    assert "'private' (matches 0 in ICS1, 1 in ICS2)" in "".join(exclusion_list_report(result))
@@ -0,0 +1,62 @@
+import pickle
+from datetime import date, datetime, timedelta, timezone
+from zoneinfo import ZoneInfo
+
+from icsmerger.store import EventStore, merge_stores
+
+
+BERLIN = ZoneInfo("Europe/Berlin")
+EVENTS = [
+    ("Standup", datetime(2024, 1, 2, 9, 0, tzinfo=timezone.utc), datetime(2024, 1, 2, 9, 15, tzinfo=timezone.utc)),
+    ("Lunch", datetime(2024, 1, 2, 12, 0, tzinfo=BERLIN), datetime(2024, 1, 2, 13, 0, tzinfo=BERLIN)),
+    ("Holiday", date(2024, 1, 1), date(2024, 1, 2)),
+    ("Floating", datetime(2024, 1, 3, 8, 0), datetime(2024, 1, 3, 8, 30)),
+]
+
+
+def test_round_trip_and_dedupe():
+    store = EventStore.from_events(EVENTS + EVENTS[:2])
+    assert len(store) == len(EVENTS)
+    assert list(store) == EVENTS
+    assert [event[1].tzinfo for event in list(store)[:2]] == [timezone.utc, BERLIN]
+
+
+def test_difference_matches_set_semantics():
+    # Same instant in another zone is the same event; a date is never equal to a datetime
+    other = [
+        ("Standup", datetime(2024, 1, 2, 10, 0, tzinfo=BERLIN), datetime(2024, 1, 2, 10, 15, tzinfo=BERLIN)),
+        ("Holiday", datetime(2024, 1, 1), datetime(2024, 1, 2)),
+        ("Floating", datetime(2024, 1, 3, 8, 0), datetime(2024, 1, 3, 8, 30) + timedelta(minutes=1)),
+    ]
+    ours, theirs = EventStore.from_events(EVENTS), EventStore.from_events(other)
+    assert set(ours.difference(theirs)) == set(EVENTS) - set(other)
+    assert set(theirs.difference(ours)) == set(other) - set(EVENTS)
+
+
+def test_partition_and_pickle():
+    store = EventStore.from_events(EVENTS)
+    calls = []
+
+    def match(summary):
+        calls.append(summary)
+        return "lunch" if summary == "Lunch" else None
+
+    kept, matched = store.partition(match)
+    assert sorted(calls) == sorted(event[0] for event in EVENTS)
+    assert [(store.event(row), reason) for row, reason in matched] == [(EVENTS[1], "lunch")]
+    restored = pickle.loads(pickle.dumps(kept))
+    assert list(restored) == [event for event in EVENTS if event[0] != "Lunch"]
+    assert not list(restored.difference(kept))
+
+
+def test_merge_stores_drops_events_in_several_stores():
+    other = [
+        ("Standup", datetime(2024, 1, 2, 10, 0, tzinfo=BERLIN), datetime(2024, 1, 2, 10, 15, tzinfo=BERLIN)),  # Same instant
+        ("Review", datetime(2024, 1, 1, 15, 0, tzinfo=BERLIN), datetime(2024, 1, 1, 16, 0, tzinfo=BERLIN)),
+        EVENTS[2],
+    ]
+    merged = merge_stores([EventStore.from_events(EVENTS), EventStore.from_events(other), EventStore()])
+    assert set(merged) == set(EVENTS) | {other[1]}
+    assert len(merged) == len(EVENTS) + 1
+    assert [event[1].tzinfo for event in merged if event[0] in ("Lunch", "Review")] == [BERLIN, BERLIN]
+    assert merged.find(EventStore.from_events([EVENTS[1]]), 0) is not None
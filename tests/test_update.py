@@ -0,0 +1,185 @@
+import asyncio
+import hashlib
+import io
+import json
+import os
+import threading
+from functools import partial
+from http.server import SimpleHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+import requests
+
+from icsmerger.update import download_file, fetch_versions, partial_path, ThrottledProgress
+
+
+class QuietHandler(SimpleHTTPRequestHandler):
+    requests = []
+    ranges = []
+    resumable = True    # False to ignore Range requests, like servers that cannot resume
+
+    def log_message(self, format, *args):
+        pass
+
+    def send_head(self):
+        QuietHandler.requests.append((self.path, self.headers.get("If-None-Match")))
+        if self.path == "/versions.json":
+            # Stand-in for the ETag support of the real server
+            etag = '"%s"' % hashlib.sha256(open(self.translate_path(self.path), "rb").read()).hexdigest()
+            if self.headers.get("If-None-Match") == etag:
+                self.send_response(304)
+                self.end_headers()
+                return None
+            self.etag = etag
+        elif self.headers.get("Range"):
+            # Stand-in for the Range support of the real server ("bytes=N-" only)
+            QuietHandler.ranges.append(self.headers["Range"])
+            if not QuietHandler.resumable:
+                return super().send_head()
+            data = open(self.translate_path(self.path), "rb").read()
+            start = int(self.headers["Range"][len("bytes="):-1])
+            if start >= len(data):
+                self.send_response(416)
+                self.end_headers()
+                return None
+            self.send_response(206)
+            self.send_header("Content-Range", f"bytes {start}-{len(data) - 1}/{len(data)}")
+            self.send_header("Content-Length", str(len(data) - start))
+            self.end_headers()
+            return io.BytesIO(data[start:])
+        return super().send_head()
+
+    def end_headers(self):
+        if getattr(self, "etag", None):
+            self.send_header("ETag", self.etag)
+        super().end_headers()
+
+
+@pytest.fixture
+def server(tmp_path):
+    # A local stand-in for the release server, serving files from tmp_path/"www"
+    root = tmp_path / "www"
+    root.mkdir()
+    QuietHandler.requests = []
+    QuietHandler.ranges = []
+    QuietHandler.resumable = True
+    httpd = ThreadingHTTPServer(("127.0.0.1", 0), partial(QuietHandler, directory=str(root)))
+    thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+    yield root, f"http://127.0.0.1:{httpd.server_address[1]}"
+    httpd.shutdown()
+    httpd.server_close()
+
+
+def test_download_file_streams_to_disk(server, tmp_path):
+    root, url = server
+    payload = os.urandom(3 * 1024 * 1024 + 17)
+    (root / "update.dmg").write_bytes(payload)
+    target = tmp_path / "update.dmg"
+    updates = []
+
+    download_file(f"{url}/update.dmg", str(target), hashlib.sha256(payload).hexdigest(),
+                  progress=lambda done, total: updates.append((done, total)), chunk_size=64 * 1024)
+    assert target.read_bytes() == payload
+    assert updates[-1] == (len(payload), len(payload))
+    assert sorted(path.name for path in tmp_path.iterdir()) == ["update.dmg", "www"]
+
+
+def test_download_file_rejects_bad_download(server, tmp_path):
+    root, url = server
+    (root / "update.dmg").write_bytes(b"corrupt")
+    target = tmp_path / "update.dmg"
+    with pytest.raises(ValueError):
+        download_file(f"{url}/update.dmg", str(target), hashlib.sha256(b"expected").hexdigest())
+    with pytest.raises(requests.exceptions.HTTPError):
+        download_file(f"{url}/missing.dmg", str(target), "")
+    assert sorted(path.name for path in tmp_path.iterdir()) == ["www"]
+
+
+def test_download_file_resumes_partial_download(server, tmp_path):
+    root, url = server
+    payload = os.urandom(512 * 1024 + 3)
+    sha256 = hashlib.sha256(payload).hexdigest()
+    (root / "update.dmg").write_bytes(payload)
+    target = tmp_path / "update.dmg"
+
+    # A download that dropped after 100000 bytes
+    with open(partial_path(str(target), sha256), "wb") as f:
+        f.write(payload[:100000])
+    updates = []
+    download_file(f"{url}/update.dmg", str(target), sha256, progress=lambda done, total: updates.append((done, total)))
+    assert QuietHandler.ranges == ["bytes=100000-"]
+    assert updates[0][0] > 100000 and updates[-1] == (len(payload), len(payload))
+    assert target.read_bytes() == payload
+    assert sorted(path.name for path in tmp_path.iterdir()) == ["update.dmg", "www"]
+
+    # A complete partial download only needs checking
+    target.unlink()
+    with open(partial_path(str(target), sha256), "wb") as f:
+        f.write(payload)
+    download_file(f"{url}/update.dmg", str(target), sha256)
+    assert target.read_bytes() == payload
+
+    # A corrupt partial download is discarded, and the next attempt starts over
+    with open(partial_path(str(target), sha256), "wb") as f:
+        f.write(b"x" * 1000)
+    with pytest.raises(ValueError):
+        download_file(f"{url}/update.dmg", str(target), sha256)
+    download_file(f"{url}/update.dmg", str(target), sha256)
+    assert target.read_bytes() == payload
+
+
+def test_download_file_restarts_when_resume_is_refused(server, tmp_path):
+    root, url = server
+    payload = os.urandom(512 * 1024 + 3)
+    sha256 = hashlib.sha256(payload).hexdigest()
+    (root / "update.dmg").write_bytes(payload)
+    target = tmp_path / "update.dmg"
+    QuietHandler.resumable = False
+
+    # The server answers the Range request with the whole file (200), which replaces the partial file
+    with open(partial_path(str(target), sha256), "wb") as f:
+        f.write(payload[:100000])
+    updates = []
+    download_file(f"{url}/update.dmg", str(target), sha256,
+                  progress=lambda done, total: updates.append((done, total)), chunk_size=64 * 1024)
+    assert QuietHandler.ranges == ["bytes=100000-"]
+    assert updates[0][0] <= 64 * 1024 and updates[-1] == (len(payload), len(payload))
+    assert hashlib.sha256(target.read_bytes()).hexdigest() == sha256
+    assert sorted(path.name for path in tmp_path.iterdir()) == ["update.dmg", "www"]
+
+
+def test_fetch_versions_uses_cache_and_etag(server, tmp_path):
+    root, url = server
+    versions = [{"version": "9.0.0", "shasum": {"macos": "abc"}}]
+    (root / "versions.json").write_text(json.dumps(versions))
+    cache_path = str(tmp_path / "versions_cache.json")
+
+    assert fetch_versions(f"{url}/versions.json", cache_path, 3600, now=1000) == versions
+    assert fetch_versions(f"{url}/versions.json", cache_path, 3600, now=2000) == versions
+    assert len(QuietHandler.requests) == 1     # Fresh: no request
+
+    assert fetch_versions(f"{url}/versions.json", cache_path, 3600, now=9000) == versions
+    assert QuietHandler.requests[-1][1] is not None     # Stale: conditional request, answered with a 304
+    assert json.load(open(cache_path))["checked"] == 9000
+
+    (root / "versions.json").write_text(json.dumps(versions * 2))
+    assert fetch_versions(f"{url}/versions.json", cache_path, 0) == versions * 2
+    assert len(QuietHandler.requests) == 3
+
+
+def test_throttled_progress_posts_from_worker_thread():
+    posted = []
+    clock = iter(range(1000)).__next__   # One "second" per update
+
+    async def download():
+        loop = asyncio.get_running_loop()
+        progress = ThrottledProgress(lambda done, total: posted.append((done, total, threading.get_ident())), loop,
+                                     min_interval=10, min_bytes=1, clock=clock)
+        await loop.run_in_executor(None, lambda: [progress(done, 100) for done in range(1, 101)])
+        await asyncio.sleep(0)
+        return threading.get_ident()
+
+    loop_thread = asyncio.run(download())
+    assert [done for done, total, thread in posted] == [1, 11, 21, 31, 41, 51, 61, 71, 81, 91, 100]
+    assert {thread for done, total, thread in posted} == {loop_thread}
@@ -0,0 +1,120 @@
+import threading
+
+from icsmerger import watch
+from icsmerger.cli import build_parser, run_watch
+from icsmerger.engine import merge_files
+from icsmerger.watch import FileWatcher, InotifyBackend, SnapshotCache, create_backend
+
+from helpers import write_calendar, make_inputs
+
+
+class FakeClock():
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+class ScriptedBackend():
+    # Runs one step of the script per wait, advancing the clock by a second
+    def __init__(self, paths, clock, script):
+        self.paths = paths
+        self.clock = clock
+        self.script = list(script)
+
+    def wait(self, cancel=None):
+        self.clock.now += 1
+        if self.script:
+            self.script.pop(0)()
+        return set(self.paths)
+
+    def close(self):
+        pass
+
+
+def test_watcher_debounces_bursts_of_writes(tmp_path):
+    path = tmp_path / "ics2.ics"
+    path.write_text("a")
+    other = tmp_path / "exclusions.txt"
+    other.write_text("x")
+    clock = FakeClock()
+    writes = [lambda: None, lambda: path.write_text("ab"), lambda: path.write_text("abc"), lambda: None, lambda: path.write_text("abcd")]
+    backend = ScriptedBackend([str(path), str(other)], clock, writes)
+    watcher = FileWatcher([path, other], debounce=1.5, backend=backend, clock=clock)
+    assert watcher.wait() == {str(path)}
+    assert clock.now == 7   # Quiet for two seconds after the last write; one quiet second was not enough
+    other.write_text("y")
+    assert watcher.wait() == {str(other)}
+
+
+def test_inotify_backend_sees_replaced_file(tmp_path):
+    path = tmp_path / "ics2.ics"
+    path.write_text("a")
+    backend = create_backend([str(path)])
+    try:
+        if not isinstance(backend, InotifyBackend):
+            return
+        replacement = tmp_path / "ics2.ics.tmp"
+        replacement.write_text("b")
+        replacement.replace(path)
+        assert backend.wait() == {str(path)}
+        (tmp_path / "unrelated.txt").write_text("c")
+        assert backend.wait() == set()
+    finally:
+        backend.close()
+
+
+def test_snapshot_cache_reparses_only_changed_files(tmp_path):
+    ics1, ics2, exclusions = make_inputs(tmp_path)
+    snapshots = SnapshotCache()
+    first1 = snapshots.load(ics1)
+    snapshots.load(ics2)
+    write_calendar(tmp_path / "ics2.ics", [("5", "Retro", "20240105T100000Z", "20240105T110000Z")])
+    assert snapshots.load(ics1) is first1
+    assert [event[0] for event in snapshots.load(ics2)] == ["Retro"]
+
+
+def test_snapshot_cache_reparses_only_changed_files_in_uid_mode(tmp_path, monkeypatch):
+    calls = []
+    original = watch.load_keyed_events
+
+    def load_keyed_events(file_path, *args):
+        calls.append(file_path)
+        return original(file_path, *args)
+
+    monkeypatch.setattr(watch, "load_keyed_events", load_keyed_events)
+    ics1, ics2, exclusions = make_inputs(tmp_path)
+    snapshots = SnapshotCache()
+    merge_files(ics1, ics2, exclusions, False, cache=snapshots, diff_mode="uid")
+    write_calendar(tmp_path / "ics2.ics", [("5", "Retro", "20240105T100000Z", "20240105T110000Z")])
+    result = merge_files(ics1, ics2, exclusions, False, cache=snapshots, diff_mode="uid")
+    assert [event[0] for event in result.new_events] == ["Retro"]
+    assert (calls.count(ics1), calls.count(ics2)) == (1, 2)
+
+
+def test_cli_watch_merges_again_on_change(tmp_path, capsys):
+    ics1, ics2, exclusions = make_inputs(tmp_path)
+    output = tmp_path / "out.ics"
+    args = build_parser().parse_args(["merge", "--ics1", ics1, "--ics2", ics2, "--exclusions", exclusions, "-o", str(output), "--watch", "--debounce", "0.1", "-q"])
+    args.window = None
+    cancel = threading.Event()
+    status = []
+    thread = threading.Thread(target=lambda: status.append(run_watch(args, cancel)))
+    thread.start()
+    try:
+        for _ in range(100):
+            if "Watching" in capsys.readouterr().out:
+                break
+            cancel.wait(0.05)
+        assert "SUMMARY:Planning" in output.read_text()
+        write_calendar(tmp_path / "ics2.ics", [("5", "Retro", "20240105T100000Z", "20240105T110000Z")])
+        for _ in range(200):
+            if "SUMMARY:Retro" in output.read_text():
+                break
+            cancel.wait(0.05)
+        assert "SUMMARY:Retro" in output.read_text()
+    finally:
+        cancel.set()
+        thread.join(10)
+    assert status == [0]
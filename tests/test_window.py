@@ -0,0 +1,37 @@
+from datetime import date, datetime, timezone
+
+import pytest
+
+from icsmerger.ical import load_event_set
+from icsmerger.window import DateWindow, parse_window_date
+
+from helpers import write_calendar
+
+
+def test_parse_window_date():
+    today = date(2024, 8, 31)
+    assert parse_window_date("", today) is None
+    assert parse_window_date("today", today) == today
+    assert parse_window_date("2024-01-02", today) == date(2024, 1, 2)
+    assert parse_window_date("-30d", today) == date(2024, 8, 1)
+    assert parse_window_date("+6m", today) == date(2025, 2, 28)
+    with pytest.raises(ValueError):
+        parse_window_date("next week", today)
+    with pytest.raises(ValueError):
+        DateWindow(date(2024, 2, 1), date(2024, 1, 1))
+
+
+def test_events_outside_window_are_skipped(tmp_path):
+    path = write_calendar(tmp_path / "a.ics", [
+        ("1", "Old", "20230102T090000Z", "20230102T091500Z"),
+        ("2", "Overlapping", "20240131T230000Z", "20240201T010000Z"),
+        ("3", "Inside", "20240210T090000Z", "20240210T091500Z"),
+        ("4", "Last day", "20240229T230000Z", "20240229T233000Z"),
+        ("5", "Later", "20240301T000000Z", "20240301T010000Z"),
+    ])
+    window = DateWindow(date(2024, 2, 1), date(2024, 2, 29))
+    assert window.rejects({"DTSTART": "DTSTART:20230102T090000Z", "DTEND": "DTEND:20230102T091500Z"})
+    assert not window.contains(datetime(2024, 3, 1, tzinfo=timezone.utc), datetime(2024, 3, 1, 1, tzinfo=timezone.utc))
+    for parser in ("stream", "calendar"):
+        events = load_event_set(path, parser=parser, window=window)
+        assert sorted(event[0] for event in events) == ["Inside", "Last day", "Overlapping"]